@@ -1,32 +1,77 @@
+import json
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import FormSerializer
-from .scraper import ResultScraperService
+from .exports import ExportFormatError, select_export_format
+from .serializers import CacheInvalidateSerializer, FormSerializer, ScrapeJobSerializer
+from .scraper import LAYOUT_LATEST, LAYOUTS, ResultScraperService
+from .models import ScrapeJob
+from .jobs import job_is_stale, submit_job
+from .ocr import get_ocr_pool
+from .progress import EVENT_FINISHED, EVENT_SNAPSHOT, job_group, receive_event
+from .streaming import IncrementalStreamingHttpResponse
+
+
+def tag_file_response(response):
+    """Mark a successful file download; pass scraper errors through unchanged"""
+    if response.status_code == 200:
+        response['X-Response-Type'] = 'file'
+    # The same URL answers with different formats depending on Accept
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Leave ?format= and Accept to the view's export format; API errors are still rendered as JSON"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except (Http404, NotAcceptable):
+            return renderers[0], renderers[0].media_type
+
+
+def requested_export_format(request):
+    """The export format a request asks for via ?format= or Accept; raises ExportFormatError"""
+    return select_export_format(request.query_params.get("format"), request.META.get("HTTP_ACCEPT"))
+
 
 class ScraperAPIView(APIView):
+    content_negotiation_class = ExportContentNegotiation
+
     def post(self, request, *args, **kwargs):
+        try:
+            export_format = requested_export_format(request)
+        except ExportFormatError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         formserializer = FormSerializer(data=request.data)
         if formserializer.is_valid():
             prefix_usn = formserializer.validated_data["usn"].upper()
             usn_range = formserializer.validated_data["range"]
             url = formserializer.validated_data["url"]
             is_reval = "RV" in url
-            scraper_service = ResultScraperService()
+            workers = formserializer.validated_data["workers"]
+            layout = formserializer.validated_data["layout"]
+            incremental = formserializer.validated_data["incremental"]
+            scraper_service = ResultScraperService(formserializer.validated_data.get("engine"))
             
             try:
-                df = scraper_service.execute_scraping(prefix_usn, usn_range, url, is_reval)
-                
-                if df is not None and not df.empty:
-                    response = scraper_service.create_excel_response(df)
-                    
-                    response['X-Response-Type'] = 'file'
-                    return response
-                else:
-                    return Response(
-                        {"status": "error", "message": "No data was retrieved. Please check your inputs."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
+                if formserializer.validated_data["stream"]:
+                    job = scraper_service.create_job(prefix_usn, usn_range, url, is_reval, workers, incremental)
+                    return scraper_service.create_stream_response(job)
+                response = scraper_service.execute_scraping(
+                    prefix_usn, usn_range, url, is_reval, workers, layout, incremental, export_format
+                )
+                return tag_file_response(response)
             
             except Exception as e:
                 return Response(
@@ -37,4 +82,154 @@ class ScraperAPIView(APIView):
             return Response(
                 {"status": "error", "errors": formserializer.errors},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+
+
+class ScrapeJobListAPIView(APIView):
+    def post(self, request, *args, **kwargs):
+        """Queue a scrape and return its job ID straight away"""
+        formserializer = FormSerializer(data=request.data)
+        if not formserializer.is_valid():
+            return Response(
+                {"status": "error", "errors": formserializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        url = formserializer.validated_data["url"]
+        scraper_service = ResultScraperService(formserializer.validated_data.get("engine"))
+        job = scraper_service.create_job(
+            formserializer.validated_data["usn"].upper(),
+            formserializer.validated_data["range"],
+            url,
+            "RV" in url,
+            formserializer.validated_data["workers"],
+            formserializer.validated_data["incremental"],
+        )
+        submit_job(job)
+        return Response(job_links(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+class ScrapeJobDetailAPIView(APIView):
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(ScrapeJob, pk=job_id)
+        return Response({**ScrapeJobSerializer(job).data, **job_links(request, job)})
+
+
+class ScrapeJobResumeAPIView(APIView):
+    def post(self, request, job_id, *args, **kwargs):
+        """Re-queue a job so only its unfinished USNs are scraped"""
+        job = get_object_or_404(ScrapeJob, pk=job_id)
+        if job.status in (ScrapeJob.STATUS_PENDING, ScrapeJob.STATUS_RUNNING) and not request.data.get("force"):
+            return Response(
+                {"status": "error", "message": f"Job is already {job.status}. Pass force=true if its worker died."},
+                status=status.HTTP_409_CONFLICT
+            )
+        # A worker that is still making progress would end up scraping the job alongside the new one
+        if job.status == ScrapeJob.STATUS_RUNNING and not job_is_stale(job):
+            return Response(
+                {
+                    "status": "error",
+                    "message": (
+                        f"Job is still making progress. It can be forced once it has been idle for "
+                        f"{settings.SCRAPER_JOB_STALE_AFTER:.0f} seconds."
+                    ),
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        submit_job(job)
+        return Response(job_links(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+class ScrapeJobDownloadAPIView(APIView):
+    content_negotiation_class = ExportContentNegotiation
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(ScrapeJob, pk=job_id)
+        if job.status not in (ScrapeJob.STATUS_COMPLETED, ScrapeJob.STATUS_PARTIAL):
+            return Response(
+                {"status": "error", "message": f"Job is {job.status}, no file to download yet."},
+                status=status.HTTP_409_CONFLICT
+            )
+        layout = request.query_params.get("layout", LAYOUT_LATEST)
+        if layout not in LAYOUTS:
+            return Response(
+                {"status": "error", "message": f"Unknown layout '{layout}'. Use one of: {', '.join(LAYOUTS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            export_format = requested_export_format(request)
+        except ExportFormatError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = ResultScraperService(job.engine).create_job_response(job, layout, export_format)
+        response['X-Job-ID'] = str(job.id)
+        return tag_file_response(response)
+
+
+class ScrapeJobEventsAPIView(APIView):
+    def get(self, request, job_id, *args, **kwargs):
+        """Server-sent events fallback for clients that can't open the job WebSocket"""
+        job = get_object_or_404(ScrapeJob, pk=job_id)
+        response = IncrementalStreamingHttpResponse(job_event_stream(job), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+def job_event_stream(job):
+    """Yield a snapshot of the job, then its progress events until it finishes"""
+    layer = get_channel_layer()
+    channel = async_to_sync(layer.new_channel)()
+    group = job_group(job.id)
+    async_to_sync(layer.group_add)(group, channel)
+    try:
+        yield sse_message({"type": EVENT_SNAPSHOT, **ScrapeJobSerializer(job).data})
+        while True:
+            event = async_to_sync(receive_event)(layer, channel, settings.SCRAPER_PROGRESS_KEEPALIVE)
+            if event is not None:
+                yield sse_message(event)
+                if event["type"] == EVENT_FINISHED:
+                    return
+                continue
+            # Quiet period: stop if the job ended while nobody was publishing, else keep the connection open
+            job.refresh_from_db(fields=["status"])
+            if job.status not in (ScrapeJob.STATUS_PENDING, ScrapeJob.STATUS_RUNNING):
+                yield sse_message({"type": EVENT_FINISHED, "job_id": str(job.id), "status": job.status})
+                return
+            yield ": keepalive\n\n"
+    finally:
+        async_to_sync(layer.group_discard)(group, channel)
+
+
+def sse_message(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def job_links(request, job):
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": request.build_absolute_uri(reverse("job-detail", args=[job.id])),
+        "resume_url": request.build_absolute_uri(reverse("job-resume", args=[job.id])),
+        "download_url": request.build_absolute_uri(reverse("job-download", args=[job.id])),
+        "events_url": request.build_absolute_uri(reverse("job-events", args=[job.id])),
+    }
+
+
+class OcrStatsAPIView(APIView):
+    def get(self, request, *args, **kwargs):
+        return Response(get_ocr_pool().stats())
+
+
+class ResultCacheInvalidateAPIView(APIView):
+    def post(self, request, *args, **kwargs):
+        """Drop cached results for a results URL, optionally only for a USN range"""
+        serializer = CacheInvalidateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"status": "error", "errors": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = serializer.validated_data
+        scraper_service = ResultScraperService()
+        usns = scraper_service._generate_usn_list(data["usn"], data["range"]) if "usn" in data else None
+        scraper_service.cache.invalidate(data["url"], usns)
+        return Response({"status": "ok", "invalidated": len(usns) if usns is not None else "all"})
@@ -0,0 +1,630 @@
+"""Micro-benchmarks for the scraping pipeline.
+
+Run with ``python manage.py benchmark <suite>``. Each suite prints its own
+timings and checks that the fast path agrees with the reference one.
+"""
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytesseract
+from io import BytesIO
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from bs4 import BeautifulSoup
+from PIL import Image
+from .captcha import CAPTCHA_FIXTURES, GlyphBank, isolate_glyph_band, load_labelled_captchas, solve_captcha
+from .driver_pool import create_driver, page_weight
+from .ocr import TESSERACT_CONFIG
+from .result_parser import parse_result_page
+from .stub_server import make_server, render_captcha, render_result_page, student_marks, synthetic_captcha
+from .xlsx_stream import stream_workbook
+
+
+def _timeit(func: Callable, repeat: int) -> float:
+    """Average wall time of func() in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def _legacy_isolate_glyph_band(target_image: bytes) -> Image.Image:
+    """Per-pixel filter the scraper used before isolate_glyph_band"""
+    pixel_range = [(i, i, i) for i in range(102, 130)]
+    image = Image.open(BytesIO(target_image)).convert("RGB")
+    width, height = image.size
+    white_image = Image.new("RGB", (width, height), "white")
+    for x in range(width):
+        for y in range(height):
+            pixel = image.getpixel((x, y))
+            if pixel in pixel_range:
+                white_image.putpixel((x, y), pixel)
+    return white_image
+
+
+def bench_captcha_filter(repeat: int, write) -> None:
+    captchas = [render_captcha("AB12CD", seed) for seed in range(20)]
+    for captcha in captchas:
+        if _legacy_isolate_glyph_band(captcha).tobytes() != isolate_glyph_band(captcha).tobytes():
+            raise AssertionError("Vectorized captcha filter differs from the per-pixel filter")
+    legacy = _timeit(lambda: [_legacy_isolate_glyph_band(c) for c in captchas], repeat) / len(captchas)
+    vectorized = _timeit(lambda: [isolate_glyph_band(c) for c in captchas], repeat) / len(captchas)
+    write(f"per-pixel filter:  {legacy:.3f} ms/captcha")
+    write(f"vectorized filter: {vectorized:.3f} ms/captcha ({legacy / vectorized:.1f}x faster)")
+
+
+def bench_captcha_solver(repeat: int, write) -> None:
+    if CAPTCHA_FIXTURES.is_dir() and any(CAPTCHA_FIXTURES.glob("*.png")):
+        samples = load_labelled_captchas(CAPTCHA_FIXTURES)
+        # Hold out every fifth captcha for evaluation
+        train = [sample for i, sample in enumerate(samples) if i % 5]
+        test = samples[::5]
+        write(f"{len(samples)} labelled fixtures from {CAPTCHA_FIXTURES}")
+    else:
+        train = [synthetic_captcha(seed) for seed in range(10_000, 10_400)]
+        test = [synthetic_captcha(seed) for seed in range(200)]
+        write("No fixture captchas found, using stub server renders (PIL's default font, not VTU's glyphs; "
+              "these figures say nothing about accuracy on the real site)")
+    bank = GlyphBank.build(train)
+    write(f"glyph bank: {len(bank.labels)} templates, {len(set(bank.labels))} characters")
+
+    results = [solve_captcha(image, bank) for image, _ in test]
+    correct = sum(1 for result, (_, label) in zip(results, test) if result and result[0] == label)
+    char_total = sum(len(label) for _, label in test)
+    char_correct = sum(
+        sum(a == b for a, b in zip(result[0], label)) for result, (_, label) in zip(results, test) if result
+    )
+    confident = [result for result in results if result is not None and result[1].min() >= 0.5]
+    write(f"solver accuracy:   {correct}/{len(test)} captchas, {char_correct}/{char_total} characters")
+    write(f"unsegmentable:     {sum(result is None for result in results)}")
+    write(f"confident (>=0.5): {len(confident)}/{len(test)}")
+
+    solve_ms = _timeit(lambda: [solve_captcha(image, bank) for image, _ in test], repeat) / len(test)
+    glyphs = np.stack([np.zeros(bank.templates.shape[1], dtype=np.float32)] * 6)
+    classify_ms = _timeit(lambda: bank.classify(glyphs), repeat * 100)
+    write(f"solver latency:    {solve_ms:.3f} ms/captcha (classification alone {classify_ms:.4f} ms)")
+
+    subset = test[:20]
+    try:
+        start = time.perf_counter()
+        reads = [
+            pytesseract.image_to_string(isolate_glyph_band(image), config=TESSERACT_CONFIG).strip()
+            for image, _ in subset
+        ]
+        tesseract_ms = (time.perf_counter() - start) * 1000 / len(subset)
+    except Exception as e:
+        write(f"tesseract:         skipped ({str(e).strip()})")
+        return
+    tesseract_correct = sum(read == label for read, (_, label) in zip(reads, subset))
+    write(f"tesseract:         {tesseract_correct}/{len(subset)} captchas, {tesseract_ms:.1f} ms/captcha")
+
+
+def bench_lean_browser(repeat: int, write) -> None:
+    url = os.environ.get("BENCHMARK_RESULTS_URL")
+    server = None
+    if url:
+        write(f"measuring {url}")
+    else:
+        server = make_server(port=0, accept_any_captcha=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/index.php"
+        write("measuring the stub server, whose page assets have invented sizes: the savings below are "
+              "synthetic (set BENCHMARK_RESULTS_URL to a real results page to measure it)")
+    try:
+        profiles = {}
+        for lean in (False, True):
+            try:
+                driver = create_driver(lean=lean)
+            except Exception as e:
+                write(f"skipped: could not start Chrome ({str(e).splitlines()[0]})")
+                return
+            try:
+                loads = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    driver.get(url)
+                    driver.execute_async_script(
+                        "const done = arguments[arguments.length - 1];"
+                        "const img = document.querySelector('#raj img');"
+                        "if (img.complete) { done(); } else { img.onload = img.onerror = () => done(); }"
+                    )
+                    wall_ms = (time.perf_counter() - start) * 1000
+                    page_bytes, _ = page_weight(driver)
+                    loads.append((page_bytes, wall_ms))
+                profiles[lean] = tuple(sum(values) / len(values) for values in zip(*loads))
+            finally:
+                driver.quit()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    (full_bytes, full_ms), (lean_bytes, lean_ms) = profiles[False], profiles[True]
+    write(f"full profile: {full_bytes / 1024:.1f} KB, {full_ms:.0f} ms to a usable captcha per page load")
+    write(f"lean profile: {lean_bytes / 1024:.1f} KB, {lean_ms:.0f} ms to a usable captcha per page load")
+    label = " (synthetic, stub assets)" if server is not None else ""
+    write(f"saved per USN{label}: {(full_bytes - lean_bytes) / 1024:.1f} KB, {full_ms - lean_ms:.0f} ms")
+
+
+def _result_pages(count: int, semesters: int = 8) -> Iterable[str]:
+    """Stub result pages for `count` USNs, rendered one at a time"""
+    for index in range(1, count + 1):
+        usn = f"1AB21CS{index:03d}"
+        yield render_result_page(usn, f"STUDENT {index:03d}", semesters)
+
+
+def _legacy_parse_page(page: str) -> Optional[Dict]:
+    """Full-tree BeautifulSoup parse the scraper used before app.result_parser"""
+    soup = BeautifulSoup(page, "lxml")
+    usn = soup.find_all("td")[1].text.split(":")[1].strip().upper()
+    name = soup.find_all("td")[3].text.split(":")[1].strip()
+    return _legacy_parse_student_record(f"{usn}+{name}", soup)
+
+
+def _legacy_parse_student_record(id_: str, soup: BeautifulSoup) -> Optional[Dict]:
+    """Subject totals from a soup, as the scraper read them before app.result_parser"""
+    this_usn, this_name = id_.split('+')
+    sems_divs = soup.find_all('div', style="text-align:center;padding:5px;")
+    if not sems_divs:
+        print(f"No semester data for USN {this_usn}")
+        return None
+
+    first_sem_div = sems_divs[0]
+    sems_data = [first_sem_div.find_next_sibling('div')]
+    marks = {}
+
+    for marks_data in sems_data:
+        if not marks_data:
+            print(f"No marks data for USN {this_usn}")
+            continue
+        rows = marks_data.find_all('div', class_='divTableRow')
+        if not rows:
+            print(f"No table rows for USN {this_usn}")
+            continue
+        data = [[cell.text.strip() for cell in row.find_all('div', class_='divTableCell')] for row in rows]
+        if not data or len(data) < 2:
+            print(f"Invalid table data for USN {this_usn}: {data}")
+            continue
+        try:
+            df_temp = pd.DataFrame(data[1:], columns=data[0])
+        except Exception as e:
+            print(f"Failed to create DataFrame for USN {this_usn}: {str(e)}")
+            continue
+
+        for _, row in df_temp.iterrows():
+            if 'Subject Code' not in row or 'Total' not in row:
+                print(f"Missing Subject Code or Total for USN {this_usn}")
+                continue
+            subject_code = row['Subject Code']
+            total_marks = row['Total']
+            if not isinstance(total_marks, str) or not total_marks.isdigit():
+                print(f"Invalid marks for USN {this_usn}, subject {subject_code}: {total_marks}")
+                continue
+            marks[subject_code] = total_marks
+
+    if not marks:
+        print(f"No valid marks for USN {this_usn}")
+        return None
+    # Marks are kept as pairs so subject order survives JSON storage
+    return {'usn': this_usn, 'name': this_name, 'marks': [[code, total] for code, total in marks.items()]}
+
+
+def _legacy_parse_pages(pages: Iterable[str]) -> List[Optional[Dict]]:
+    """Keep every page's soup until the batch ends, then parse, as _scrape_data used to"""
+    soup_dict = {}
+    for page in pages:
+        soup = BeautifulSoup(page, "lxml")
+        usn = soup.find_all("td")[1].text.split(":")[1].strip().upper()
+        name = soup.find_all("td")[3].text.split(":")[1].strip()
+        soup_dict[f"{usn}+{name}"] = soup
+    return [_legacy_parse_student_record(key, soup) for key, soup in soup_dict.items()]
+
+
+def _first_semester(record: Optional[Dict]) -> Optional[Dict]:
+    """The part of a record the old parser produced"""
+    return record and {key: record[key] for key in ("usn", "name", "marks")}
+
+
+def _peak_kb(func: Callable) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_parse_memory(repeat: int, write) -> None:
+    legacy = _legacy_parse_pages(_result_pages(20))
+    streamed = [_first_semester(parse_result_page(page).to_record()) for page in _result_pages(20)]
+    if legacy != streamed:
+        raise AssertionError("Streaming parse differs from the batch parse")
+    for count in (100, 300):
+        legacy_kb = _peak_kb(lambda: _legacy_parse_pages(_result_pages(count)))
+        streamed_kb = _peak_kb(lambda: [parse_result_page(page).to_record() for page in _result_pages(count)])
+        write(f"{count} pages, soups kept until the end: {legacy_kb / 1024:8.1f} MB peak")
+        write(f"{count} pages, parsed as they arrive:    {streamed_kb / 1024:8.1f} MB peak")
+    # Only the Python side is traced; each lxml tree is freed before the next page is parsed anyway
+    write("(lxml trees are allocated by libxml2, outside tracemalloc)")
+
+
+def bench_result_parser(repeat: int, write) -> None:
+    pages = [page for semesters in (1, 4, 8) for page in _result_pages(20, semesters)]
+    # Pages the old parser had to cope with: no marks, a header-only table, a non-numeric total
+    pages.append(render_result_page("1AB21CS999", "EMPTY", 0))
+    pages.append(pages[0].replace('<div class="divTableRow"><div class="divTableCell">21CS', '<div>', 6))
+    total = student_marks("1AB21CS001", 1)[0][1][0][4]
+    pages.append(pages[0].replace(f">{total}<", ">AB<", 1))
+    for page in pages:
+        if _legacy_parse_page(page) != _first_semester(parse_result_page(page).to_record()):
+            raise AssertionError("Result parser differs from the BeautifulSoup parser")
+    write(f"{len(pages)} pages parse identically")
+    for semesters in (1, 8):
+        sample = list(_result_pages(20, semesters))
+        legacy_ms = _timeit(lambda: [_legacy_parse_page(page) for page in sample], repeat) / len(sample)
+        fast_ms = _timeit(lambda: [parse_result_page(page) for page in sample], repeat) / len(sample)
+        write(f"{semesters} semester(s), BeautifulSoup: {legacy_ms:.3f} ms/page")
+        write(f"{semesters} semester(s), lxml XPath:    {fast_ms:.3f} ms/page ({legacy_ms / fast_ms:.1f}x faster)")
+
+
+def _legacy_build_dataframe(records: List[Dict]) -> pd.DataFrame:
+    """Dict-per-student assembly with a linear subject scan, as _build_dataframe was (less its logging)"""
+    rows = {}
+    subject_codes = []
+
+    for record in records:
+        student_record = {'USN': record['usn'], 'Student Name': record['name']}
+        for subject_code, total_marks in record['marks']:
+            student_record[subject_code] = total_marks
+            if subject_code not in subject_codes:
+                subject_codes.append(subject_code)
+        rows[f"{record['usn']}+{record['name']}"] = student_record
+
+    final_df = pd.DataFrame(rows.values())
+    for col in ['USN', 'Student Name'] + subject_codes:
+        if col not in final_df.columns:
+            final_df[col] = None
+    return final_df[['USN', 'Student Name'] + subject_codes]
+
+
+class _Records(list):
+    """Parsed records standing in for a job's record QuerySet in the download's row builders"""
+
+    def iterator(self, chunk_size: Optional[int] = None) -> Iterator[Dict]:
+        return iter(self)
+
+
+def _cohort_records(students: int, subjects: int, per_student: int) -> List[Dict]:
+    """Synthetic parsed records: a few core subjects plus random electives from a wide pool"""
+    rng = np.random.default_rng(0)
+    codes = [f"21XX{index:03d}" for index in range(subjects)]
+    records = []
+    for index in range(students):
+        picks = rng.choice(subjects, size=per_student, replace=False)
+        marks = [[codes[pick], str(int(rng.integers(0, 101)))] for pick in sorted(picks)]
+        records.append({"usn": f"1AB21CS{index:04d}", "name": f"STUDENT {index}", "marks": marks})
+    return records
+
+
+def bench_marks_assembly(repeat: int, write) -> None:
+    from .scraper import ResultScraperService
+
+    service = ResultScraperService()
+    sample = _cohort_records(200, 40, 8)
+    legacy = _legacy_build_dataframe(sample)
+    subjects = list(legacy.columns[2:])
+    expected = _cells(legacy.astype({code: "Int32" for code in subjects}))
+    if [list(row) for row in service._latest_rows(_Records(sample), subjects)] != expected:
+        raise AssertionError("Download rows differ from the dict-per-student assembly")
+    for students, subjects in ((1000, 60), (5000, 200)):
+        records = _cohort_records(students, subjects, 8)
+        codes = list(dict.fromkeys(code for record in records for code, _ in record["marks"]))
+
+        def download_rows():
+            for _ in service._latest_rows(_Records(records), codes):
+                pass
+
+        legacy_ms = _timeit(lambda: _legacy_build_dataframe(records), repeat)
+        rows_ms = _timeit(download_rows, repeat)
+        legacy_kb = _peak_kb(lambda: _legacy_build_dataframe(records))
+        rows_kb = _peak_kb(download_rows)
+        write(f"{students} students, {subjects} subjects:")
+        write(f"  dict per student: {legacy_ms:8.1f} ms, {legacy_kb / 1024:6.1f} MB peak")
+        write(f"  download rows:    {rows_ms:8.1f} ms, {rows_kb / 1024:6.1f} MB peak "
+              f"({legacy_ms / rows_ms:.1f}x faster)")
+
+
+def _semester_records(students: int, semesters: int, subjects: int) -> List[Dict]:
+    """Parsed records with every semester block, as the scraper stores them"""
+    records = []
+    for index in range(students):
+        usn = f"1AB21CS{index % 1000:03d}" if index < 1000 else f"1AB{21 + index // 1000:02d}CS{index % 1000:03d}"
+        blocks = [
+            {
+                "semester": semester,
+                "subjects": [
+                    [f"21CS{semester}{subject:02d}", f"Subject {semester}.{subject}", "30", "40",
+                     str((index + semester * subject) % 101), "P"]
+                    for subject in range(1, subjects + 1)
+                ],
+            }
+            for semester in range(semesters, 0, -1)
+        ]
+        records.append({"usn": usn, "name": f"STUDENT {index}", "marks": [], "semesters": blocks})
+    return records
+
+
+def _ingest_row_by_row(records: List[Dict]) -> None:
+    """get_or_create/update_or_create per row, the obvious way to fill the models"""
+    from .models import Batch, Marks, Semester, Student, Subject
+
+    for record in records:
+        blocks = record["semesters"]
+        batch, _ = Batch.objects.get_or_create(batch=2000 + int(record["usn"][3:5]))
+        latest, _ = Semester.objects.get_or_create(semester=max(block["semester"] for block in blocks))
+        student, _ = Student.objects.update_or_create(
+            usn=record["usn"], defaults={"name": record["name"], "batch": batch, "semester": latest}
+        )
+        for block in blocks:
+            semester, _ = Semester.objects.get_or_create(semester=block["semester"])
+            for code, _, _, _, total, _ in block["subjects"]:
+                subject, _ = Subject.objects.get_or_create(name=code, semester=semester)
+                Marks.objects.update_or_create(
+                    student=student, subject=subject, semester=semester, defaults={"marks": int(total)}
+                )
+
+
+def bench_ingest(repeat: int, write) -> None:
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+    from .ingest import ingest_records
+    from .models import Marks
+
+    write(f"database: {connection.vendor}")
+    for students in (200, 2000):
+        records = _semester_records(students, 4, 6)
+        marks = students * 4 * 6
+        # Everything runs inside a transaction that is rolled back, leaving the tables untouched
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                ingest_records(records)
+                insert_ms = (time.perf_counter() - start) * 1000
+            insert_queries = len(queries)
+            if Marks.objects.count() < marks:
+                raise AssertionError("Bulk ingestion lost marks")
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                ingest_records(records)
+                upsert_ms = (time.perf_counter() - start) * 1000
+            transaction.set_rollback(True)
+        write(f"{students} students, {marks} marks:")
+        write(f"  bulk insert: {insert_ms:8.0f} ms, {insert_queries} queries")
+        write(f"  bulk upsert: {upsert_ms:8.0f} ms, {len(queries)} queries")
+
+    sample = _semester_records(50, 4, 6)
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            _ingest_row_by_row(sample)
+            row_ms = (time.perf_counter() - start) * 1000
+        transaction.set_rollback(True)
+    write(f"row by row, 50 students, {50 * 24} marks: {row_ms:.0f} ms, {len(queries)} queries "
+          f"(~{row_ms / (50 * 24):.2f} ms/mark)")
+
+
+def _simulate_planner(usn_list: List[str], present: set, stop_after: int, workers: int) -> int:
+    """Submissions a scrape makes when `workers` sessions take USNs in order and answer in turn"""
+    from .usn_planner import RangePlanner
+
+    planner = RangePlanner(usn_list, stop_after)
+    submitted = 0
+    in_flight: List[str] = []
+    for usn in usn_list:
+        if not planner.should_scrape(usn):
+            continue
+        submitted += 1
+        in_flight.append(usn)
+        if len(in_flight) == workers:
+            done = in_flight.pop(0)
+            planner.record(done, done in present)
+    return submitted
+
+
+def bench_range_planner(repeat: int, write) -> None:
+    from .usn_planner import expand_usn_range
+
+    # A 140-seat section with a few dropouts and 12 lateral entry students
+    present = {f"1AB21CS{number:03d}" for number in range(1, 141) if number not in (17, 18, 63, 99)}
+    present |= {f"1AB21CS{number:03d}" for number in range(401, 413)}
+    requests = {
+        "1-200": "1-200",
+        "1-100,50-200": "1-100,50-200",
+        "1-200,401-450": "1-200,401-450",
+    }
+    for label, suffix_range in requests.items():
+        # The old expansion submitted every number of every part, overlaps included
+        naive = 0
+        for part in suffix_range.split(","):
+            start, _, end = part.partition("-")
+            naive += int(end or start) - int(start) + 1
+        usn_list = expand_usn_range("1AB21CS", suffix_range)
+        found = len(present & set(usn_list))
+        for workers in (1, 4):
+            planned = _simulate_planner(usn_list, present, 10, workers)
+            write(f"{label:>14}, {workers} worker(s): {naive} submissions before, {planned} with the planner "
+                  f"({found} results, {naive - planned} saved)")
+
+
+def _legacy_workbook(df: pd.DataFrame) -> bytes:
+    """The workbook as the download built it before streaming: openpyxl into a BytesIO"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Sem Results")
+    return output.getvalue()
+
+
+def _wide_sheet(records: List[Dict], codes: List[str]) -> Tuple[str, List[str], Iterable[List]]:
+    """The 'Sem Results' sheet with rows built by the job download's own row builder"""
+    from .scraper import ResultScraperService
+
+    return "Sem Results", ["USN", "Student Name", *codes], ResultScraperService()._latest_rows(_Records(records), codes)
+
+
+def _streamed_workbook(records: List[Dict], codes: List[str]) -> Tuple[int, float]:
+    """Size of the streamed workbook and the milliseconds until its first chunk was ready"""
+    start = time.perf_counter()
+    first_chunk_ms = None
+    chunks = []
+    for chunk in stream_workbook([_wide_sheet(records, codes)]):
+        if first_chunk_ms is None:
+            first_chunk_ms = (time.perf_counter() - start) * 1000
+        chunks.append(len(chunk))
+    return sum(chunks), first_chunk_ms
+
+
+def _cells(df: pd.DataFrame) -> List[List]:
+    return [[None if pd.isna(value) else value for value in row] for row in df.itertuples(index=False, name=None)]
+
+
+def bench_xlsx_export(repeat: int, write) -> None:
+    sample = _cohort_records(300, 12, 8)
+    codes = list(dict.fromkeys(code for record in sample for code, _ in record["marks"]))
+    streamed = b"".join(stream_workbook([_wide_sheet(sample, codes)]))
+    readback = pd.read_excel(BytesIO(streamed), sheet_name="Sem Results")
+    expected = _legacy_build_dataframe(sample)
+    expected = expected.astype({code: "Int32" for code in expected.columns[2:]})
+    if list(readback.columns) != list(expected.columns) or _cells(readback) != _cells(expected):
+        raise AssertionError("Streamed workbook differs from the DataFrame it replaces")
+    for rows in (10_000, 100_000):
+        records = _cohort_records(rows, 12, 8)
+        codes = list(dict.fromkeys(code for record in records for code, _ in record["marks"]))
+        runs = repeat if rows <= 10_000 else 1
+        # The old path also had to assemble the DataFrame first
+        legacy_ms = _timeit(lambda: _legacy_workbook(_legacy_build_dataframe(records)), runs)
+        legacy_kb = _peak_kb(lambda: _legacy_workbook(_legacy_build_dataframe(records)))
+        legacy_size = len(_legacy_workbook(_legacy_build_dataframe(records)))
+        streamed_ms = _timeit(lambda: _streamed_workbook(records, codes), runs)
+        streamed_kb = _peak_kb(lambda: _streamed_workbook(records, codes))
+        streamed_size, first_chunk_ms = _streamed_workbook(records, codes)
+        write(f"{rows} rows, {len(codes)} subjects:")
+        write(f"  DataFrame + openpyxl: {legacy_ms:8.1f} ms, {legacy_kb / 1024:6.1f} MB peak, "
+              f"first byte after {legacy_ms:8.1f} ms, {legacy_size / 1024:7.0f} KB")
+        write(f"  streamed:             {streamed_ms:8.1f} ms, {streamed_kb / 1024:6.1f} MB peak, "
+              f"first byte after {first_chunk_ms:8.1f} ms, {streamed_size / 1024:7.0f} KB "
+              f"({legacy_ms / streamed_ms:.1f}x faster)")
+
+
+def bench_export_formats(repeat: int, write) -> None:
+    from .exports import available_formats, read_results_file, stream_export
+
+    for rows in (10_000, 100_000):
+        records = _cohort_records(rows, 12, 8)
+        codes = list(dict.fromkeys(code for record in records for code, _ in record["marks"]))
+        runs = repeat if rows <= 10_000 else 1
+        write(f"{rows} rows, {len(codes)} subjects:")
+        expected = None
+        for export_format in available_formats():
+            data = b"".join(stream_export([_wide_sheet(records, codes)], export_format))
+            cells = _cells(read_results_file(BytesIO(data), f"results.{export_format}"))
+            if expected is None:
+                expected = cells
+            elif cells != expected:
+                raise AssertionError(f"{export_format} export reads back differently from xlsx")
+            write_ms = _timeit(lambda: b"".join(stream_export([_wide_sheet(records, codes)], export_format)), runs)
+            read_ms = _timeit(lambda: read_results_file(BytesIO(data), f"results.{export_format}"), runs)
+            write(f"  {export_format:>8}: write {write_ms:8.1f} ms, read back {read_ms:8.1f} ms, "
+                  f"{len(data) / 1024:7.0f} KB")
+
+
+class _LoadedServer:
+    """A results server that answers `capacity` submissions at a time in `service` seconds each.
+
+    Past capacity every answer slows down in proportion to the load, and past
+    three times capacity submissions time out, as the real site does under exam-day
+    traffic. One captcha in ten is misread whatever the load.
+    """
+
+    def __init__(self, capacity: int, service: float = 0.02, timeout: float = 0.2):
+        self.capacity = capacity
+        self.service = service
+        self.timeout = timeout
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(0)
+
+    def submit(self) -> str:
+        with self._lock:
+            self._in_flight += 1
+            load = self._in_flight / self.capacity
+            misread = self._rng.random() < 0.1
+        try:
+            if load > 3:
+                time.sleep(self.timeout)
+                return "timeout"
+            time.sleep(self.service * max(1.0, load))
+            return "captcha_rejected" if misread else "result"
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def _drive_server(server: _LoadedServer, workers: int, seconds: float, limiter=None) -> Dict[str, int]:
+    """Outcomes of `workers` threads submitting to the server for `seconds`, optionally through a limiter"""
+    counts: Dict[str, int] = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def work() -> None:
+        while time.monotonic() < deadline:
+            if limiter is not None:
+                limiter.acquire()
+            started = time.monotonic()
+            outcome = server.submit()
+            if limiter is not None:
+                limiter.release(outcome, time.monotonic() - started)
+            with lock:
+                counts[outcome] = counts.get(outcome, 0) + 1
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def bench_adaptive_concurrency(repeat: int, write) -> None:
+    from .throttle import AimdLimiter
+
+    seconds = max(1, repeat)
+    for capacity in (2, 6):
+        write(f"server capacity {capacity}, {seconds} s per run:")
+        runs = [(f"fixed {workers:>2} workers", workers, None) for workers in (1, 4, 16)]
+        runs.append(("adaptive, ceiling 16", 16, AimdLimiter(ceiling=16)))
+        for label, workers, limiter in runs:
+            counts = _drive_server(_LoadedServer(capacity), workers, seconds, limiter)
+            answered = counts.get("result", 0)
+            attempts = sum(counts.values())
+            line = (f"  {label}: {answered / seconds:6.1f} results/s, "
+                    f"{counts.get('timeout', 0) / attempts if attempts else 0:5.1%} timed out")
+            if limiter is not None:
+                line += f", limit settled at {limiter.limit:.1f}"
+            write(line)
+
+
+SUITES: Dict[str, Callable[[int, Callable[[str], None]], None]] = {
+    "captcha_filter": bench_captcha_filter,
+    "captcha_solver": bench_captcha_solver,
+    "lean_browser": bench_lean_browser,
+    "parse_memory": bench_parse_memory,
+    "result_parser": bench_result_parser,
+    "marks_assembly": bench_marks_assembly,
+    "ingest": bench_ingest,
+    "range_planner": bench_range_planner,
+    "xlsx_export": bench_xlsx_export,
+    "export_formats": bench_export_formats,
+    "adaptive_concurrency": bench_adaptive_concurrency,
+}
@@ -0,0 +1,166 @@
+import threading
+import numpy as np
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from django.conf import settings
+from PIL import Image
+
+# VTU captcha glyphs are drawn in flat greys within this range (upper bound exclusive)
+GLYPH_BAND = (102, 130)
+CAPTCHA_LENGTH = 6
+# Labelled captchas ('<TEXT>.png' or '<TEXT>_<anything>.png') that glyph banks are built and evaluated from
+CAPTCHA_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "captchas"
+# Every segmented glyph is scaled to this (width, height) before matching
+GLYPH_SIZE = (12, 16)
+# Column runs narrower than this are treated as speckle, not glyphs
+MIN_GLYPH_WIDTH = 2
+
+
+def _load_pixels(target_image: bytes) -> np.ndarray:
+    return np.asarray(Image.open(BytesIO(target_image)).convert("RGB"))
+
+
+def glyph_mask(pixels: np.ndarray) -> np.ndarray:
+    """Boolean mask of the pixels that fall in the grey glyph band"""
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    low, high = GLYPH_BAND
+    return (red == green) & (green == blue) & (red >= low) & (red < high)
+
+
+def isolate_glyph_band(target_image: bytes) -> Image.Image:
+    """Keep only the grey glyph pixels of a captcha, painting everything else white"""
+    pixels = _load_pixels(target_image)
+    mask = glyph_mask(pixels)
+    filtered = np.full_like(pixels, 255)
+    filtered[mask] = pixels[mask]
+    return Image.fromarray(filtered, "RGB")
+
+
+def _column_runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, stop) spans of consecutive columns that contain glyph pixels"""
+    filled = np.concatenate(([0], mask.any(axis=0).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(filled))
+    return [(int(start), int(stop)) for start, stop in zip(edges[::2], edges[1::2])]
+
+
+def segment_glyphs(mask: np.ndarray, count: int = CAPTCHA_LENGTH) -> Optional[List[np.ndarray]]:
+    """Split a glyph mask into `count` normalised glyph vectors, or None if it can't be"""
+    runs = [run for run in _column_runs(mask) if run[1] - run[0] >= MIN_GLYPH_WIDTH]
+    # Touching glyphs share a run: split the widest run in half until we have enough
+    while runs and len(runs) < count:
+        widest = max(range(len(runs)), key=lambda i: runs[i][1] - runs[i][0])
+        start, stop = runs[widest]
+        if stop - start < 2 * MIN_GLYPH_WIDTH:
+            break
+        middle = (start + stop) // 2
+        runs[widest:widest + 1] = [(start, middle), (middle, stop)]
+    # Broken glyphs leave extra runs: merge the narrowest into its closest neighbour
+    while len(runs) > count:
+        narrowest = min(range(len(runs)), key=lambda i: runs[i][1] - runs[i][0])
+        if narrowest == 0:
+            neighbour = 1
+        elif narrowest == len(runs) - 1:
+            neighbour = narrowest - 1
+        else:
+            left_gap = runs[narrowest][0] - runs[narrowest - 1][1]
+            right_gap = runs[narrowest + 1][0] - runs[narrowest][1]
+            neighbour = narrowest - 1 if left_gap <= right_gap else narrowest + 1
+        first, second = sorted((narrowest, neighbour))
+        runs[first:second + 1] = [(runs[first][0], runs[second][1])]
+    if len(runs) != count:
+        return None
+
+    glyphs = []
+    for start, stop in runs:
+        column = mask[:, start:stop]
+        rows = np.flatnonzero(column.any(axis=1))
+        cropped = column[rows[0]:rows[-1] + 1]
+        scaled = Image.fromarray(cropped.astype(np.uint8) * 255).resize(GLYPH_SIZE, Image.BILINEAR)
+        glyphs.append(np.asarray(scaled, dtype=np.float32).ravel() / 255)
+    return glyphs
+
+
+class GlyphBank:
+    """Labelled glyph templates matched by vectorised squared distance"""
+
+    def __init__(self, templates: np.ndarray, labels: np.ndarray):
+        self.templates = templates.astype(np.float32)
+        self.labels = labels
+        self._norms = (self.templates ** 2).sum(axis=1)
+
+    @classmethod
+    def load(cls, path: Path) -> "GlyphBank":
+        data = np.load(path)
+        return cls(data["templates"], data["labels"])
+
+    @classmethod
+    def build(cls, samples: Iterable[Tuple[bytes, str]], max_per_label: int = 24) -> "GlyphBank":
+        """Build a bank from (captcha image, label) pairs, skipping ones that don't segment"""
+        templates, labels = [], []
+        per_label = {}
+        for image, label in samples:
+            glyphs = segment_glyphs(glyph_mask(_load_pixels(image)), len(label))
+            if glyphs is None:
+                continue
+            for glyph, char in zip(glyphs, label.upper()):
+                if per_label.get(char, 0) < max_per_label:
+                    per_label[char] = per_label.get(char, 0) + 1
+                    templates.append(glyph)
+                    labels.append(char)
+        if not templates:
+            raise ValueError("No usable captcha samples to build a glyph bank from")
+        return cls(np.stack(templates), np.array(labels))
+
+    def save(self, path: Path) -> None:
+        np.savez_compressed(path, templates=self.templates.astype(np.float16), labels=self.labels)
+
+    def classify(self, glyphs: np.ndarray) -> Tuple[str, np.ndarray]:
+        """Best label per glyph and a 0..1 confidence from the margin to the best other label"""
+        distances = (glyphs ** 2).sum(axis=1)[:, None] + self._norms[None, :] - 2 * glyphs @ self.templates.T
+        np.maximum(distances, 0, out=distances)
+        best = distances.argmin(axis=1)
+        best_labels = self.labels[best]
+        best_distances = distances[np.arange(len(glyphs)), best]
+        other = np.where(self.labels[None, :] == best_labels[:, None], np.inf, distances)
+        runner_up = other.min(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            confidence = np.where(np.isinf(runner_up), 1.0, 1 - best_distances / runner_up)
+        return "".join(best_labels), np.clip(np.nan_to_num(confidence), 0, 1)
+
+
+def load_labelled_captchas(directory: Path) -> List[Tuple[bytes, str]]:
+    """Read labelled captcha fixtures named '<TEXT>.png' or '<TEXT>_<anything>.png'"""
+    samples = []
+    for path in sorted(Path(directory).glob("*.png")):
+        samples.append((path.read_bytes(), path.stem.split("_")[0].upper()))
+    return samples
+
+
+def solve_captcha(target_image: bytes, bank: GlyphBank) -> Optional[Tuple[str, np.ndarray]]:
+    """Read a captcha with the glyph bank; None when it can't be segmented"""
+    glyphs = segment_glyphs(glyph_mask(_load_pixels(target_image)))
+    if glyphs is None:
+        return None
+    return bank.classify(np.stack(glyphs))
+
+
+_bank: Optional[GlyphBank] = None
+_bank_loaded = False
+_bank_lock = threading.Lock()
+
+
+def get_glyph_bank() -> Optional[GlyphBank]:
+    """Load the configured glyph bank once per process; None if there isn't one"""
+    global _bank, _bank_loaded
+    if not _bank_loaded:
+        with _bank_lock:
+            if not _bank_loaded:
+                path = Path(settings.SCRAPER_GLYPH_BANK)
+                if path.exists():
+                    _bank = GlyphBank.load(path)
+                    print(f"Loaded glyph bank with {len(_bank.labels)} templates from {path}")
+                else:
+                    print(f"No glyph bank at {path}, so the captcha solver is off and Tesseract reads every captcha")
+                _bank_loaded = True
+    return _bank
@@ -0,0 +1,9 @@
+from django.core import checks
+from .ocr import FALLBACK_WARNING, PyTessBaseAPI
+
+
+def check_ocr_engine(app_configs, **kwargs):
+    """Warn when captchas will be read by forking tesseract instead of a warm in-process engine"""
+    if PyTessBaseAPI is not None:
+        return []
+    return [checks.Warning(FALLBACK_WARNING, id='app.W001')]
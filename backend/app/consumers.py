@@ -0,0 +1,34 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from .models import ScrapeJob
+from .progress import EVENT_SNAPSHOT, job_group
+from .serializers import ScrapeJobSerializer
+
+
+class JobProgressConsumer(AsyncJsonWebsocketConsumer):
+    """Streams a scrape job's progress events, starting with its checkpointed state"""
+
+    async def connect(self):
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        snapshot = await self._snapshot()
+        if snapshot is None:
+            await self.close(code=4404)
+            return
+        self.group = job_group(self.job_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        await self.send_json(snapshot)
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group'):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def job_event(self, message):
+        await self.send_json(message['event'])
+
+    @database_sync_to_async
+    def _snapshot(self):
+        job = ScrapeJob.objects.filter(pk=self.job_id).first()
+        if job is None:
+            return None
+        return {'type': EVENT_SNAPSHOT, **ScrapeJobSerializer(job).data}
@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional, Tuple
+
+CHANGE_MARKS = 'marks changed'
+CHANGE_ADDED = 'newly published'
+CHANGE_REMOVED = 'no longer available'
+
+
+def diff_results(
+    previous: Dict[str, Optional[Dict]], current: Dict[str, Optional[Dict]], order: List[str]
+) -> List[Dict]:
+    """Changes between the last stored record and the freshly scraped one of each re-scraped USN.
+
+    Both maps hold a record, or None for "not found"; USNs missing from
+    ``previous`` were never scraped for this URL. Entries follow ``order``.
+    """
+    changes = []
+    for usn in order:
+        if usn not in current:
+            continue
+        old, new = previous.get(usn), current[usn]
+        if new is not None and old is None:
+            changes.append({'usn': usn, 'name': new['name'], 'change': CHANGE_ADDED})
+        elif new is None and old is not None:
+            changes.append({'usn': usn, 'name': old['name'], 'change': CHANGE_REMOVED})
+        elif new is not None:
+            old_totals, new_totals = _totals(old, new)
+            for semester, subject in sorted(old_totals.keys() | new_totals.keys(), key=_sort_key):
+                before, after = old_totals.get((semester, subject)), new_totals.get((semester, subject))
+                if before != after:
+                    changes.append({
+                        'usn': usn, 'name': new['name'], 'change': CHANGE_MARKS,
+                        'semester': semester, 'subject': subject, 'old': before, 'new': after,
+                    })
+    return changes
+
+
+def _totals(old: Dict, new: Dict) -> Tuple[Dict, Dict]:
+    """(semester, subject) -> total for both records, on whichever detail level both have"""
+    if 'semesters' in old and 'semesters' in new:
+        return tuple(
+            {
+                (block['semester'], subject[0]): subject[4]
+                for block in record['semesters'] for subject in block['subjects']
+            }
+            for record in (old, new)
+        )
+    return tuple({(None, code): total for code, total in record['marks']} for record in (old, new))
+
+
+def _sort_key(key: Tuple[Optional[int], str]) -> Tuple[int, str]:
+    return key[0] or 0, key[1]
@@ -0,0 +1,243 @@
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from webdriver_manager.chrome import ChromeDriverManager
+
+_driver_path: Optional[str] = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_chromedriver_path() -> str:
+    """Find chromedriver once per process, only asking webdriver-manager as a last resort"""
+    global _driver_path
+    if _driver_path is None:
+        with _driver_path_lock:
+            if _driver_path is None:
+                path = settings.SCRAPER_CHROMEDRIVER_PATH or shutil.which('chromedriver')
+                if not path:
+                    print("chromedriver not found locally, downloading with webdriver-manager")
+                    path = ChromeDriverManager().install()
+                print(f"Using chromedriver at {path}")
+                _driver_path = path
+    return _driver_path
+
+
+def create_driver(lean: Optional[bool] = None) -> webdriver.Chrome:
+    """Start a configured headless Chrome session.
+
+    Lean sessions return from ``get()`` once the DOM is ready and use the
+    DevTools protocol to block the stylesheets, fonts, images and tracking
+    scripts a results page pulls in. The captcha comes from a PHP endpoint
+    rather than an image file, so it still loads.
+    """
+    lean = settings.SCRAPER_LEAN_BROWSER if lean is None else lean
+    options = webdriver.ChromeOptions()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--headless')
+    options.add_argument('--disable-dev-shm-usage')
+    if lean:
+        options.page_load_strategy = 'eager'
+    driver = webdriver.Chrome(service=webdriver.chrome.service.Service(resolve_chromedriver_path()), options=options)
+    if lean:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(settings.SCRAPER_LEAN_BLOCKED_URLS)})
+    return driver
+
+
+def page_weight(driver: webdriver.Chrome) -> Tuple[int, float]:
+    """Bytes transferred and milliseconds to DOM ready for the page currently loaded"""
+    return tuple(driver.execute_script(
+        """
+        const nav = performance.getEntriesByType('navigation')[0];
+        const resources = performance.getEntriesByType('resource');
+        const bytes = (nav ? nav.transferSize : 0) + resources.reduce((total, r) => total + r.transferSize, 0);
+        const ms = nav ? nav.domContentLoadedEventEnd - nav.startTime : 0;
+        return [bytes, ms];
+        """
+    ))
+
+
+class WebDriverPool:
+    """Process-wide pool of warm Chrome sessions shared by scrape jobs.
+
+    Jobs check a session out, which navigates it to their results URL, and
+    check it back in when done. Sessions are health-checked on checkout and
+    recycled after ``max_uses`` checkouts or once their JS heap grows past
+    ``max_heap_mb``. ``warm_up()`` pre-starts sessions in the background until
+    ``warm`` sit idle; it runs at startup and again whenever a session is
+    handed out or discarded, so the pool doesn't cool down. A checkout waits
+    for a session that is already being pre-started rather than starting a
+    second Chrome next to it.
+    """
+
+    def __init__(self, size: int, warm: int, max_uses: int, max_heap_mb: float):
+        self.size = size
+        self.warm = min(warm, size)
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self._idle: List[webdriver.Chrome] = []
+        self._uses: Dict[int, int] = {}
+        self._open = 0
+        self._condition = threading.Condition()
+        self._warming = False
+        # Sessions the warm-up thread is starting, and checkouts already waiting for one of them
+        self._starting = 0
+        self._expecting = 0
+
+    def warm_up(self) -> None:
+        """Pre-start sessions in the background until `warm` are idle; a no-op while that's already under way"""
+        with self._condition:
+            if self._warming or not self._needs_warming():
+                return
+            self._warming = True
+        threading.Thread(target=self._fill_warm, name='webdriver-warmup', daemon=True).start()
+
+    def checkout(self, url: str, timeout: Optional[float] = None) -> webdriver.Chrome:
+        """Take a healthy session, pointed at url, waiting up to timeout for one to free up"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            driver = self._take_idle_or_reserve(deadline)
+            if driver is None:
+                try:
+                    driver = create_driver()
+                except Exception:
+                    with self._condition:
+                        self._open -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._uses[id(driver)] = 0
+            elif not self._is_healthy(driver):
+                self.discard(driver)
+                continue
+            try:
+                driver.get(url)
+            except WebDriverException as e:
+                print(f"Pooled webdriver failed to load {url}: {str(e)}")
+                self.discard(driver)
+                continue
+            print(f"Navigated to {url}")
+            # Have the next one ready for whoever checks out after us
+            self.warm_up()
+            return driver
+
+    def checkin(self, driver: webdriver.Chrome) -> None:
+        """Return a session after a job, recycling it if it is worn out"""
+        with self._condition:
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+        if uses >= self.max_uses or self._heap_mb(driver) > self.max_heap_mb or not self._is_healthy(driver):
+            print(f"Recycling webdriver after {uses} use(s)")
+            self.discard(driver)
+            return
+        with self._condition:
+            self._idle.append(driver)
+            self._condition.notify()
+
+    def discard(self, driver: webdriver.Chrome) -> None:
+        """Quit a session and free its slot"""
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Failed to quit webdriver: {str(e)}")
+        with self._condition:
+            self._uses.pop(id(driver), None)
+            self._open -= 1
+            self._condition.notify()
+        self.warm_up()
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {'size': self.size, 'open': self._open, 'idle': len(self._idle), 'starting': self._starting}
+
+    def _take_idle_or_reserve(self, deadline: Optional[float]) -> Optional[webdriver.Chrome]:
+        """Pop an idle session, or reserve a slot for a new one (returns None)"""
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                # A session being pre-started that no other checkout is waiting for will be ours
+                expect_warm = self._starting > self._expecting
+                if not expect_warm and self._open < self.size:
+                    self._open += 1
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No webdriver available in the pool")
+                self._expecting += expect_warm
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._expecting -= expect_warm
+
+    def _needs_warming(self) -> bool:
+        return len(self._idle) + self._starting < self.warm and self._open < self.size
+
+    def _fill_warm(self) -> None:
+        """Start sessions one at a time until `warm` are idle or the pool is full"""
+        while True:
+            with self._condition:
+                if not self._needs_warming():
+                    self._warming = False
+                    return
+                self._open += 1
+                self._starting += 1
+            try:
+                driver = create_driver()
+            except Exception as e:
+                print(f"Failed to pre-start webdriver: {str(e)}")
+                with self._condition:
+                    self._open -= 1
+                    self._starting -= 1
+                    self._warming = False
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._uses[id(driver)] = 0
+                self._starting -= 1
+                self._idle.append(driver)
+                self._condition.notify_all()
+
+    def _is_healthy(self, driver: webdriver.Chrome) -> bool:
+        try:
+            driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _heap_mb(self, driver: webdriver.Chrome) -> float:
+        """JS heap of the page the session is on; Chrome's own memory (renderer, GPU, caches) isn't counted"""
+        try:
+            used = driver.execute_script("return performance.memory ? performance.memory.usedJSHeapSize : 0;")
+            return (used or 0) / (1024 * 1024)
+        except WebDriverException:
+            return 0.0
+
+
+_pool: Optional[WebDriverPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> WebDriverPool:
+    """Return the process-wide webdriver pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WebDriverPool(
+                    size=settings.SCRAPER_DRIVER_POOL_SIZE,
+                    warm=settings.SCRAPER_DRIVER_POOL_WARM,
+                    max_uses=settings.SCRAPER_DRIVER_MAX_USES,
+                    max_heap_mb=settings.SCRAPER_DRIVER_MAX_HEAP_MB,
+                )
+    return _pool
+
+
+def warm_driver_pool() -> None:
+    """Start pre-starting Chrome sessions at process startup when scrapes default to Selenium"""
+    if settings.SCRAPER_DEFAULT_ENGINE == 'selenium' and settings.SCRAPER_DRIVER_POOL_WARM > 0:
+        get_driver_pool().warm_up()
@@ -0,0 +1,242 @@
+import csv
+import importlib.util
+import io
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import msgpack
+import pandas as pd
+from .xlsx_stream import XLSX_CONTENT_TYPE, Sheet, stream_workbook
+
+FORMAT_XLSX = 'xlsx'
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMAT_MSGPACK = 'msgpack'
+FORMAT_PARQUET = 'parquet'
+EXPORT_FORMATS = (FORMAT_XLSX, FORMAT_CSV, FORMAT_NDJSON, FORMAT_MSGPACK, FORMAT_PARQUET)
+# Content-Type sent for each format
+EXPORT_CONTENT_TYPES = {
+    FORMAT_XLSX: XLSX_CONTENT_TYPE,
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+    FORMAT_NDJSON: 'application/x-ndjson',
+    FORMAT_MSGPACK: 'application/msgpack',
+    FORMAT_PARQUET: 'application/vnd.apache.parquet',
+}
+# Media types accepted for each format in an Accept header
+ACCEPT_TYPES = {
+    XLSX_CONTENT_TYPE: FORMAT_XLSX,
+    'text/csv': FORMAT_CSV,
+    'application/x-ndjson': FORMAT_NDJSON,
+    'application/ndjson': FORMAT_NDJSON,
+    'application/jsonl': FORMAT_NDJSON,
+    'application/msgpack': FORMAT_MSGPACK,
+    'application/x-msgpack': FORMAT_MSGPACK,
+    'application/vnd.msgpack': FORMAT_MSGPACK,
+    'application/vnd.apache.parquet': FORMAT_PARQUET,
+    'application/x-parquet': FORMAT_PARQUET,
+}
+# Columns that hold text; every other export column is a mark, semester or total and is
+# typed as a nullable integer where the format has types (Parquet)
+TEXT_COLUMNS = {'Sheet', 'USN', 'Student Name', 'Subject Code', 'Subject Name', 'Result', 'Change'}
+CHUNK_SIZE = 64 * 1024
+PARQUET_ROW_GROUP = 10_000
+
+
+class ExportFormatError(ValueError):
+    """An export format that is unknown or can't be produced here"""
+
+
+def available_formats() -> Tuple[str, ...]:
+    # Parquet needs pyarrow, which a slim install may leave out
+    if importlib.util.find_spec('pyarrow') is None:
+        return tuple(name for name in EXPORT_FORMATS if name != FORMAT_PARQUET)
+    return EXPORT_FORMATS
+
+
+def select_export_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """Export format for a request: an explicit ``format`` parameter, else the best Accept match, else xlsx.
+
+    Media types in Accept that aren't export formats (application/json,
+    */*, ...) are ignored, so existing clients keep getting xlsx.
+    """
+    formats = available_formats()
+    if requested:
+        requested = requested.strip().lower()
+        if requested not in EXPORT_FORMATS:
+            raise ExportFormatError(f"Unknown format '{requested}'. Use one of: {', '.join(formats)}.")
+        if requested not in formats:
+            raise ExportFormatError(f"The {requested} format is not available on this server.")
+        return requested
+    best, best_quality = FORMAT_XLSX, 0.0
+    for media_range in (accept or '').split(','):
+        media_type, *params = [part.strip() for part in media_range.split(';')]
+        export_format = ACCEPT_TYPES.get(media_type.lower())
+        if export_format not in formats:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > best_quality:
+            best, best_quality = export_format, quality
+    return best
+
+
+def export_file_name(export_format: str, base: str = 'Sem Results') -> str:
+    return f'{base}.{export_format}'
+
+
+def stream_export(sheets: Sequence[Sheet], export_format: str) -> Iterator[bytes]:
+    """Yield the sheets encoded in an export format, chunk by chunk, as their rows are produced.
+
+    xlsx keeps one worksheet per sheet. The flat formats write one table:
+    a single sheet as is, several with a leading 'Sheet' column over the union
+    of their columns.
+    """
+    if export_format == FORMAT_XLSX:
+        return stream_workbook(sheets)
+    writers: Dict[str, Callable[[List[str], Iterable[List]], Iterator[bytes]]] = {
+        FORMAT_CSV: _stream_csv,
+        FORMAT_NDJSON: _stream_ndjson,
+        FORMAT_MSGPACK: _stream_msgpack,
+        FORMAT_PARQUET: _stream_parquet,
+    }
+    if export_format not in writers:
+        raise ExportFormatError(f"Unknown format '{export_format}'")
+    columns, rows = _flatten(sheets)
+    return writers[export_format](columns, rows)
+
+
+def _flatten(sheets: Sequence[Sheet]) -> Tuple[List[str], Iterable[List]]:
+    if len(sheets) == 1:
+        _, columns, rows = sheets[0]
+        return list(columns), rows
+    columns = ['Sheet']
+    for _, sheet_columns, _ in sheets:
+        columns.extend(column for column in sheet_columns if column not in columns)
+    position = {column: index for index, column in enumerate(columns)}
+
+    def rows() -> Iterator[List]:
+        for name, sheet_columns, sheet_rows in sheets:
+            positions = [position[column] for column in sheet_columns]
+            for row in sheet_rows:
+                merged = [name] + [None] * (len(columns) - 1)
+                for index, value in zip(positions, row):
+                    merged[index] = value
+                yield merged
+
+    return columns, rows()
+
+
+def _stream_csv(columns: List[str], rows: Iterable[List]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield _drain(buffer).encode()
+    yield _drain(buffer).encode()
+
+
+def _stream_ndjson(columns: List[str], rows: Iterable[List]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        buffer.write('\n')
+        if buffer.tell() >= CHUNK_SIZE:
+            yield _drain(buffer).encode()
+    yield _drain(buffer).encode()
+
+
+def _stream_msgpack(columns: List[str], rows: Iterable[List]) -> Iterator[bytes]:
+    """A stream of maps, one per row, readable with msgpack.Unpacker"""
+    packer = msgpack.Packer()
+    chunks, size = [], 0
+    for row in rows:
+        packed = packer.pack(dict(zip(columns, row)))
+        chunks.append(packed)
+        size += len(packed)
+        if size >= CHUNK_SIZE:
+            yield b''.join(chunks)
+            chunks, size = [], 0
+    yield b''.join(chunks)
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only file object that collects what the Parquet writer produces until it's drained"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _stream_parquet(columns: List[str], rows: Iterable[List]) -> Iterator[bytes]:
+    """Row groups of PARQUET_ROW_GROUP rows, each sent once it is written; the footer comes last"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.string() if column in TEXT_COLUMNS else pa.int32()) for column in columns])
+    sink = _ParquetSink()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_ROW_GROUP:
+                writer.write_table(_parquet_table(schema, batch))
+                batch = []
+                yield sink.drain()
+        if batch:
+            writer.write_table(_parquet_table(schema, batch))
+    yield sink.drain()
+
+
+def _parquet_table(schema, batch: List[List]):
+    import pyarrow as pa
+
+    return pa.table(
+        [pa.array([row[index] for row in batch], type=field.type) for index, field in enumerate(schema)],
+        schema=schema,
+    )
+
+
+def _drain(buffer: io.StringIO) -> str:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def read_results_file(file, name: str) -> pd.DataFrame:
+    """Load an exported results file, choosing the reader from its extension (xlsx if unknown)"""
+    suffix = Path(name).suffix.lower().lstrip('.')
+    if suffix == FORMAT_CSV:
+        return pd.read_csv(file)
+    if suffix in (FORMAT_NDJSON, 'jsonl'):
+        return pd.read_json(file, lines=True)
+    if suffix == FORMAT_MSGPACK:
+        return pd.DataFrame(list(msgpack.Unpacker(file, raw=False)))
+    if suffix == FORMAT_PARQUET:
+        return pd.read_parquet(file)
+    return pd.read_excel(file)
@@ -0,0 +1,88 @@
+import re
+import requests
+from typing import Optional, Tuple
+from urllib.parse import urljoin
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+# The failure response: a script alert followed by a redirect back to the form. Anchoring on the redirect
+# keeps an unrelated alert() in a result page's inline scripts from reading as a rejection.
+ALERT_PATTERN = re.compile(
+    r"alert\(\s*(['\"])(.*?)\1\s*\)\s*;?\s*(?:window\.|document\.)?(?:location|history)", re.DOTALL
+)
+
+
+class HttpResultSession:
+    """Browserless client for a VTU results page.
+
+    Mirrors what the Selenium engine does through Chrome: load the form,
+    fetch the captcha image, post the ``lns``/``captchacode`` form and hand
+    back the response HTML. Cookies live in a ``requests.Session`` so the
+    captcha and the submission share the same server-side session.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.timeout = settings.SCRAPER_HTTP_TIMEOUT
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.SCRAPER_HTTP_POOL_SIZE, max_retries=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": settings.SCRAPER_HTTP_USER_AGENT})
+        self.form_action = None
+        self.captcha_url = None
+        self.hidden_fields = {}
+        self.closed = False
+
+    def load_form(self) -> None:
+        """Fetch the results form and remember its action, captcha and hidden fields"""
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        tree = lxml_html.fromstring(response.content)
+        forms = tree.xpath('//form[.//input[@name="lns"]]')
+        if not forms:
+            raise ValueError(f"No results form found at {self.url}")
+        form = forms[0]
+        self.form_action = urljoin(response.url, form.get("action") or response.url)
+        self.hidden_fields = {
+            field.get("name"): field.get("value", "")
+            for field in form.xpath('.//input[@type="hidden"][@name]')
+        }
+        captcha_src = form.xpath('.//img/@src')
+        if not captcha_src:
+            raise ValueError(f"No captcha image found at {self.url}")
+        self.captcha_url = urljoin(response.url, captcha_src[0])
+
+    def fetch_captcha(self) -> bytes:
+        """Download a fresh captcha image for the current session"""
+        if self.captcha_url is None:
+            self.load_form()
+        response = self.session.get(self.captcha_url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def submit(self, usn: str, captcha_text: str) -> Tuple[Optional[str], str]:
+        """Post the results form and return (alert text, response HTML)"""
+        data = dict(self.hidden_fields)
+        data["lns"] = usn
+        data["captchacode"] = captcha_text
+        response = self.session.post(
+            self.form_action, data=data, timeout=self.timeout, headers={"Referer": self.url}
+        )
+        response.raise_for_status()
+        page = response.text
+        match = ALERT_PATTERN.search(page)
+        if match:
+            # The server answers failures with a script alert and a redirect back to
+            # the form, which may carry a new token
+            self.load_form()
+            return match.group(2), page
+        return None, page
+
+    def is_alive(self) -> bool:
+        return not self.closed
+
+    def close(self) -> None:
+        self.session.close()
+        self.closed = True
@@ -0,0 +1,97 @@
+import re
+from typing import Dict, Iterable, List, Optional
+from django.conf import settings
+from django.db import transaction
+from .models import Batch, Marks, Semester, Student, Subject
+
+USN_PATTERN = re.compile(r"^\d[A-Z]{2}\d{2}[A-Z]{2}\d{3}$")
+SEMESTERS = range(1, 9)
+SUBJECT_CODE_LENGTH = Subject._meta.get_field('name').max_length
+
+
+def ingest_records(records: Iterable[Dict], batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Upsert scraped student records into Batch, Semester, Student, Subject and Marks.
+
+    Every table is written with one ``bulk_create`` per ``batch_size`` rows and
+    read back with one query per chunk of keys, so the query count depends on
+    the batch size rather than on the number of students or marks. Re-ingesting
+    a student overwrites their name, batch, semester and marks.
+    """
+    batch_size = batch_size or settings.SCRAPER_INGEST_BATCH_SIZE
+    students = {}
+    marks = {}
+    for record in records:
+        usn = record['usn'].upper()
+        if not USN_PATTERN.match(usn) or 'semesters' not in record:
+            print(f"Skipping ingestion of USN {usn}: malformed USN or no per-semester data")
+            continue
+        semesters = [block for block in record['semesters'] if block['semester'] in SEMESTERS]
+        if not semesters:
+            continue
+        students[usn] = (record['name'], 2000 + int(usn[3:5]), max(block['semester'] for block in semesters))
+        for block in semesters:
+            for code, _, _, _, total, _ in block['subjects']:
+                if total.isdigit() and len(code) <= SUBJECT_CODE_LENGTH:
+                    marks[(usn, code, block['semester'])] = int(total)
+    if not students:
+        return {'students': 0, 'subjects': 0, 'marks': 0}
+
+    with transaction.atomic():
+        Semester.objects.bulk_create(
+            [Semester(semester=number) for number in {key[2] for key in marks} | {s[2] for s in students.values()}],
+            ignore_conflicts=True,
+        )
+        semester_ids = dict(Semester.objects.values_list('semester', 'id'))
+        years = {student[1] for student in students.values()}
+        Batch.objects.bulk_create([Batch(batch=year) for year in years], ignore_conflicts=True)
+        batch_ids = dict(Batch.objects.filter(batch__in=years).values_list('batch', 'id'))
+
+        Student.objects.bulk_create(
+            [
+                Student(usn=usn, name=name, batch_id=batch_ids[year], semester_id=semester_ids[semester])
+                for usn, (name, year, semester) in students.items()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['usn'],
+            update_fields=['name', 'batch', 'semester'],
+        )
+        student_ids = {}
+        for chunk in _chunks(list(students), batch_size):
+            student_ids.update(Student.objects.filter(usn__in=chunk).values_list('usn', 'id'))
+
+        subjects = {(code, semester) for _, code, semester in marks}
+        Subject.objects.bulk_create(
+            [Subject(name=code, semester_id=semester_ids[semester]) for code, semester in subjects],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        subject_ids = {}
+        for chunk in _chunks(sorted({code for code, _ in subjects}), batch_size):
+            for subject_id, code, semester in Subject.objects.filter(name__in=chunk).values_list(
+                'id', 'name', 'semester__semester'
+            ):
+                subject_ids[(code, semester)] = subject_id
+
+        Marks.objects.bulk_create(
+            [
+                Marks(
+                    student_id=student_ids[usn],
+                    subject_id=subject_ids[(code, semester)],
+                    semester_id=semester_ids[semester],
+                    marks=total,
+                )
+                for (usn, code, semester), total in marks.items()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['student', 'subject', 'semester'],
+            update_fields=['marks'],
+        )
+    print(f"Ingested {len(students)} students, {len(subjects)} subjects and {len(marks)} marks")
+    return {'students': len(students), 'subjects': len(subjects), 'marks': len(marks)}
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
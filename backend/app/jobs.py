@@ -0,0 +1,189 @@
+import os
+import redis
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from django.utils import timezone
+from .models import ScrapeJob
+from .shards import LeaseHeartbeat, get_shard_coordinator
+
+
+class DatabaseJobQueue:
+    """Queue backed by the ScrapeJob table itself; pending jobs are claimed oldest first"""
+
+    def enqueue(self, job: ScrapeJob) -> None:
+        # Pending rows are the queue, nothing else to do
+        pass
+
+    def claim(self, timeout: float) -> Optional[ScrapeJob]:
+        deadline = time.monotonic() + timeout
+        while True:
+            for job_id in ScrapeJob.objects.filter(status=ScrapeJob.STATUS_PENDING).order_by('created_at').values_list(
+                'id', flat=True
+            )[:5]:
+                job = claim_job(job_id)
+                if job is not None:
+                    return job
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(settings.SCRAPER_JOB_POLL_INTERVAL)
+
+
+class RedisJobQueue:
+    """Queue of job IDs in a Redis list; the database row stays the source of truth"""
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url)
+        self.key = settings.SCRAPER_JOB_QUEUE_KEY
+
+    def enqueue(self, job: ScrapeJob) -> None:
+        self.client.rpush(self.key, str(job.id))
+
+    def claim(self, timeout: float) -> Optional[ScrapeJob]:
+        item = self.client.blpop([self.key], timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        return claim_job(item[1].decode())
+
+
+def claim_job(job_id) -> Optional[ScrapeJob]:
+    """Atomically move a pending job to running; None if another worker got it first"""
+    claimed = ScrapeJob.objects.filter(pk=job_id, status=ScrapeJob.STATUS_PENDING).update(
+        status=ScrapeJob.STATUS_RUNNING
+    )
+    if not claimed:
+        return None
+    return ScrapeJob.objects.get(pk=job_id)
+
+
+def job_is_stale(job: ScrapeJob) -> bool:
+    """True when a job hasn't changed or settled a USN for SCRAPER_JOB_STALE_AFTER seconds"""
+    last_checkpoint = job.results.aggregate(latest=Max('scraped_at'))['latest']
+    last_active = max(moment for moment in (job.updated_at, last_checkpoint) if moment is not None)
+    return timezone.now() - last_active > timedelta(seconds=settings.SCRAPER_JOB_STALE_AFTER)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Redis queue when SCRAPER_REDIS_URL is set, otherwise the database queue"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = RedisJobQueue(settings.SCRAPER_REDIS_URL) if settings.SCRAPER_REDIS_URL else DatabaseJobQueue()
+    return _queue
+
+
+def submit_job(job: ScrapeJob) -> None:
+    """Queue a job for the background workers"""
+    if job.status != ScrapeJob.STATUS_PENDING:
+        job.status = ScrapeJob.STATUS_PENDING
+        job.save(update_fields=['status', 'updated_at'])
+    get_job_queue().enqueue(job)
+    if settings.SCRAPER_RUN_JOBS_IN_PROCESS:
+        start_job_workers(settings.SCRAPER_JOB_WORKERS)
+
+
+def run_job_worker(stop: Optional[threading.Event] = None) -> None:
+    """Claim and run queued jobs until stop is set, working on leased shards of running jobs first"""
+    from .scraper import ResultScraperService
+
+    queue = get_job_queue()
+    shards = get_shard_coordinator() if settings.SCRAPER_SHARD_SIZE > 0 else None
+    worker = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        if shards is not None:
+            try:
+                if run_next_shard(shards, worker):
+                    continue
+            except Exception as e:
+                print(f"Failed to work on a job shard: {str(e)}")
+                time.sleep(settings.SCRAPER_JOB_POLL_INTERVAL)
+                continue
+        try:
+            job = queue.claim(timeout=settings.SCRAPER_JOB_POLL_TIMEOUT)
+        except Exception as e:
+            print(f"Failed to claim a scrape job: {str(e)}")
+            time.sleep(settings.SCRAPER_JOB_POLL_INTERVAL)
+            continue
+        if job is None:
+            continue
+        print(f"Worker picked up job {job.id}")
+        try:
+            service = ResultScraperService(job.engine)
+            if shards is not None and job.total_usns > settings.SCRAPER_SHARD_SIZE:
+                service.start_sharded_job(job, shards)
+            else:
+                service.scrape_job(job)
+        except Exception as e:
+            print(f"Job {job.id} crashed: {str(e)}")
+    connection.close()
+
+
+def run_next_shard(shards, worker: str) -> bool:
+    """Lease one shard of any sharded job and scrape it; False if no shard was free"""
+    from .scraper import ResultScraperService
+
+    for job_id in shards.active_jobs():
+        lease = shards.claim(job_id, worker)
+        if lease is None:
+            # Every shard may be done with the worker that completed the last one gone before finalizing
+            if shards.finalize(job_id):
+                finish_sharded_job(shards, job_id)
+                return True
+            continue
+        shard_id, usns = lease
+        job = ScrapeJob.objects.filter(pk=job_id, status=ScrapeJob.STATUS_RUNNING).first()
+        if job is None:
+            # Failed, or re-queued as a whole: its shards are stale
+            shards.discard(job_id)
+            return True
+        service = ResultScraperService(job.engine)
+        print(f"Worker {worker} leased shard {shard_id} ({len(usns)} USNs) of job {job.id}")
+        with LeaseHeartbeat(shards, job_id, shard_id, worker) as lease_keeper:
+            try:
+                service.scrape_shard(job, usns, lease_keeper.lost)
+            except Exception as e:
+                print(f"Shard {shard_id} of job {job.id} crashed: {str(e)}")
+                shards.release(job_id, shard_id, worker)
+                return True
+        if lease_keeper.lost.is_set() or not shards.complete(job_id, shard_id, worker):
+            return True
+        if shards.finalize(job_id):
+            service.finish_sharded_job(job, shards)
+        return True
+    return False
+
+
+def finish_sharded_job(shards, job_id) -> None:
+    """Settle a sharded job whose last shard was finished by a worker that didn't get to finalize it"""
+    from .scraper import ResultScraperService
+
+    job = ScrapeJob.objects.filter(pk=job_id, status=ScrapeJob.STATUS_RUNNING).first()
+    if job is None:
+        shards.discard(job_id)
+        return
+    print(f"Finalizing job {job.id}, whose shards are all done")
+    ResultScraperService(job.engine).finish_sharded_job(job, shards)
+
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def start_job_workers(count: int) -> None:
+    """Start background job worker threads in this process, once"""
+    with _workers_lock:
+        while len(_workers) < count:
+            thread = threading.Thread(target=run_job_worker, name=f'scrape-job-{len(_workers)}', daemon=True)
+            thread.start()
+            _workers.append(thread)
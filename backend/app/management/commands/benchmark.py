@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run scraper micro-benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("suites", nargs="*", help=f"Suites to run (default: all). Available: {', '.join(SUITES)}")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        names = options["suites"] or list(SUITES)
+        unknown = [name for name in names if name not in SUITES]
+        if unknown:
+            raise CommandError(f"Unknown benchmark suite(s): {', '.join(unknown)}")
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"[{name}]"))
+            SUITES[name](options["repeat"], self.stdout.write)
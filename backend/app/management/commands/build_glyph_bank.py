@@ -0,0 +1,36 @@
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from app.captcha import GlyphBank, load_labelled_captchas
+from app.stub_server import synthetic_captcha
+
+
+class Command(BaseCommand):
+    help = "Build the captcha solver's glyph template bank from labelled captchas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fixtures", help="Directory of labelled captchas named '<TEXT>.png', e.g. from collect_captchas"
+        )
+        parser.add_argument(
+            "--synthetic", type=int, default=0, help="Also train on N captchas rendered by the stub results server"
+        )
+        parser.add_argument("--max-per-label", type=int, default=24)
+        parser.add_argument("--output", default=settings.SCRAPER_GLYPH_BANK)
+
+    def handle(self, *args, **options):
+        samples = []
+        if options["fixtures"]:
+            samples.extend(load_labelled_captchas(Path(options["fixtures"])))
+        samples.extend(synthetic_captcha(seed) for seed in range(10_000, 10_000 + options["synthetic"]))
+        if not samples:
+            raise CommandError("Pass --fixtures and/or --synthetic to provide training captchas")
+
+        bank = GlyphBank.build(samples, options["max_per_label"])
+        output = Path(options["output"])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        bank.save(output)
+        self.stdout.write(
+            f"Saved {len(bank.labels)} templates for {len(set(bank.labels))} characters "
+            f"from {len(samples)} captchas to {output}"
+        )
@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from app.captcha import CAPTCHA_FIXTURES, CAPTCHA_LENGTH, isolate_glyph_band
+from app.http_engine import HttpResultSession
+from app.ocr import get_ocr_pool
+
+# Seat number that never has a result, so an accepted captcha is answered "not available"
+PROBE_USN = '0XX00XX000'
+
+
+class Command(BaseCommand):
+    help = (
+        "Save captchas from a results page as labelled fixtures for build_glyph_bank, keeping only those "
+        "whose Tesseract read the server accepted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", required=True, help="Results page, e.g. https://results.vtu.ac.in/.../index.php")
+        parser.add_argument("--count", type=int, default=200, help="Labelled captchas to save")
+        parser.add_argument("--max-attempts", type=int, default=0, help="Give up after this many (default 10 x count)")
+        parser.add_argument("--delay", type=float, default=1.0, help="Seconds between submissions")
+        parser.add_argument("--output", default=str(CAPTCHA_FIXTURES))
+
+    def handle(self, *args, **options):
+        output = Path(options["output"])
+        output.mkdir(parents=True, exist_ok=True)
+        count = options["count"]
+        max_attempts = options["max_attempts"] or 10 * count
+        session = HttpResultSession(options["url"])
+        saved = attempts = 0
+        try:
+            session.load_form()
+            while saved < count and attempts < max_attempts:
+                attempts += 1
+                image = session.fetch_captcha()
+                text, _ = get_ocr_pool().submit(isolate_glyph_band(image)).result(timeout=settings.SCRAPER_OCR_TIMEOUT)
+                text = text.upper()
+                if len(text) != CAPTCHA_LENGTH or not text.isalnum():
+                    continue
+                alert, _ = session.submit(PROBE_USN, text)
+                if alert is None or 'captcha' not in alert.lower():
+                    # The server took the read, so it is the captcha's text
+                    (output / f"{text}_{int(time.time() * 1000)}.png").write_bytes(image)
+                    saved += 1
+                time.sleep(options["delay"])
+        finally:
+            session.close()
+        if not saved:
+            raise CommandError(f"No captcha read was accepted in {attempts} attempts")
+        self.stdout.write(f"Saved {saved} labelled captchas from {attempts} attempts to {output}")
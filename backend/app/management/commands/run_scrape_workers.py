@@ -0,0 +1,31 @@
+import threading
+from django.core.management.base import BaseCommand
+from app.driver_pool import warm_driver_pool
+from app.jobs import run_job_worker
+
+
+class Command(BaseCommand):
+    help = "Run background workers that process queued scrape jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Jobs to run at the same time")
+
+    def handle(self, *args, **options):
+        warm_driver_pool()
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=run_job_worker, args=(stop,), name=f"scrape-job-{i}", daemon=True)
+            for i in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Processing scrape jobs with {len(threads)} worker(s), Ctrl+C to stop")
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            stop.set()
+            self.stdout.write("Stopping after the current jobs finish...")
+            for thread in threads:
+                thread.join()
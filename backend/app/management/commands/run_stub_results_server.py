@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from app.stub_server import make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for a VTU results page to test the scraper offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--students", type=int, default=60, help="USN suffixes 1..N have results")
+        parser.add_argument("--semesters", type=int, default=1, help="Semester blocks per result page")
+        parser.add_argument(
+            "--accept-any-captcha", action="store_true", help="Skip captcha checks (no Tesseract needed)"
+        )
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options["host"],
+            options["port"],
+            students=options["students"],
+            semesters=options["semesters"],
+            accept_any_captcha=options["accept_any_captcha"],
+        )
+        self.stdout.write(f"Stub results server on http://{options['host']}:{options['port']}/index.php")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
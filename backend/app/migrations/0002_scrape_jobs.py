@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:21
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('prefix_usn', models.CharField(max_length=7)),
+                ('usn_range', models.CharField(max_length=100)),
+                ('url', models.URLField()),
+                ('is_reval', models.BooleanField(default=False)),
+                ('engine', models.CharField(max_length=20)),
+                ('workers', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('partial', 'Partial'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScrapeJobResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('usn', models.CharField(max_length=10)),
+                ('position', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('scraped', 'Scraped'), ('not_found', 'Not found')], max_length=20)),
+                ('record', models.JSONField(blank=True, null=True)),
+                ('scraped_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='app.scrapejob')),
+            ],
+            options={
+                'unique_together': {('job', 'usn')},
+            },
+        ),
+    ]
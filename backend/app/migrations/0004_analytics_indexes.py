@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_scrape_job_total_usns'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='subject',
+            unique_together={('name', 'semester')},
+        ),
+        migrations.AddIndex(
+            model_name='marks',
+            index=models.Index(fields=['subject', 'marks'], name='marks_subject_marks_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marks',
+            index=models.Index(fields=['semester', 'student'], name='marks_semester_student_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_analytics_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='diff',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='incremental',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='scrapejobresult',
+            name='carried_over',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='scrapejobresult',
+            index=models.Index(fields=['usn', 'scraped_at'], name='scrape_result_usn_time_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_incremental_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scrapejobresult',
+            name='status',
+            field=models.CharField(choices=[('scraped', 'Scraped'), ('not_found', 'Not found'), ('skipped', 'Skipped past the end of the range')], max_length=20),
+        ),
+    ]
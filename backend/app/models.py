@@ -1,4 +1,5 @@
 import re
+import uuid
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
@@ -33,6 +34,9 @@ class Subject(models.Model):
         Semester, on_delete=models.CASCADE, related_name="subjects"
     )
 
+    class Meta:
+        unique_together = ("name", "semester")
+
     def __str__(self):
         return self.name
 
@@ -66,6 +70,78 @@ class Marks(models.Model):
 
     class Meta:
         unique_together = ("student", "subject", "semester")
+        indexes = [
+            # Per-subject and per-semester aggregates in the analytics queries
+            models.Index(fields=["subject", "marks"], name="marks_subject_marks_idx"),
+            models.Index(fields=["semester", "student"], name="marks_semester_student_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.student.name} - {self.subject.name}: {self.marks}"
+
+
+class ScrapeJob(models.Model):
+    """A scrape request whose per-USN progress is checkpointed so it can resume"""
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_PARTIAL = "partial"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_PARTIAL, "Partial"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    prefix_usn = models.CharField(max_length=7)
+    usn_range = models.CharField(max_length=100)
+    url = models.URLField()
+    is_reval = models.BooleanField(default=False)
+    engine = models.CharField(max_length=20)
+    workers = models.PositiveSmallIntegerField(default=1)
+    total_usns = models.PositiveIntegerField(default=0)
+    # Incremental jobs reuse fresh results stored for the same URL and record what changed
+    incremental = models.BooleanField(default=False)
+    diff = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.prefix_usn} {self.usn_range}): {self.status}"
+
+
+class ScrapeJobResult(models.Model):
+    """Checkpoint for one finished USN of a scrape job"""
+
+    STATUS_SCRAPED = "scraped"
+    STATUS_NOT_FOUND = "not_found"
+    STATUS_SKIPPED = "skipped"
+    STATUS_CHOICES = (
+        (STATUS_SCRAPED, "Scraped"),
+        (STATUS_NOT_FOUND, "Not found"),
+        (STATUS_SKIPPED, "Skipped past the end of the range"),
+    )
+
+    job = models.ForeignKey(ScrapeJob, on_delete=models.CASCADE, related_name="results")
+    usn = models.CharField(max_length=10)
+    position = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    record = models.JSONField(null=True, blank=True)
+    # Copied from an earlier job by an incremental run rather than fetched by this one
+    carried_over = models.BooleanField(default=False)
+    scraped_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("job", "usn")
+        indexes = [
+            models.Index(fields=["usn", "scraped_at"], name="scrape_result_usn_time_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.student.name} - {self.subject.name}: {self.marks}"
\ No newline at end of file
+        return f"{self.usn} ({self.status})"
@@ -0,0 +1,120 @@
+import threading
+import time
+import pytesseract
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from PIL import Image
+
+try:
+    # Keeps a Tesseract engine loaded in-process; falls back to pytesseract when missing
+    from tesserocr import OEM, PSM, PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+TESSERACT_CONFIG = '--psm 7 --oem 1'
+# Reported by a system check and in the pool stats while OCR runs without a warm engine
+FALLBACK_WARNING = (
+    "tesserocr is not installed, so every captcha forks a tesseract process and reloads its model; "
+    "pip install tesserocr (needs libtesseract-dev and libleptonica-dev)"
+)
+
+
+class OcrPool:
+    """Long-lived pool of OCR worker threads shared by every scrape job.
+
+    With tesserocr installed each worker holds a warm ``PyTessBaseAPI`` so the
+    LSTM model is loaded once per thread instead of once per captcha.
+    Without it the workers still bound how many ``tesseract`` processes run at
+    once. ``stats()`` reports queue depth and call latency for sizing.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='ocr')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._calls = 0
+        self._failures = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+        self._last_ms = 0.0
+
+    @property
+    def engine(self) -> str:
+        return 'tesserocr' if PyTessBaseAPI is not None else 'pytesseract'
+
+    def submit(self, image: Image.Image) -> Future:
+        """Queue an image for OCR; the future resolves to (stripped text, 0..1 confidence)"""
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(self._run, image)
+
+    def _run(self, image: Image.Image) -> Tuple[str, float]:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        start = time.perf_counter()
+        failed = False
+        try:
+            return self._image_to_string(image)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._running -= 1
+                self._calls += 1
+                self._failures += failed
+                self._total_ms += elapsed
+                self._last_ms = elapsed
+                self._max_ms = max(self._max_ms, elapsed)
+
+    def _image_to_string(self, image: Image.Image) -> Tuple[str, float]:
+        if PyTessBaseAPI is None:
+            data = pytesseract.image_to_data(image, config=TESSERACT_CONFIG, output_type=pytesseract.Output.DICT)
+            words = [(word.strip(), float(conf)) for word, conf in zip(data['text'], data['conf']) if word.strip()]
+            text = ''.join(word for word, _ in words)
+            confidences = [conf for _, conf in words]
+        else:
+            api = getattr(self._local, 'api', None)
+            if api is None:
+                api = PyTessBaseAPI(psm=PSM.SINGLE_LINE, oem=OEM.LSTM_ONLY)
+                self._local.api = api
+            api.SetImage(image)
+            text = api.GetUTF8Text().strip()
+            confidences = api.AllWordConfidences()
+        # Tesseract scores whole words, so the weakest word bounds every character in it
+        return text, min(confidences) / 100 if confidences else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'engine': self.engine,
+                'workers': self.size,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'calls': self._calls,
+                'failures': self._failures,
+                'avg_latency_ms': round(self._total_ms / self._calls, 3) if self._calls else 0.0,
+                'last_latency_ms': round(self._last_ms, 3),
+                'max_latency_ms': round(self._max_ms, 3),
+                'warning': FALLBACK_WARNING if PyTessBaseAPI is None else '',
+            }
+
+
+_pool: Optional[OcrPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> OcrPool:
+    """Return the process-wide OCR pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OcrPool(settings.SCRAPER_OCR_WORKERS)
+    return _pool
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+
+# Per-USN events pushed to job subscribers
+EVENT_SNAPSHOT = 'snapshot'
+EVENT_USN = 'usn'
+EVENT_RETRY = 'retry'
+EVENT_FINISHED = 'finished'
+
+
+def job_group(job_id) -> str:
+    """Channel layer group that carries one job's progress events"""
+    return f'scrape-job-{job_id}'
+
+
+class JobProgress:
+    """Publishes a running job's per-USN outcomes, throughput and ETA to its channel group.
+
+    Throughput only counts USNs finished by this run, so a resumed job's ETA is
+    not skewed by checkpoints it skipped. Publishing never raises: a missing or
+    unreachable channel layer must not fail the scrape.
+    """
+
+    def __init__(self, job_id, total: int, done: int = 0):
+        self.job_id = job_id
+        self.group = job_group(job_id)
+        self.total = total
+        self.done = done
+        self.counts = {'scraped': 0, 'not_found': 0, 'skipped': 0, 'failed': 0, 'retries': 0}
+        self._finished_this_run = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._layer = get_channel_layer()
+
+    def usn_done(self, usn: str, outcome: str, record: Optional[Dict] = None) -> None:
+        """Report a USN that finished as 'scraped', 'not_found', 'skipped' or 'failed'"""
+        with self._lock:
+            self.counts[outcome] += 1
+            if outcome != 'failed':
+                self.done += 1
+            self._finished_this_run += 1
+            event = {'type': EVENT_USN, 'usn': usn, 'outcome': outcome, **self._rates()}
+        if record is not None:
+            event['record'] = record
+        self.publish(event)
+
+    def retry(self, usn: str, reason: str) -> None:
+        """Report a submission that will be retried, e.g. a rejected captcha"""
+        with self._lock:
+            self.counts['retries'] += 1
+        self.publish({'type': EVENT_RETRY, 'usn': usn, 'reason': reason})
+
+    def finished(self, status: str, error: str = '') -> None:
+        with self._lock:
+            event = {'type': EVENT_FINISHED, 'status': status, 'error': error, **self._rates()}
+        self.publish(event)
+
+    def _rates(self) -> Dict:
+        elapsed = time.monotonic() - self._started
+        per_minute = 60 * self._finished_this_run / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.done, 0)
+        return {
+            'done': self.done,
+            'total': self.total,
+            'remaining': remaining,
+            'counts': dict(self.counts),
+            'elapsed_seconds': round(elapsed, 1),
+            'usns_per_minute': round(per_minute, 2),
+            'eta_seconds': round(60 * remaining / per_minute, 1) if per_minute else None,
+        }
+
+    def publish(self, event: Dict) -> None:
+        if self._layer is None:
+            return
+        event = {'job_id': str(self.job_id), **event}
+        try:
+            async_to_sync(self._layer.group_send)(self.group, {'type': 'job.event', 'event': event})
+        except Exception as e:
+            print(f"Failed to publish progress for job {self.job_id}: {str(e)}")
+
+
+class ThreadSafeInMemoryChannelLayer(InMemoryChannelLayer):
+    """In-process channel layer that job and scrape threads can publish to.
+
+    The stock in-memory layer keeps an asyncio queue per channel and is only
+    safe from the one event loop that waits on it. A worker thread publishing
+    through ``async_to_sync`` runs on a loop of its own, so the waiting
+    receiver isn't woken and the event only turns up when its wait times out.
+    Here each channel remembers the loop its receiver waits on, and sends from
+    any other loop are handed to that loop.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._receiver_loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        self._loops_lock = threading.Lock()
+
+    async def send(self, channel, message):
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            receiver_loop = self._receiver_loops.get(channel)
+            if receiver_loop is None or receiver_loop is loop or not receiver_loop.is_running():
+                # Nobody waits on another loop: the put doesn't suspend, so it is done before the lock is let go
+                return await super().send(channel, message)
+        try:
+            future = asyncio.run_coroutine_threadsafe(super().send(channel, message), receiver_loop)
+        except RuntimeError:
+            # The receiver's loop closed in the meantime; whoever receives next finds the message queued
+            return await super().send(channel, message)
+        await asyncio.wrap_future(future)
+
+    async def receive(self, channel):
+        with self._loops_lock:
+            self._receiver_loops[channel] = asyncio.get_running_loop()
+        return await super().receive(channel)
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        with self._loops_lock:
+            self._receiver_loops.pop(channel, None)
+
+
+async def receive_event(layer, channel: str, timeout: float) -> Optional[Dict]:
+    """Next progress event on a channel, or None if nothing arrives within timeout"""
+    try:
+        message = await asyncio.wait_for(layer.receive(channel), timeout)
+    except asyncio.TimeoutError:
+        return None
+    return message.get('event')
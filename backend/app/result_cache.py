@@ -0,0 +1,67 @@
+import hashlib
+from typing import Dict, Iterable, Optional
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ResultCache:
+    """Parsed per-USN results keyed by (results URL, USN).
+
+    Keys carry a per-URL generation number, so invalidating a whole URL is a
+    single increment rather than a scan. Scraped results live for ``ttl``
+    seconds; "not found" answers, which serve as a negative cache of known-absent
+    USNs, only for the shorter ``not_found_ttl`` so late publications aren't hidden.
+    """
+
+    def __init__(self, cache=None, ttl: Optional[float] = None, not_found_ttl: Optional[float] = None):
+        self.cache = cache or caches[settings.SCRAPER_RESULT_CACHE_ALIAS]
+        self.ttl = settings.SCRAPER_RESULT_CACHE_TTL if ttl is None else ttl
+        self.not_found_ttl = settings.SCRAPER_RESULT_CACHE_NOT_FOUND_TTL if not_found_ttl is None else not_found_ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 or self.not_found_ttl > 0
+
+    def get_many(self, url: str, usns: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Cached records for whichever of the USNs are cached; None marks a cached 'not found'"""
+        if not self.enabled:
+            return {}
+        generation = self._generation(url)
+        keys = {self._key(url, generation, usn): usn for usn in usns}
+        return {keys[key]: entry['record'] for key, entry in self.cache.get_many(list(keys)).items()}
+
+    def set_result(self, url: str, usn: str, record: Dict) -> None:
+        self._set(url, usn, record, self.ttl)
+
+    def set_not_found(self, url: str, usn: str) -> None:
+        self._set(url, usn, None, self.not_found_ttl)
+
+    def _set(self, url: str, usn: str, record: Optional[Dict], ttl: float) -> None:
+        if ttl > 0:
+            # Wrapped so a cached "not found" can be told apart from a miss
+            self.cache.set(self._key(url, self._generation(url), usn), {'record': record}, ttl)
+
+    def invalidate(self, url: str, usns: Optional[Iterable[str]] = None) -> None:
+        """Forget the given USNs for a URL, or every USN for it when usns is None"""
+        if usns is None:
+            try:
+                self.cache.incr(self._generation_key(url))
+            except ValueError:
+                # No generation stored yet, so entries sit under the implicit 0: move past it
+                self.cache.set(self._generation_key(url), 1, None)
+            return
+        generation = self._generation(url)
+        self.cache.delete_many([self._key(url, generation, usn) for usn in usns])
+
+    def _generation(self, url: str) -> int:
+        return self.cache.get(self._generation_key(url), 0)
+
+    def _generation_key(self, url: str) -> str:
+        return f'scraper-result-gen:{self._url_hash(url)}'
+
+    def _key(self, url: str, generation: int, usn: str) -> str:
+        return f'scraper-result:{self._url_hash(url)}:{generation}:{usn.upper()}'
+
+    @staticmethod
+    def _url_hash(url: str) -> str:
+        return hashlib.sha1(url.strip().encode()).hexdigest()
@@ -0,0 +1,138 @@
+"""Result page parser.
+
+Reads a results.vtu.ac.in result page with lxml XPath instead of walking a
+BeautifulSoup tree: the student header comes from the first table cells and
+the marks from the ``divTable`` block that follows each semester heading.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from lxml import etree, html
+
+# Compiled once; lxml would otherwise re-parse each expression on every call
+SEMESTER_HEADING_XPATH = etree.XPath("//div[@style='text-align:center;padding:5px;']")
+HEADER_CELLS_XPATH = etree.XPath("(//td)[position() = 2 or position() = 4]")
+MARKS_TABLE_XPATH = etree.XPath("following-sibling::div[1]")
+ROW_XPATH = etree.XPath(".//div[contains(concat(' ', normalize-space(@class), ' '), ' divTableRow ')]")
+CELL_XPATH = etree.XPath(".//div[contains(concat(' ', normalize-space(@class), ' '), ' divTableCell ')]")
+SEMESTER_NUMBER = re.compile(r'(\d+)')
+
+# Marks table headings mapped to SubjectResult fields
+COLUMNS = {
+    'Subject Code': 'code',
+    'Subject Name': 'name',
+    'Internal Marks': 'internal',
+    'External Marks': 'external',
+    'Total': 'total',
+    'Result': 'result',
+    'Announced / Updated on': 'announced',
+}
+
+
+@dataclass(frozen=True)
+class SubjectResult:
+    """One marks table row, cell text as shown on the page"""
+    code: str
+    name: str = ''
+    internal: str = ''
+    external: str = ''
+    total: str = ''
+    result: str = ''
+    announced: str = ''
+
+
+@dataclass(frozen=True)
+class SemesterResult:
+    semester: Optional[int]
+    subjects: List[SubjectResult] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class StudentResult:
+    usn: str
+    name: str
+    # In page order, which lists the latest semester first
+    semesters: List[SemesterResult] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        return f'{self.usn}+{self.name}'
+
+    def to_record(self) -> Optional[Dict]:
+        """Record with the first semester block's totals and every semester's rows.
+
+        ``marks`` is [[code, total], ...] for the first block; ``semesters`` is
+        [{'semester', 'subjects': [[code, name, internal, external, total, result], ...]}, ...].
+        """
+        if not self.semesters:
+            print(f"No semester data for USN {self.usn}")
+            return None
+        marks = {}
+        for subject in self.semesters[0].subjects:
+            if not subject.total.isdigit():
+                print(f"Invalid marks for USN {self.usn}, subject {subject.code}: {subject.total}")
+                continue
+            marks[subject.code] = subject.total
+        if not marks:
+            print(f"No valid marks for USN {self.usn}")
+            return None
+        # Marks are kept as pairs so subject order survives JSON storage
+        return {
+            'usn': self.usn,
+            'name': self.name,
+            'marks': [[code, total] for code, total in marks.items()],
+            'semesters': [
+                {
+                    'semester': semester.semester,
+                    'subjects': [
+                        [s.code, s.name, s.internal, s.external, s.total, s.result] for s in semester.subjects
+                    ],
+                }
+                for semester in self.semesters
+                if semester.subjects
+            ],
+        }
+
+
+def parse_result_page(page_source: str) -> StudentResult:
+    """Parse a result page; raises ValueError if it has no student header"""
+    tree = html.fromstring(page_source)
+    header = HEADER_CELLS_XPATH(tree)
+    if len(header) < 2:
+        raise ValueError("Result page has no student header")
+    usn, name = (_after_colon(cell.text_content()) for cell in header)
+    semesters = []
+    for heading in SEMESTER_HEADING_XPATH(tree):
+        table = MARKS_TABLE_XPATH(heading)
+        subjects = _parse_marks_table(table[0], usn) if table else None
+        if subjects is not None:
+            semesters.append(SemesterResult(_semester_number(heading.text_content()), subjects))
+        elif not semesters:
+            # Keep a placeholder so the first heading still maps to the first semester
+            semesters.append(SemesterResult(_semester_number(heading.text_content())))
+    return StudentResult(usn.upper(), name, semesters)
+
+
+def _parse_marks_table(table, usn: str) -> Optional[List[SubjectResult]]:
+    rows = [[cell.text_content().strip() for cell in CELL_XPATH(row)] for row in ROW_XPATH(table)]
+    if len(rows) < 2:
+        print(f"Invalid table data for USN {usn}: {rows}")
+        return None
+    heading, body = rows[0], rows[1:]
+    if any(len(row) != len(heading) for row in body):
+        print(f"Ragged marks table for USN {usn}")
+        return None
+    if 'Subject Code' not in heading or 'Total' not in heading:
+        print(f"Missing Subject Code or Total for USN {usn}")
+        return None
+    columns = {COLUMNS[title]: index for index, title in enumerate(heading) if title in COLUMNS}
+    return [SubjectResult(**{name: row[index] for name, index in columns.items()}) for row in body]
+
+
+def _after_colon(text: str) -> str:
+    return text.split(':')[1].strip()
+
+
+def _semester_number(text: str) -> Optional[int]:
+    match = SEMESTER_NUMBER.search(text)
+    return int(match.group(1)) if match else None
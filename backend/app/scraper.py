@@ -1,248 +1,897 @@
+import json
 import time
-import pandas as pd
-import pytesseract
-from io import BytesIO
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
-from PIL import Image
+import queue
+from datetime import timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+import requests
+from django.conf import settings
+from django.db.models import QuerySet
 from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
 from selenium import webdriver
+from selenium.common.exceptions import NoAlertPresentException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
+from .captcha import get_glyph_bank, isolate_glyph_band, solve_captcha
+from .delta import diff_results
+from .exports import EXPORT_CONTENT_TYPES, FORMAT_XLSX, export_file_name, stream_export
+from .driver_pool import get_driver_pool, page_weight
+from .http_engine import HttpResultSession
+from .ingest import ingest_records
+from .models import ScrapeJob, ScrapeJobResult
+from .ocr import get_ocr_pool
+from .progress import JobProgress
+from .result_cache import ResultCache
+from .result_parser import parse_result_page
+from .shards import split_shards
+from .stats import ScrapeStats
+from .streaming import IncrementalStreamingHttpResponse
+from .throttle import AimdLimiter, SubmissionSlot, get_host_limiter
+from .usn_planner import RangePlanner, expand_usn_range
+from .xlsx_stream import Sheet
+
+USN_NOT_FOUND_ALERT = 'University Seat Number is not available or Invalid..!'
+CAPTCHA_IMAGE_XPATH = '//*[@id="raj"]/div[2]/div[2]/img'
+RESULT_PAGE_XPATH = "//div[contains(@class, 'divTableRow')] | //td[contains(., 'University Seat Number')]"
+
+# Outcome of a single form submission
+OUTCOME_RESULT = 'result'
+OUTCOME_NOT_FOUND = 'not_found'
+OUTCOME_CAPTCHA_REJECTED = 'captcha_rejected'
+OUTCOME_UNEXPECTED_ALERT = 'unexpected_alert'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_ERROR = 'error'
+# Final state of a USN once its retries are used up
+OUTCOME_FAILED = 'failed'
+# Not submitted because the range planner saw the section's seat numbers end before it
+OUTCOME_SKIPPED = 'skipped'
+RETRY_MESSAGES = {
+    OUTCOME_CAPTCHA_REJECTED: "Captcha failed",
+    OUTCOME_UNEXPECTED_ALERT: "Unexpected alert",
+    OUTCOME_TIMEOUT: "No alert or result page in time",
+    OUTCOME_ERROR: "Error",
+}
+# Failures during a submission's round trip that are the server's (or the network's) rather than ours
+SERVER_ERRORS = (requests.RequestException, WebDriverException)
+
+ENGINE_SELENIUM = 'selenium'
+ENGINE_HTTP = 'http'
+ENGINES = (ENGINE_SELENIUM, ENGINE_HTTP)
+
+# Workbook layouts: the first semester block on each page as one wide sheet (the original
+# output), one wide sheet per semester, or every semester's rows on one long sheet
+LAYOUT_LATEST = 'latest'
+LAYOUT_SEMESTERS = 'semesters'
+LAYOUT_COMBINED = 'combined'
+LAYOUTS = (LAYOUT_LATEST, LAYOUT_SEMESTERS, LAYOUT_COMBINED)
+SEMESTER_COLUMNS = [
+    'USN', 'Student Name', 'Semester', 'Subject Code', 'Subject Name', 'Internal', 'External', 'Total', 'Result'
+]
+CHANGES_COLUMNS = ['USN', 'Student Name', 'Change', 'Semester', 'Subject Code', 'Old Total', 'New Total']
+# Records read from the database per query while a workbook is streamed
+EXPORT_CHUNK_SIZE = 500
+
 
 class ResultScraperService:
+    def __init__(self, engine: Optional[str] = None):
+        engine = engine or settings.SCRAPER_DEFAULT_ENGINE
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown scraping engine: {engine}")
+        self.engine = engine
+        self.stats = ScrapeStats()
+        self.cache = ResultCache()
+        # Set while a job runs so per-USN outcomes and retries reach its subscribers
+        self.progress: Optional[JobProgress] = None
+
     def execute_scraping(
-        self, prefix_usn: str, usn_range: str, url: str, is_reval: bool
+        self, prefix_usn: str, usn_range: str, url: str, is_reval: bool, workers: int = 1,
+        layout: str = LAYOUT_LATEST, incremental: bool = False, export_format: str = FORMAT_XLSX,
     ) -> HttpResponse:
         """Main method to execute the complete scraping workflow"""
+        job = self.create_job(prefix_usn, usn_range, url, is_reval, workers, incremental)
+        return self.run_job(job, layout, export_format)
+
+    def create_job(
+        self, prefix_usn: str, usn_range: str, url: str, is_reval: bool, workers: int = 1, incremental: bool = False
+    ) -> ScrapeJob:
+        """Record a new pending scrape job"""
+        return ScrapeJob.objects.create(
+            prefix_usn=prefix_usn,
+            usn_range=usn_range,
+            url=url,
+            is_reval=is_reval,
+            engine=self.engine,
+            workers=workers,
+            incremental=incremental,
+            total_usns=len(self._generate_usn_list(prefix_usn, usn_range)),
+        )
+
+    def run_job(self, job: ScrapeJob, layout: str = LAYOUT_LATEST, export_format: str = FORMAT_XLSX) -> HttpResponse:
+        """Scrape the USNs of a job that have no checkpoint yet and build its download"""
         try:
-            usn_list = self._generate_usn_list(prefix_usn, usn_range)
-            driver = self._initialize_webdriver(url)
-            try:
-                soup_dict = self._scrape_data(driver, usn_list)
-                if not soup_dict:
-                    print("No data scraped for any USN.")
-                    return JsonResponse({"error": "No data found for provided USNs"}, status=404)
-                df = self._process_data(soup_dict, is_reval)
-                if df is None or df.empty:
-                    print("Processed data is empty.")
-                    return JsonResponse({"error": "No valid data processed"}, status=404)
-                return self.create_excel_response(df)
-            finally:
-                driver.quit()
+            if self.scrape_job(job):
+                response = self.create_job_response(job, layout, export_format)
+            else:
+                response = JsonResponse({"error": f"Scraping failed: {job.error}"}, status=500)
+        except Exception as e:
+            self._fail_job(job, e)
+            response = JsonResponse({"error": f"Scraping failed: {str(e)}"}, status=500)
+        response['X-Job-ID'] = str(job.id)
+        return response
+
+    def scrape_job(self, job: ScrapeJob) -> bool:
+        """Scrape the USNs of a job that have no checkpoint yet without building a download; False if it failed.
+
+        Background workers stop here: the download endpoint builds the file
+        from the checkpoints when it is asked for.
+        """
+        try:
+            for _ in self._scrape_job(job):
+                pass
+        except Exception as e:
+            self._fail_job(job, e)
+            return False
+        return True
+
+    def create_stream_response(self, job: ScrapeJob) -> HttpResponse:
+        """Run a job while streaming its records to the client as newline-delimited JSON"""
+        response = IncrementalStreamingHttpResponse(self.stream_job(job), content_type='application/x-ndjson')
+        response['X-Job-ID'] = str(job.id)
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream_job(self, job: ScrapeJob) -> Iterator[str]:
+        """Run a job, yielding each student's record as a JSON line the moment its USN finishes.
+
+        A last 'summary' line gives the job's status and how many USNs this run
+        scraped, found missing, skipped or failed. If the client goes away the
+        workers stop after their current USN and the job is left to resume.
+        """
+        try:
+            with closing(self._scrape_job(job)) as outcomes:
+                for usn, outcome, record in outcomes:
+                    if outcome == OUTCOME_RESULT:
+                        yield _json_line({'type': 'record', 'usn': usn, 'record': record})
+        except Exception as e:
+            self._fail_job(job, e)
+        counts = self.progress.counts if self.progress is not None else {}
+        yield _json_line({
+            'type': 'summary',
+            'job_id': str(job.id),
+            'status': job.status,
+            'total': job.total_usns,
+            **{key: counts.get(key, 0) for key in ('scraped', 'not_found', 'skipped', 'failed')},
+            'error': job.error,
+        })
+
+    def _scrape_job(self, job: ScrapeJob) -> Iterator[Tuple[str, str, Optional[Dict]]]:
+        """Scrape the USNs of a job that have no checkpoint yet, yielding (usn, outcome, record) as each is settled.
+
+        Reused fresh results and result cache hits come first, then scraped
+        USNs in completion order. The job's status, diff and ingestion are
+        finished once everything has been yielded.
+        """
+        job.status = ScrapeJob.STATUS_RUNNING
+        job.error = ''
+        job.save(update_fields=['status', 'error', 'updated_at'])
+
+        usn_list = self._generate_usn_list(job.prefix_usn, job.usn_range)
+        positions = {usn: index for index, usn in enumerate(usn_list)}
+        done = set(job.results.values_list('usn', flat=True))
+        remaining = [usn for usn in usn_list if usn not in done]
+        if done:
+            print(f"Resuming job {job.id}: {len(done)} USNs checkpointed, {len(remaining)} remaining")
+        self.progress = JobProgress(job.id, len(usn_list), len(done))
+        checkpoint = self._checkpointer(job, positions)
+        try:
+            if job.incremental:
+                fresh = self._carry_over_fresh_results(job, remaining, positions)
+                remaining = [usn for usn in remaining if usn not in fresh]
+                for usn, record in fresh.items():
+                    yield usn, OUTCOME_RESULT, record
+            # Incremental runs are for catching late publications, so known-absent USNs are checked again
+            cached = self._apply_cached_results(job.url, remaining, checkpoint, not job.incremental)
+            remaining = [usn for usn in remaining if usn not in cached]
+            for usn, record in cached.items():
+                yield usn, OUTCOME_RESULT if record is not None else OUTCOME_NOT_FOUND, record
+            planner = RangePlanner(usn_list, settings.SCRAPER_PLANNER_STOP_AFTER)
+            for usn, status in job.results.exclude(status=ScrapeJobResult.STATUS_SKIPPED).values_list('usn', 'status'):
+                planner.record(usn, status == ScrapeJobResult.STATUS_SCRAPED)
+            for usn, outcome, record in self._scrape_data(job.url, remaining, job.workers, planner):
+                checkpoint(usn, outcome, record)
+                self._cache_result(job.url, usn, outcome, record)
+                yield usn, outcome, record
+        except GeneratorExit:
+            # The consumer stopped early (a streaming client disconnected): keep what was checkpointed
+            job.status = ScrapeJob.STATUS_PARTIAL
+            job.save(update_fields=['status', 'updated_at'])
+            self._report_finished(job)
+            print(f"Job {job.id} stopped early; resume it to scrape the rest")
+            raise
+
+        self._finish_job(job, usn_list)
+
+    def start_sharded_job(self, job: ScrapeJob, coordinator) -> None:
+        """Split a job's unfinished USNs into SCRAPER_SHARD_SIZE shards that workers on any node can lease.
+
+        Fresh results of an incremental job are carried over here, once, so
+        shards only hold USNs that need a submission. Whoever completes the
+        last shard calls finish_sharded_job.
+        """
+        try:
+            job.status = ScrapeJob.STATUS_RUNNING
+            job.error = ''
+            job.save(update_fields=['status', 'error', 'updated_at'])
+            usn_list = self._generate_usn_list(job.prefix_usn, job.usn_range)
+            positions = {usn: index for index, usn in enumerate(usn_list)}
+            done = set(job.results.values_list('usn', flat=True))
+            remaining = [usn for usn in usn_list if usn not in done]
+            self.progress = JobProgress(job.id, len(usn_list), len(done))
+            if job.incremental:
+                fresh = self._carry_over_fresh_results(job, remaining, positions)
+                remaining = [usn for usn in remaining if usn not in fresh]
+            shards = split_shards(remaining, settings.SCRAPER_SHARD_SIZE)
+            coordinator.create(job.id, shards)
+            print(f"Job {job.id}: {len(remaining)} USN(s) split into {len(shards)} shard(s)")
+            if not shards and coordinator.finalize(job.id):
+                self.finish_sharded_job(job, coordinator)
+        except Exception as e:
+            coordinator.discard(job.id)
+            self._fail_job(job, e)
+
+    def scrape_shard(self, job: ScrapeJob, usns: List[str], lost: Optional[threading.Event] = None) -> None:
+        """Scrape the unfinished USNs of one leased shard into the job's checkpoints.
+
+        Results from every shard land in the same job, so the job's download
+        merges them like a single-worker run. Stops early once lost is set.
+        """
+        usn_list = self._generate_usn_list(job.prefix_usn, job.usn_range)
+        positions = {usn: index for index, usn in enumerate(usn_list)}
+        settled = dict(job.results.exclude(status=ScrapeJobResult.STATUS_SKIPPED).values_list('usn', 'status'))
+        done = set(job.results.filter(usn__in=usns).values_list('usn', flat=True))
+        remaining = [usn for usn in usns if usn not in done]
+        self.progress = JobProgress(job.id, len(usn_list), job.results.count())
+        checkpoint = self._checkpointer(job, positions)
+        cached = self._apply_cached_results(job.url, remaining, checkpoint, not job.incremental)
+        remaining = [usn for usn in remaining if usn not in cached]
+        # Seeded with what the other shards have settled so far
+        planner = RangePlanner(usn_list, settings.SCRAPER_PLANNER_STOP_AFTER)
+        for usn, status in settled.items():
+            planner.record(usn, status == ScrapeJobResult.STATUS_SCRAPED)
+        with closing(self._scrape_data(job.url, remaining, job.workers, planner)) as outcomes:
+            for usn, outcome, record in outcomes:
+                checkpoint(usn, outcome, record)
+                self._cache_result(job.url, usn, outcome, record)
+                if lost is not None and lost.is_set():
+                    print(f"Stopping shard of job {job.id}: its lease was lost")
+                    return
+
+    def finish_sharded_job(self, job: ScrapeJob, coordinator) -> None:
+        """Settle a sharded job once all its shards are done and drop its shard state"""
+        try:
+            job.refresh_from_db()
+            self.progress = JobProgress(job.id, job.total_usns, job.results.count())
+            self._finish_job(job, self._generate_usn_list(job.prefix_usn, job.usn_range))
         except Exception as e:
-            print(f"Scraping failed: {str(e)}")
-            return JsonResponse({"error": f"Scraping failed: {str(e)}"}, status=500)
+            self._fail_job(job, e)
+        finally:
+            coordinator.discard(job.id)
+
+    def _finish_job(self, job: ScrapeJob, usn_list: List[str]) -> None:
+        """Set a job's final status, record its diff and ingest its records"""
+        missing = len(usn_list) - job.results.count()
+        job.status = ScrapeJob.STATUS_COMPLETED if missing == 0 else ScrapeJob.STATUS_PARTIAL
+        job.save(update_fields=['status', 'updated_at'])
+        if missing:
+            print(f"Job {job.id} left {missing} USN(s) unscraped; resume it to retry them")
+        if job.incremental:
+            self._record_diff(job, usn_list)
+        self._ingest(job)
+        self._report_finished(job)
+
+    def _fail_job(self, job: ScrapeJob, error: Exception) -> None:
+        print(f"Scraping failed: {str(error)}")
+        job.status = ScrapeJob.STATUS_FAILED
+        job.error = str(error)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        self._report_finished(job)
+
+    def create_job_response(
+        self, job: ScrapeJob, layout: str = LAYOUT_LATEST, export_format: str = FORMAT_XLSX
+    ) -> HttpResponse:
+        """Stream the download of a job's checkpointed records in an export format (xlsx by default)"""
+        records = (
+            job.results.filter(status=ScrapeJobResult.STATUS_SCRAPED, record__isnull=False)
+            .order_by('position')
+            .values_list('record', flat=True)
+        )
+        if not records.exists():
+            print("No data scraped for any USN.")
+            return JsonResponse({"error": "No data found for provided USNs"}, status=404)
+        sheets = self._plan_sheets(records, layout)
+        if not sheets:
+            print("Processed data is empty.")
+            return JsonResponse({"error": "No valid data processed"}, status=404)
+        if job.incremental and job.diff is not None:
+            sheets.append(('Changes', CHANGES_COLUMNS, self._changes_rows(job.diff['changes'])))
+        return self.create_export_response(sheets, export_format)
+
+    def _plan_sheets(self, records: QuerySet, layout: str) -> List[Sheet]:
+        """Sheets of a layout whose rows are built from the records as the workbook is written.
+
+        One pass over the records finds the subject columns up front; each sheet
+        then reads the records again while it is written, so no more than a
+        chunk of them is held in memory at a time.
+        """
+        subject_codes = {}
+        semester_codes = {}
+        has_semester_rows = False
+        for record in records.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            for code, _ in record['marks']:
+                subject_codes.setdefault(code, None)
+            for block in record.get('semesters', []):
+                has_semester_rows = has_semester_rows or bool(block['subjects'])
+                for subject in block['subjects']:
+                    if subject[4].isdigit():
+                        semester_codes.setdefault(block['semester'], {}).setdefault(subject[0], None)
+
+        if layout == LAYOUT_SEMESTERS:
+            return [
+                (
+                    f'Sem {semester}' if semester is not None else 'Sem Unknown',
+                    ['USN', 'Student Name', *semester_codes[semester]],
+                    self._semester_rows(records, semester, list(semester_codes[semester])),
+                )
+                for semester in sorted(semester_codes, key=lambda number: number or 0)
+            ]
+        if layout == LAYOUT_COMBINED:
+            return [('All Semesters', SEMESTER_COLUMNS, self._combined_rows(records))] if has_semester_rows else []
+        if not subject_codes:
+            return []
+        return [
+            ('Sem Results', ['USN', 'Student Name', *subject_codes], self._latest_rows(records, list(subject_codes)))
+        ]
+
+    def _latest_rows(self, records: QuerySet, subject_codes: List[str]) -> Iterator[List]:
+        """One row of first-block subject totals per student, subjects a student didn't take left empty"""
+        column_of = {code: column for column, code in enumerate(subject_codes, start=2)}
+        for record in records.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            row = [record['usn'], record['name']] + [None] * len(column_of)
+            for code, total in record['marks']:
+                # Records checkpointed after the column pass (a resume in progress) may bring new subjects
+                if code in column_of:
+                    row[column_of[code]] = _as_int(total)
+            yield row
+
+    def _semester_rows(self, records: QuerySet, semester: Optional[int], subject_codes: List[str]) -> Iterator[List]:
+        """Subject totals of one semester per student who has any, one wide row each"""
+        column_of = {code: column for column, code in enumerate(subject_codes, start=2)}
+        for record in records.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            row = None
+            for block in record.get('semesters', []):
+                if block['semester'] != semester:
+                    continue
+                for subject in block['subjects']:
+                    if subject[4].isdigit() and subject[0] in column_of:
+                        row = row or [record['usn'], record['name']] + [None] * len(column_of)
+                        row[column_of[subject[0]]] = int(subject[4])
+            if row is not None:
+                yield row
+
+    def _combined_rows(self, records: QuerySet) -> Iterator[List]:
+        """Every semester's subject rows in long format, one row per student, semester and subject"""
+        for record in records.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            if 'semesters' not in record:
+                print(f"No per-semester data stored for USN {record['usn']}")
+                continue
+            for semester in sorted(record['semesters'], key=lambda block: block['semester'] or 0):
+                for code, name, internal, external, total, result in semester['subjects']:
+                    yield [
+                        record['usn'], record['name'], semester['semester'], code, name,
+                        _as_int(internal), _as_int(external), _as_int(total), result,
+                    ]
+
+    def _previous_results(self, job: ScrapeJob, usn_list: List[str]) -> Dict[str, Tuple[Optional[Dict], object]]:
+        """Latest (record, scraped_at) each USN got from an earlier job on the same URL; None record if not found"""
+        previous = {}
+        for start in range(0, len(usn_list), 500):
+            rows = (
+                ScrapeJobResult.objects.filter(
+                    job__url=job.url, job__created_at__lt=job.created_at, usn__in=usn_list[start:start + 500],
+                    carried_over=False,
+                )
+                .exclude(status=ScrapeJobResult.STATUS_SKIPPED)
+                .order_by('usn', '-scraped_at')
+                .values_list('usn', 'status', 'record', 'scraped_at')
+            )
+            for usn, status, record, scraped_at in rows:
+                if usn not in previous:
+                    previous[usn] = (record if status == ScrapeJobResult.STATUS_SCRAPED else None, scraped_at)
+        return previous
+
+    def _carry_over_fresh_results(
+        self, job: ScrapeJob, usn_list: List[str], positions: Dict[str, int]
+    ) -> Dict[str, Dict]:
+        """Copy results fetched within the freshness window into the job and return them by USN.
+
+        USNs never scraped for this URL, last seen as "not found", or older
+        than SCRAPER_INCREMENTAL_MAX_AGE_HOURS are left to scrape.
+        """
+        cutoff = timezone.now() - timedelta(hours=settings.SCRAPER_INCREMENTAL_MAX_AGE_HOURS)
+        fresh = {
+            usn: record for usn, (record, scraped_at) in self._previous_results(job, usn_list).items()
+            if record is not None and scraped_at >= cutoff
+        }
+        ScrapeJobResult.objects.bulk_create([
+            ScrapeJobResult(
+                job=job, usn=usn, position=positions[usn], status=ScrapeJobResult.STATUS_SCRAPED,
+                record=record, carried_over=True,
+            )
+            for usn, record in fresh.items()
+        ])
+        for usn, record in fresh.items():
+            self._report_usn(usn, ScrapeJobResult.STATUS_SCRAPED, record)
+        print(f"Incremental job {job.id}: {len(fresh)} fresh result(s) reused, {len(usn_list) - len(fresh)} to scrape")
+        return fresh
+
+    def _record_diff(self, job: ScrapeJob, usn_list: List[str]) -> None:
+        """Compare the USNs this job fetched with what earlier jobs stored for them"""
+        previous = {usn: record for usn, (record, _) in self._previous_results(job, usn_list).items()}
+        current = {}
+        carried_over = 0
+        rows = job.results.exclude(status=ScrapeJobResult.STATUS_SKIPPED).values_list(
+            'usn', 'status', 'record', 'carried_over'
+        )
+        for usn, status, record, carried in rows:
+            if carried:
+                carried_over += 1
+            else:
+                current[usn] = record if status == ScrapeJobResult.STATUS_SCRAPED else None
+        changes = diff_results(previous, current, usn_list)
+        job.diff = {'carried_over': carried_over, 'rescraped': len(current), 'changes': changes}
+        job.save(update_fields=['diff', 'updated_at'])
+        print(f"Incremental job {job.id}: {len(changes)} change(s) across {len(current)} re-scraped USN(s)")
+
+    def _changes_rows(self, changes: List[Dict]) -> Iterator[List]:
+        """One row per changed subject total, newly published USN or USN that disappeared"""
+        for change in changes:
+            yield [
+                change['usn'], change['name'], change['change'], _as_int(change.get('semester')),
+                change.get('subject'), _as_int(change.get('old')), _as_int(change.get('new')),
+            ]
+
+    def _apply_cached_results(
+        self, url: str, usn_list: List[str], checkpoint: Callable, known_absent: bool = True
+    ) -> Dict[str, Optional[Dict]]:
+        """Checkpoint the USNs the result cache already has and return their records in list order.
+
+        None marks a cached "not found". Those act as a per-URL negative cache
+        unless known_absent is False.
+        """
+        found = self.cache.get_many(url, usn_list)
+        cached = {
+            usn: found[usn] for usn in usn_list
+            if usn in found and (known_absent or found[usn] is not None)
+        }
+        for usn, record in cached.items():
+            checkpoint(usn, OUTCOME_RESULT if record is not None else OUTCOME_NOT_FOUND, record)
+        if cached:
+            print(f"Result cache: {len(cached)} hit(s), {len(usn_list) - len(cached)} USN(s) to scrape")
+        self.stats.increment('cache_hits', len(cached))
+        return cached
+
+    def _cache_result(self, url: str, usn: str, outcome: str, record: Optional[Dict]) -> None:
+        try:
+            if outcome == OUTCOME_RESULT and record is not None:
+                self.cache.set_result(url, usn, record)
+            elif outcome == OUTCOME_NOT_FOUND:
+                self.cache.set_not_found(url, usn)
+        except Exception as e:
+            # The cache is an optimisation; a scrape must not fail because of it
+            print(f"Failed to cache result for USN {usn}: {str(e)}")
+
+    def _ingest(self, job: ScrapeJob) -> None:
+        """Upsert the job's records into the analytics models; a failure here doesn't fail the job"""
+        # Revaluation pages would overwrite the original marks
+        if not settings.SCRAPER_INGEST_RESULTS or job.is_reval:
+            return
+        try:
+            ingest_records(
+                job.results.filter(status=ScrapeJobResult.STATUS_SCRAPED, record__isnull=False)
+                .values_list('record', flat=True)
+                .iterator(chunk_size=settings.SCRAPER_INGEST_BATCH_SIZE)
+            )
+        except Exception as e:
+            print(f"Failed to ingest results of job {job.id}: {str(e)}")
+
+    def _checkpointer(self, job: ScrapeJob, positions: Dict[str, int]) -> Callable:
+        """Callback that saves each finished USN of a job as it completes"""
+
+        def checkpoint(usn: str, outcome: str, record: Optional[Dict]) -> None:
+            if outcome == OUTCOME_RESULT:
+                status = ScrapeJobResult.STATUS_SCRAPED
+            elif outcome == OUTCOME_NOT_FOUND:
+                status, record = ScrapeJobResult.STATUS_NOT_FOUND, None
+            elif outcome == OUTCOME_SKIPPED:
+                status, record = ScrapeJobResult.STATUS_SKIPPED, None
+            else:
+                # Failed USNs get no checkpoint so a resume retries them, but still show the job is alive
+                ScrapeJob.objects.filter(pk=job.pk).update(updated_at=timezone.now())
+                self._report_usn(usn, OUTCOME_FAILED)
+                return
+            ScrapeJobResult.objects.update_or_create(
+                job=job, usn=usn, defaults={'position': positions[usn], 'status': status, 'record': record}
+            )
+            self._report_usn(usn, status, record)
+
+        return checkpoint
+
+    def _report_usn(self, usn: str, outcome: str, record: Optional[Dict] = None) -> None:
+        if self.progress is not None:
+            self.progress.usn_done(usn, outcome, record)
+
+    def _report_finished(self, job: ScrapeJob) -> None:
+        if self.progress is not None:
+            self.progress.finished(job.status, job.error)
 
     def _generate_usn_list(self, prefix_usn: str, suffix_usn: str) -> List[str]:
-        """Generate list of USNs based on prefix and range"""
-        usn_list = []
+        """Generate the sorted, deduplicated list of USNs for a prefix and range like '1-100,50-150'"""
         try:
-            for part in suffix_usn.split(','):
-                if '-' in part:
-                    try:
-                        start, end = map(int, part.split('-'))
-                        usn_list.extend(f"{prefix_usn}{str(num).zfill(3)}" for num in range(start, end + 1))
-                    except ValueError:
-                        print(f"Invalid range: {part}")
-                else:
-                    try:
-                        num = int(part)
-                        usn_list.append(f"{prefix_usn}{str(num).zfill(3)}")
-                    except ValueError:
-                        print(f"Invalid USN suffix: {part}")
-            return usn_list
+            return expand_usn_range(prefix_usn, suffix_usn)
         except Exception as e:
             print(f"Error generating USN list: {str(e)}")
             return []
 
-    def _initialize_webdriver(self, url: str) -> webdriver.Chrome:
-        """Initialize and return a configured webdriver"""
-        options = webdriver.ChromeOptions()
-        options.add_argument('--no-sandbox')
-        options.add_argument('--headless')
-        options.add_argument('--disable-dev-shm-usage')
-        driver = webdriver.Chrome(service=webdriver.chrome.service.Service(ChromeDriverManager().install()), options=options)
-        driver.get(url)
-        print(f"Navigated to {url}")
-        return driver
-
-    def _scrape_data(self, driver: webdriver.Chrome, usn_list: List[str]) -> Dict[str, BeautifulSoup]:
-        """Scrape data for each USN in the list"""
-        soup_dict = {}
+    def _scrape_data(
+        self, url: str, usn_list: List[str], workers: int = 1, planner: Optional[RangePlanner] = None
+    ) -> Iterator[Tuple[str, str, Optional[Dict]]]:
+        """Scrape each USN in the list with a pool of sessions, yielding (usn, outcome, record) as they finish.
+
+        Workers parse every result page into a compact record as soon as it
+        arrives, so no page tree outlives its USN and memory stays flat however
+        long the range is. Results arrive in completion order, not list order.
+        Closing the generator early stops the workers after their current USN.
+        USNs the planner rules out are yielded as skipped without a submission.
+        The requested worker count caps the job's sessions; with adaptive
+        concurrency on, the host's shared AIMD limiter may hold some of them
+        back, and the count seeds that limiter the first time the host is seen.
+        """
+        limiter = get_host_limiter(url, workers) if settings.SCRAPER_ADAPTIVE_CONCURRENCY else None
+        ceiling = limiter.ceiling if limiter is not None else settings.SCRAPER_MAX_WORKERS
+        workers = max(1, min(workers, ceiling, settings.SCRAPER_MAX_WORKERS, len(usn_list) or 1))
+        pending = queue.Queue()
         for usn in usn_list:
-            retries = 0
-            max_retries = 3
-            while retries < max_retries:
+            pending.put(usn)
+        finished = queue.Queue()
+        stop = threading.Event()
+
+        print(f"Scraping {len(usn_list)} USNs with {workers} {self.engine} worker(s)")
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for _ in range(workers):
+                executor.submit(self._scrape_worker, url, pending, finished, stop, planner, limiter)
+            running = workers
+            while running:
+                item = finished.get()
+                if item is None:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+
+        print(f"Scrape stats: {self.stats.snapshot()}")
+        if limiter is not None:
+            print(f"Host concurrency: {limiter.snapshot()}")
+        pages = self.stats.get('pages')
+        if pages:
+            print(
+                f"Result pages averaged {self.stats.get('page_bytes') / pages / 1024:.1f} KB "
+                f"and {self.stats.get('page_ms') / pages:.0f} ms to DOM ready"
+            )
+
+    def _scrape_worker(
+        self, url: str, pending: queue.Queue, finished: queue.Queue, stop: threading.Event,
+        planner: Optional[RangePlanner] = None, limiter: Optional[AimdLimiter] = None,
+    ) -> None:
+        """Drain the shared USN queue with a dedicated scraping session, reporting each USN to finished"""
+        session = None
+        restarts = 0
+        max_restarts = settings.SCRAPER_MAX_DRIVER_RESTARTS
+        try:
+            while not stop.is_set():
                 try:
-                    # Clear and enter USN
-                    usn_field = driver.find_element(By.NAME, 'lns')
-                    usn_field.clear()
-                    usn_field.send_keys(usn)
-
-                    # Handle captcha
-                    captcha_image = driver.find_element(By.XPATH, '//*[@id="raj"]/div[2]/div[2]/img').screenshot_as_png
-                    captcha_text = self._get_captcha_from_image(captcha_image)
-
-                    # Enter captcha and submit
-                    captcha_field = driver.find_element(By.NAME, 'captchacode')
-                    captcha_field.clear()
-                    captcha_field.send_keys(captcha_text)
-                    driver.find_element(By.ID, 'submit').click()
-
-                    # Handle alert if present
+                    usn = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                if planner is not None and not planner.should_scrape(usn):
+                    self.stats.increment(OUTCOME_SKIPPED)
+                    finished.put((usn, OUTCOME_SKIPPED, None))
+                    continue
+
+                if session is None:
                     try:
-                        WebDriverWait(driver, 1).until(EC.alert_is_present())
-                        alert = driver.switch_to.alert
-                        alert_text = alert.text
-                        alert.accept()
-                        if 'University Seat Number is not available or Invalid..!' in alert_text:
-                            print(f"USN {usn} not found. Skipping...")
-                            break
-                        print(f"Captcha failed for USN {usn}, retrying...")
-                        retries += 1
-                        continue
-                    except:
-                        # No alert means success
-                        print(f"Successfully retrieved data for USN {usn}")
-                        soup = BeautifulSoup(driver.page_source, 'lxml')
-                        student_usn = soup.find_all('td')[1].text.split(':')[1].strip().upper()
-                        student_name = soup.find_all('td')[3].text.split(':')[1].strip()
-                        key = f'{student_usn}+{student_name}'
-                        soup_dict[key] = soup
-                        driver.back()
-                        break
-
-                except Exception as e:
-                    print(f"Error processing USN {usn}: {str(e)}")
-                    retries += 1
-                    if retries == max_retries:
-                        print(f"Max retries reached for USN {usn}. Skipping...")
-                        break
-                time.sleep(1)
-        return soup_dict
-
-    def _get_captcha_from_image(self, target_image: bytes) -> str:
-        """Extract text from captcha image"""
-        try:
-            pixel_range = [(i, i, i) for i in range(102, 130)]
-            image_data = BytesIO(target_image)
-            image = Image.open(image_data).convert("RGB")
-            width, height = image.size
-            white_image = Image.new("RGB", (width, height), "white")
-
-            # Filter pixels
-            for x in range(width):
-                for y in range(height):
-                    pixel = image.getpixel((x, y))
-                    if pixel in pixel_range:
-                        white_image.putpixel((x, y), pixel)
+                        session = self._open_session(url)
+                    except Exception as e:
+                        # Leave the USN for the other workers if this one cannot start a session
+                        print(f"Failed to start {self.engine} session: {str(e)}")
+                        pending.put(usn)
+                        return
+
+                outcome, record = self._scrape_usn(session, usn, limiter)
+                if outcome == OUTCOME_FAILED and not self._is_session_alive(session):
+                    print(f"Session crashed while processing USN {usn}, restarting...")
+                    self._close_session(session, healthy=False)
+                    session = None
+                    restarts += 1
+                    pending.put(usn)
+                    if restarts > max_restarts:
+                        print("Max session restarts reached, stopping worker.")
+                        return
+                    continue
+                if planner is not None and outcome in (OUTCOME_RESULT, OUTCOME_NOT_FOUND):
+                    planner.record(usn, outcome == OUTCOME_RESULT)
+                finished.put((usn, outcome, record))
+        finally:
+            if session is not None:
+                self._close_session(session)
+            # Tell the consumer this worker is done
+            finished.put(None)
+
+    def _open_session(self, url: str):
+        """Start a webdriver or HTTP session for the configured engine"""
+        if self.engine == ENGINE_HTTP:
+            session = HttpResultSession(url)
+            session.load_form()
+            print(f"Loaded results form from {url}")
+            return session
+        return get_driver_pool().checkout(url, timeout=settings.SCRAPER_DRIVER_CHECKOUT_TIMEOUT)
+
+    def _is_session_alive(self, session) -> bool:
+        """Check whether the webdriver or HTTP session still responds"""
+        if self.engine == ENGINE_HTTP:
+            return session.is_alive()
+        try:
+            session.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _close_session(self, session, healthy: bool = True) -> None:
+        """Close an HTTP session or hand a webdriver back to the pool"""
+        try:
+            if self.engine == ENGINE_HTTP:
+                session.close()
+            elif healthy:
+                get_driver_pool().checkin(session)
+            else:
+                get_driver_pool().discard(session)
+        except Exception as e:
+            print(f"Failed to close {self.engine} session: {str(e)}")
+
+    def _scrape_usn(self, session, usn: str, limiter: Optional[AimdLimiter] = None) -> Tuple[str, Optional[Dict]]:
+        """Scrape the result page for a single USN, retrying failed submissions.
+
+        Each attempt holds a slot from the host limiter, if there is one, only
+        while the server answers the submission itself.
+        """
+        submit = self._submit_http if self.engine == ENGINE_HTTP else self._submit_selenium
+        retries = 0
+        max_retries = 3
+        while retries < max_retries:
+            try:
+                outcome, record = submit(session, usn, limiter)
+            except Exception as e:
+                print(f"Error processing USN {usn}: {str(e)}")
+                outcome, record = OUTCOME_ERROR, None
+            self.stats.increment(outcome)
+
+            if outcome == OUTCOME_RESULT:
+                print(f"Successfully retrieved data for USN {usn}")
+                return outcome, record
+            if outcome == OUTCOME_NOT_FOUND:
+                print(f"USN {usn} not found. Skipping...")
+                return outcome, None
+            retries += 1
+            if retries < max_retries:
+                print(f"{RETRY_MESSAGES[outcome]} for USN {usn}, retrying...")
+                if self.progress is not None:
+                    self.progress.retry(usn, outcome)
+                if outcome == OUTCOME_ERROR:
+                    time.sleep(settings.SCRAPER_ERROR_RETRY_DELAY)
+        print(f"Max retries reached for USN {usn}. Skipping...")
+        self.stats.increment(OUTCOME_FAILED)
+        return OUTCOME_FAILED, None
+
+    def _classify_alert(self, alert_text: str) -> str:
+        """Map a results page alert to a submission outcome"""
+        if USN_NOT_FOUND_ALERT in alert_text:
+            return OUTCOME_NOT_FOUND
+        if 'captcha' in alert_text.lower():
+            return OUTCOME_CAPTCHA_REJECTED
+        print(f"Unexpected alert: {alert_text}")
+        return OUTCOME_UNEXPECTED_ALERT
+
+    def _parse_result_page(self, page_source: str) -> Optional[Dict]:
+        """Parse a result page into a student record; the page tree is dropped on return"""
+        return parse_result_page(page_source).to_record()
+
+    def _submit_http(
+        self, session: HttpResultSession, usn: str, limiter: Optional[AimdLimiter] = None
+    ) -> Tuple[str, Optional[Dict]]:
+        """Submit the form for one USN over plain HTTP"""
+        captcha_text = self._solve_captcha(session.fetch_captcha)
+        self.stats.increment('submits')
+        with SubmissionSlot(limiter, SERVER_ERRORS) as slot:
+            alert_text, page_source = session.submit(usn, captcha_text)
+            slot.outcome = self._classify_alert(alert_text) if alert_text is not None else OUTCOME_RESULT
+        if alert_text is not None:
+            return slot.outcome, None
+        return OUTCOME_RESULT, self._parse_result_page(page_source)
+
+    def _submit_selenium(
+        self, driver: webdriver.Chrome, usn: str, limiter: Optional[AimdLimiter] = None
+    ) -> Tuple[str, Optional[Dict]]:
+        """Submit the form for one USN through Chrome"""
+        # Clear and enter USN
+        usn_field = driver.find_element(By.NAME, 'lns')
+        usn_field.clear()
+        usn_field.send_keys(usn)
+
+        # Handle captcha
+        captcha_text = self._solve_captcha(self._selenium_captcha_fetcher(driver))
+
+        # Enter captcha and submit
+        captcha_field = driver.find_element(By.NAME, 'captchacode')
+        captcha_field.clear()
+        captcha_field.send_keys(captcha_text)
+        with SubmissionSlot(limiter, SERVER_ERRORS) as slot:
+            driver.find_element(By.ID, 'submit').click()
+            self.stats.increment('submits')
+            outcome, alert_text = self._wait_for_outcome(driver)
+            slot.outcome = self._classify_alert(alert_text) if outcome == 'alert' else outcome
+        if outcome == OUTCOME_RESULT:
+            record = self._parse_result_page(driver.page_source)
+            self._record_page_weight(driver)
+            driver.back()
+            return OUTCOME_RESULT, record
+        if outcome == OUTCOME_TIMEOUT:
+            # Start the next attempt from a fresh form
+            driver.refresh()
+            return OUTCOME_TIMEOUT, None
+        return slot.outcome, None
+
+    def _wait_for_outcome(self, driver: webdriver.Chrome) -> Tuple[str, Optional[str]]:
+        """Wait for whichever comes first: an alert or the rendered result page"""
+
+        def alert_or_result(d):
+            try:
+                alert = d.switch_to.alert
+                alert_text = alert.text
+                alert.accept()
+                return 'alert', alert_text
+            except NoAlertPresentException:
+                pass
+            if d.find_elements(By.XPATH, RESULT_PAGE_XPATH):
+                return OUTCOME_RESULT, None
+            return False
+
+        try:
+            return WebDriverWait(
+                driver, settings.SCRAPER_RESULT_TIMEOUT, poll_frequency=settings.SCRAPER_RESULT_POLL_INTERVAL
+            ).until(alert_or_result)
+        except TimeoutException:
+            return OUTCOME_TIMEOUT, None
+
+    def _record_page_weight(self, driver: webdriver.Chrome) -> None:
+        """Add the current page's transfer size and load time to the job stats"""
+        try:
+            page_bytes, page_ms = page_weight(driver)
+        except WebDriverException as e:
+            print(f"Could not read page timings: {str(e)}")
+            return
+        self.stats.increment('pages')
+        self.stats.increment('page_bytes', int(page_bytes))
+        self.stats.increment('page_ms', int(page_ms))
+
+    def _selenium_captcha_fetcher(self, driver: webdriver.Chrome) -> Callable[[], bytes]:
+        """Return a callable that grabs the captcha, reloading the image on every call after the first"""
+        calls = []
+
+        def fetch() -> bytes:
+            image = driver.find_element(By.XPATH, CAPTCHA_IMAGE_XPATH)
+            if calls:
+                driver.execute_script(
+                    "arguments[0].src = arguments[0].src.split('?')[0] + '?' + Date.now();", image
+                )
+            # Eager page loads hand control back before images finish downloading
+            WebDriverWait(driver, settings.SCRAPER_CAPTCHA_RELOAD_TIMEOUT).until(
+                lambda d: d.execute_script(
+                    "return arguments[0].complete && arguments[0].naturalWidth > 0;", image
+                )
+            )
+            calls.append(True)
+            return image.screenshot_as_png
+
+        return fetch
+
+    def _solve_captcha(self, fetch_captcha: Callable[[], bytes]) -> str:
+        """Read captchas until one is confident, refreshing locally instead of submitting bad guesses"""
+        max_refreshes = settings.SCRAPER_CAPTCHA_MAX_REFRESHES
+        for attempt in range(max_refreshes + 1):
+            if attempt:
+                self.stats.increment('captcha_refreshed')
+            captcha_text, confident = self._get_captcha_from_image(fetch_captcha())
+            if confident:
+                return captcha_text
+        # Out of refreshes: submit the last guess rather than stalling the USN
+        self.stats.increment('captcha_forced')
+        return captcha_text
+
+    def _get_captcha_from_image(self, target_image: bytes) -> Tuple[str, bool]:
+        """Extract text from captcha image and whether it is confident enough to submit"""
+        try:
+            bank = get_glyph_bank()
+            if bank is not None:
+                solved = solve_captcha(target_image, bank)
+                if solved is not None and solved[1].min() >= settings.SCRAPER_SOLVER_MIN_CONFIDENCE:
+                    print(f"Captcha text solved: {solved[0]}")
+                    self.stats.increment('captcha_solver')
+                    return solved[0], True
+
+            white_image = isolate_glyph_band(target_image)
 
             # Extract text using OCR
-            text = pytesseract.image_to_string(white_image, config='--psm 7 --oem 1').strip()
+            text, confidence = get_ocr_pool().submit(white_image).result(timeout=settings.SCRAPER_OCR_TIMEOUT)
+            well_formed = len(text) == 6 and text.isalnum()
             if len(text) < 6:
                 text = text.ljust(6, 'A')
             elif len(text) > 6:
                 text = text[:6]
-            print(f"Captcha text extracted: {text}")
-            return text
+            print(f"Captcha text extracted: {text} (confidence {confidence:.2f})")
+            if well_formed and confidence >= settings.SCRAPER_OCR_MIN_CONFIDENCE:
+                self.stats.increment('captcha_ocr')
+                return text, True
+            self.stats.increment('captcha_low_confidence')
+            return text, False
         except Exception as e:
             print(f"Tesseract OCR failed: {str(e)}")
-            return "AAAAAA"  # Fallback
-
-    def _process_data(self, soup_dict: Dict[str, BeautifulSoup], is_reval: bool) -> Optional[pd.DataFrame]:
-        """Process the scraped data into a structured DataFrame"""
-        records = {}
-        subject_codes = []
-
-        for id_, soup in soup_dict.items():
-            this_usn, this_name = id_.split('+')
-            sems_divs = soup.find_all('div', style="text-align:center;padding:5px;")
-            if not sems_divs:
-                print(f"No semester data for USN {this_usn}")
-                continue
+            self.stats.increment('captcha_ocr_failed')
+            return "AAAAAA", False  # Fallback
 
-            first_sem_div = sems_divs[0]
-            sems_data = [first_sem_div.find_next_sibling('div')]
-            student_record = {'USN': this_usn, 'Student Name': this_name}
+    def create_export_response(self, sheets: List[Sheet], export_format: str) -> HttpResponse:
+        """Create a StreamingHttpResponse that encodes the sheets' rows in an export format as it is sent"""
+        response = IncrementalStreamingHttpResponse(
+            _logged_export(sheets, export_format), content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_file_name(export_format)}"'
+        return response
 
-            for marks_data in sems_data:
-                if not marks_data:
-                    print(f"No marks data for USN {this_usn}")
-                    continue
-                rows = marks_data.find_all('div', class_='divTableRow')
-                if not rows:
-                    print(f"No table rows for USN {this_usn}")
-                    continue
-                data = [[cell.text.strip() for cell in row.find_all('div', class_='divTableCell')] for row in rows]
-                if not data or len(data) < 2:
-                    print(f"Invalid table data for USN {this_usn}: {data}")
-                    continue
-                try:
-                    df_temp = pd.DataFrame(data[1:], columns=data[0])
-                except Exception as e:
-                    print(f"Failed to create DataFrame for USN {this_usn}: {str(e)}")
-                    continue
 
-                for _, row in df_temp.iterrows():
-                    if 'Subject Code' not in row or 'Total' not in row:
-                        print(f"Missing Subject Code or Total for USN {this_usn}")
-                        continue
-                    subject_code = row['Subject Code']
-                    total_marks = row['Total']
-                    if not isinstance(total_marks, str) or not total_marks.isdigit():
-                        print(f"Invalid marks for USN {this_usn}, subject {subject_code}: {total_marks}")
-                        continue
-                    student_record[subject_code] = total_marks
-                    if subject_code not in subject_codes:
-                        subject_codes.append(subject_code)
-
-            if len(student_record) > 2:
-                records[id_] = student_record
-            else:
-                print(f"No valid marks for USN {this_usn}")
-
-        if not records:
-            print("No valid records processed.")
-            return None
-
-        columns = ['USN', 'Student Name'] + subject_codes
-        try:
-            final_df = pd.DataFrame(records.values())
-            if final_df.empty:
-                print("Final DataFrame is empty.")
-                return None
-            for col in columns:
-                if col not in final_df.columns:
-                    final_df[col] = None
-            final_df = final_df[columns]
-            print(f"Created DataFrame with {len(final_df)} rows, columns: {columns}")
-            return final_df
-        except Exception as e:
-            print(f"Failed to create final DataFrame: {str(e)}")
-            return None
-
-    def create_excel_response(self, df: pd.DataFrame) -> HttpResponse:
-        """Create HttpResponse with Excel file for download"""
-        if df is None or df.empty:
-            print("Cannot generate Excel: DataFrame is empty or None")
-            return JsonResponse({"error": "No data available to generate Excel file"}, status=404)
-
-        output = BytesIO()
-        sheet_name = 'Sem Results'
-        try:
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name=sheet_name)
-            output.seek(0)
-            response = HttpResponse(
-                output,
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="{sheet_name}.xlsx"'
-            print("Excel file generated successfully")
-            return response
-        except Exception as e:
-            print(f"Excel generation failed: {str(e)}")
-            return JsonResponse({"error": f"Failed to generate Excel: {str(e)}"}, status=500)
\ No newline at end of file
+def _logged_export(sheets: List[Sheet], export_format: str) -> Iterator[bytes]:
+    try:
+        yield from stream_export(sheets, export_format)
+    except Exception as e:
+        # Headers are already sent: abort the download rather than end it with a corrupt file
+        print(f"{export_format} export failed: {str(e)}")
+        raise
+    print(f"{export_format} export generated successfully")
+
+
+def _json_line(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + '\n'
+
+
+def _as_int(value) -> Optional[int]:
+    """Marks as a number; absent or withheld marks ("AB", "NE", ...) become None"""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
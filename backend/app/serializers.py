@@ -1,10 +1,19 @@
+from django.db.models import Count
 from rest_framework import serializers
+from .models import ScrapeJob, ScrapeJobResult
+from .scraper import ENGINES, LAYOUT_LATEST, LAYOUTS
 
 
 class FormSerializer(serializers.Serializer):
     usn = serializers.CharField(max_length=7)
     range = serializers.CharField(max_length=100)
     url = serializers.URLField()
+    workers = serializers.IntegerField(min_value=1, required=False, default=1)
+    engine = serializers.ChoiceField(choices=ENGINES, required=False)
+    layout = serializers.ChoiceField(choices=LAYOUTS, required=False, default=LAYOUT_LATEST)
+    incremental = serializers.BooleanField(required=False, default=False)
+    # Send each record as a JSON line as soon as its USN finishes instead of a file at the end
+    stream = serializers.BooleanField(required=False, default=False)
 
     def validate(self, data):
         """Validate USN structure and extract batch/branch."""
@@ -30,4 +39,46 @@ class FormSerializer(serializers.Serializer):
                 "Invalid range. Use format like '1-100,150'."
             )
 
-        return data
\ No newline at end of file
+        return data
+
+
+class CacheInvalidateSerializer(serializers.Serializer):
+    url = serializers.URLField()
+    usn = serializers.CharField(max_length=7, required=False)
+    range = serializers.CharField(max_length=100, required=False)
+
+    def validate(self, data):
+        """Either both usn and range (those USNs only) or neither (the whole URL)."""
+        if ("usn" in data) != ("range" in data):
+            raise serializers.ValidationError("Pass both usn and range, or neither to clear the whole URL.")
+        if "usn" in data:
+            data["usn"] = data["usn"].upper()
+        return data
+
+
+class ScrapeJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source="id", read_only=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ScrapeJob
+        fields = [
+            "job_id", "status", "prefix_usn", "usn_range", "url", "engine", "workers", "incremental",
+            "progress", "diff", "error", "created_at", "updated_at",
+        ]
+
+    def get_progress(self, job):
+        counts = {
+            ScrapeJobResult.STATUS_SCRAPED: 0, ScrapeJobResult.STATUS_NOT_FOUND: 0, ScrapeJobResult.STATUS_SKIPPED: 0,
+        }
+        for row in job.results.values("status").annotate(count=Count("id")):
+            counts[row["status"]] = row["count"]
+        done = sum(counts.values())
+        return {
+            "total": job.total_usns,
+            "scraped": counts[ScrapeJobResult.STATUS_SCRAPED],
+            "not_found": counts[ScrapeJobResult.STATUS_NOT_FOUND],
+            "skipped": counts[ScrapeJobResult.STATUS_SKIPPED],
+            "remaining": max(job.total_usns - done, 0),
+            "percent": round(100 * done / job.total_usns, 1) if job.total_usns else 0.0,
+        }
\ No newline at end of file
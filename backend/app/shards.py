@@ -0,0 +1,308 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import redis
+from django.conf import settings
+
+# A leased shard: its index within the job and the USNs in it
+Shard = Tuple[int, List[str]]
+
+
+def split_shards(usn_list: List[str], size: int) -> List[List[str]]:
+    """Consecutive runs of at most size USNs, so each shard is a contiguous stretch of seats"""
+    size = max(1, size)
+    return [usn_list[start:start + size] for start in range(0, len(usn_list), size)]
+
+
+class LocalShardCoordinator:
+    """In-process shard leases for the worker threads of one process.
+
+    Follows RedisShardCoordinator's lease rules, but its state lives and dies
+    with this process and leases expire on this process's monotonic clock.
+    """
+
+    def __init__(self, lease_seconds: Optional[float] = None):
+        self.lease_seconds = lease_seconds or settings.SCRAPER_SHARD_LEASE_SECONDS
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, shards: List[List[str]]) -> None:
+        """Replace whatever a job had with fresh pending shards and make it claimable"""
+        with self._lock:
+            self._jobs[str(job_id)] = {
+                'shards': list(shards), 'pending': list(range(len(shards))), 'leases': {}, 'done': set(),
+                'finalized': False,
+            }
+
+    def active_jobs(self) -> List[str]:
+        with self._lock:
+            return [job_id for job_id, state in self._jobs.items() if not state['finalized']]
+
+    def claim(self, job_id, worker: str) -> Optional[Shard]:
+        """Lease the next pending shard, first returning expired leases to the queue"""
+        with self._lock:
+            state = self._jobs.get(str(job_id))
+            if state is None:
+                return None
+            now = time.monotonic()
+            for shard_id, (_, expires) in list(state['leases'].items()):
+                if expires <= now:
+                    del state['leases'][shard_id]
+                    state['pending'].append(shard_id)
+            if not state['pending']:
+                return None
+            shard_id = state['pending'].pop(0)
+            state['leases'][shard_id] = (worker, now + self.lease_seconds)
+            return shard_id, list(state['shards'][shard_id])
+
+    def heartbeat(self, job_id, shard_id: int, worker: str) -> bool:
+        """Extend a lease; False if the worker no longer holds it"""
+        with self._lock:
+            state = self._jobs.get(str(job_id))
+            if state is None or state['leases'].get(shard_id, (None,))[0] != worker:
+                return False
+            state['leases'][shard_id] = (worker, time.monotonic() + self.lease_seconds)
+            return True
+
+    def complete(self, job_id, shard_id: int, worker: str) -> bool:
+        with self._lock:
+            state = self._jobs.get(str(job_id))
+            if state is None or state['leases'].get(shard_id, (None,))[0] != worker:
+                return False
+            del state['leases'][shard_id]
+            state['done'].add(shard_id)
+            return True
+
+    def release(self, job_id, shard_id: int, worker: str) -> None:
+        """Give a lease back early so another worker can take the shard straight away"""
+        with self._lock:
+            state = self._jobs.get(str(job_id))
+            if state is not None and state['leases'].get(shard_id, (None,))[0] == worker:
+                del state['leases'][shard_id]
+                state['pending'].insert(0, shard_id)
+
+    def finalize(self, job_id) -> bool:
+        """True for exactly one caller once every shard is done"""
+        with self._lock:
+            state = self._jobs.get(str(job_id))
+            if state is None or state['finalized'] or len(state['done']) < len(state['shards']):
+                return False
+            state['finalized'] = True
+            return True
+
+    def status(self, job_id) -> Dict[str, int]:
+        with self._lock:
+            state = self._jobs.get(str(job_id))
+            if state is None:
+                return {'shards': 0, 'pending': 0, 'leased': 0, 'done': 0}
+            return {
+                'shards': len(state['shards']), 'pending': len(state['pending']),
+                'leased': len(state['leases']), 'done': len(state['done']),
+            }
+
+    def discard(self, job_id) -> None:
+        with self._lock:
+            self._jobs.pop(str(job_id), None)
+
+
+# Lease expiry uses the Redis server's clock so nodes with skewed clocks agree on it
+CLAIM_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, shard in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], shard)
+    redis.call('HDEL', KEYS[3], shard)
+    redis.call('RPUSH', KEYS[1], shard)
+end
+local shard = redis.call('LPOP', KEYS[1])
+if not shard then
+    return false
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), shard)
+redis.call('HSET', KEYS[3], shard, ARGV[1])
+return {shard, redis.call('HGET', KEYS[4], shard)}
+"""
+HEARTBEAT_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+local t = redis.call('TIME')
+redis.call('ZADD', KEYS[1], tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+COMPLETE_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('SADD', KEYS[3], ARGV[1])
+return 1
+"""
+RELEASE_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('LPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+# A job with no shard hash is either discarded/unknown, or created with no shards; only the latter is active
+FINALIZE_SCRIPT = """
+if redis.call('HLEN', KEYS[2]) == 0 and redis.call('SISMEMBER', KEYS[4], ARGV[1]) == 0 then
+    return 0
+end
+if redis.call('SCARD', KEYS[1]) < redis.call('HLEN', KEYS[2]) then
+    return 0
+end
+if redis.call('SET', KEYS[3], '1', 'NX') == false then
+    return 0
+end
+redis.call('SREM', KEYS[4], ARGV[1])
+return 1
+"""
+
+
+class RedisShardCoordinator:
+    """Shard leases in Redis, shared by scrape workers on every node.
+
+    Each job has a list of pending shard IDs, a hash of shard contents, a
+    sorted set of leases scored by expiry, a hash of lease owners and a set of
+    finished shards. Claiming, heartbeating, completing and releasing are Lua
+    scripts, so a shard can't be lost or held twice between two commands.
+    Expired leases go back to the end of the queue on the next claim.
+    """
+
+    def __init__(self, url: str, lease_seconds: Optional[float] = None):
+        self.client = redis.Redis.from_url(url)
+        self.lease_seconds = lease_seconds or settings.SCRAPER_SHARD_LEASE_SECONDS
+        self.prefix = settings.SCRAPER_SHARD_KEY_PREFIX
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+        self._heartbeat = self.client.register_script(HEARTBEAT_SCRIPT)
+        self._complete = self.client.register_script(COMPLETE_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+        self._finalize = self.client.register_script(FINALIZE_SCRIPT)
+
+    def create(self, job_id, shards: List[List[str]]) -> None:
+        keys = self._keys(job_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(*keys.values())
+        if shards:
+            pipe.hset(keys['shards'], mapping={index: json.dumps(usns) for index, usns in enumerate(shards)})
+            pipe.rpush(keys['pending'], *range(len(shards)))
+        pipe.sadd(self._active_key(), str(job_id))
+        pipe.execute()
+
+    def active_jobs(self) -> List[str]:
+        return [job_id.decode() for job_id in self.client.smembers(self._active_key())]
+
+    def claim(self, job_id, worker: str) -> Optional[Shard]:
+        keys = self._keys(job_id)
+        claimed = self._claim(
+            keys=[keys['pending'], keys['leases'], keys['owners'], keys['shards']],
+            args=[worker, self.lease_seconds],
+        )
+        if not claimed:
+            return None
+        shard_id, usns = claimed
+        return int(shard_id), json.loads(usns)
+
+    def heartbeat(self, job_id, shard_id: int, worker: str) -> bool:
+        keys = self._keys(job_id)
+        return bool(self._heartbeat(keys=[keys['leases'], keys['owners']], args=[shard_id, worker, self.lease_seconds]))
+
+    def complete(self, job_id, shard_id: int, worker: str) -> bool:
+        keys = self._keys(job_id)
+        return bool(self._complete(keys=[keys['leases'], keys['owners'], keys['done']], args=[shard_id, worker]))
+
+    def release(self, job_id, shard_id: int, worker: str) -> None:
+        keys = self._keys(job_id)
+        self._release(keys=[keys['leases'], keys['owners'], keys['pending']], args=[shard_id, worker])
+
+    def finalize(self, job_id) -> bool:
+        keys = self._keys(job_id)
+        return bool(self._finalize(
+            keys=[keys['done'], keys['shards'], keys['finalized'], self._active_key()], args=[str(job_id)]
+        ))
+
+    def status(self, job_id) -> Dict[str, int]:
+        keys = self._keys(job_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hlen(keys['shards'])
+        pipe.llen(keys['pending'])
+        pipe.zcard(keys['leases'])
+        pipe.scard(keys['done'])
+        shards, pending, leased, done = pipe.execute()
+        return {'shards': shards, 'pending': pending, 'leased': leased, 'done': done}
+
+    def discard(self, job_id) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(*self._keys(job_id).values())
+        pipe.srem(self._active_key(), str(job_id))
+        pipe.execute()
+
+    def _keys(self, job_id) -> Dict[str, str]:
+        base = f'{self.prefix}:{job_id}'
+        return {name: f'{base}:{name}' for name in ('pending', 'shards', 'leases', 'owners', 'done', 'finalized')}
+
+    def _active_key(self) -> str:
+        return f'{self.prefix}:active'
+
+
+class LeaseHeartbeat:
+    """Keeps a shard lease alive from a background thread while the shard is scraped.
+
+    ``lost`` is set if the lease could not be extended (it expired and another
+    worker may have it), so the scrape can stop instead of duplicating work.
+    """
+
+    def __init__(self, coordinator, job_id, shard_id: int, worker: str):
+        self.coordinator = coordinator
+        self.job_id = job_id
+        self.shard_id = shard_id
+        self.worker = worker
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'shard-lease-{shard_id}', daemon=True)
+
+    def __enter__(self) -> 'LeaseHeartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        interval = self.coordinator.lease_seconds / 3
+        while not self._stop.wait(interval):
+            try:
+                alive = self.coordinator.heartbeat(self.job_id, self.shard_id, self.worker)
+            except Exception as e:
+                # A blip in Redis is not a lost lease; the next beat may get through before it expires
+                print(f"Failed to extend lease on shard {self.shard_id} of job {self.job_id}: {str(e)}")
+                continue
+            if not alive:
+                print(f"Lost lease on shard {self.shard_id} of job {self.job_id}")
+                self.lost.set()
+                return
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_shard_coordinator():
+    """Redis leases when SCRAPER_REDIS_URL is set, otherwise leases shared by this process's workers"""
+    global _coordinator
+    if _coordinator is None:
+        with _coordinator_lock:
+            if _coordinator is None:
+                _coordinator = (
+                    RedisShardCoordinator(settings.SCRAPER_REDIS_URL) if settings.SCRAPER_REDIS_URL
+                    else LocalShardCoordinator()
+                )
+    return _coordinator
@@ -0,0 +1,27 @@
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+_EXHAUSTED = object()
+
+
+class IncrementalStreamingHttpResponse(StreamingHttpResponse):
+    """StreamingHttpResponse whose synchronous iterator is also sent chunk by chunk under ASGI.
+
+    Django's ASGI handler collects a synchronous iterator into a list before
+    sending any of it, which holds the whole body in memory and delays the
+    first byte until the last. Here each chunk is pulled in the sync thread
+    (so database access keeps working) and sent as soon as it is produced.
+    Under WSGI nothing changes.
+    """
+
+    async def __aiter__(self):
+        if self.is_async:
+            async for part in super().__aiter__():
+                yield part
+            return
+        iterator = self.streaming_content
+        while True:
+            part = await sync_to_async(next, thread_sensitive=True)(iterator, _EXHAUSTED)
+            if part is _EXHAUSTED:
+                return
+            yield part
@@ -0,0 +1,196 @@
+"""Local stand-in for a results.vtu.ac.in results page.
+
+Serves the same form, captcha and result markup the scraper expects so the
+engines can be exercised offline. Start it with
+``python manage.py run_stub_results_server`` and point the scraper at
+``http://127.0.0.1:8765/index.php``.
+"""
+import hashlib
+import random
+import secrets
+import string
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+from PIL import Image, ImageDraw, ImageFont
+
+CAPTCHA_ALPHABET = string.ascii_uppercase + string.digits
+CAPTCHA_LENGTH = 6
+SUBJECT_HEADER = [
+    'Subject Code', 'Subject Name', 'Internal Marks', 'External Marks', 'Total', 'Result', 'Announced / Updated on'
+]
+
+# Stand-in page assets so browser profiles have something to block; their sizes are invented, not
+# measured from the real results site
+PAGE_ASSETS = {
+    'css/style.css': ('text/css', b'/* stub */ @font-face { font-family: stub; src: url(../fonts/stub.woff2); }'
+                      b' body { font-family: stub; }' + b' ' * 40_000),
+    'fonts/stub.woff2': ('font/woff2', b'\0' * 50_000),
+    'js/jquery.min.js': ('application/javascript', b'/* stub */' + b' ' * 90_000),
+    'images/banner.png': ('image/png', b'\0' * 120_000),
+}
+PAGE_HEAD = (
+    '<head><title>VTU Results</title><link rel="stylesheet" href="css/style.css">'
+    '<script src="js/jquery.min.js"></script></head>'
+)
+BANNER = '<img src="images/banner.png" alt="banner">'
+
+FORM_PAGE = "<html>" + PAGE_HEAD + "<body>" + BANNER + """
+<form id="raj" action="resultpage.php" method="post">
+<input type="hidden" name="Token" value="{token}">
+<div><input type="text" name="lns" placeholder="University Seat Number"></div>
+<div><div><input type="text" name="captchacode" placeholder="Captcha"></div>
+<div><img src="captcha.php" alt="captcha"></div></div>
+<input type="submit" id="submit" value="SUBMIT">
+</form></body></html>"""
+
+ALERT_PAGE = "<script>alert('{message}');window.location.href='index.php';</script>"
+
+
+def render_captcha(text: str, seed: int = 0) -> bytes:
+    """Draw captcha text in the grey glyph band over coloured noise"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (160, 45), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(400):
+        x, y = rng.randrange(160), rng.randrange(45)
+        draw.point((x, y), fill=(rng.randrange(150, 255), rng.randrange(0, 100), rng.randrange(0, 255)))
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:
+        font = ImageFont.load_default()
+    grey = rng.randrange(102, 130)
+    draw.text((8, 6), text, fill=(grey, grey, grey), font=font)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def synthetic_captcha(seed: int):
+    """Deterministic (captcha image, text) pair for a seed"""
+    rng = random.Random(seed)
+    text = ''.join(rng.choice(CAPTCHA_ALPHABET) for _ in range(CAPTCHA_LENGTH))
+    return render_captcha(text, seed), text
+
+
+def student_marks(usn: str, semesters: int):
+    """Deterministic fake marks for a USN, one list of rows per semester"""
+    digest = hashlib.sha256(usn.encode()).digest()
+    branch = usn[5:7] if len(usn) >= 7 else 'CS'
+    scheme = usn[3:5] if len(usn) >= 5 else '21'
+    blocks = []
+    for sem in range(semesters, 0, -1):
+        rows = []
+        for subject in range(1, 7):
+            internal = 20 + digest[(sem * 7 + subject) % len(digest)] % 31
+            external = 18 + digest[(sem * 11 + subject * 3) % len(digest)] % 33
+            total = internal + external
+            rows.append([
+                f'{scheme}{branch}{sem}{subject:02d}', f'Subject {sem}.{subject}',
+                str(internal), str(external), str(total), 'P' if total >= 40 else 'F', '2025-01-01',
+            ])
+        blocks.append((sem, rows))
+    return blocks
+
+
+def render_result_page(usn: str, name: str, semesters: int) -> str:
+    parts = [
+        f'<html>{PAGE_HEAD}<body>{BANNER}<table>',
+        f'<tr><td><b>University Seat Number</b></td><td><b> : {usn}</b></td></tr>',
+        f'<tr><td><b>Student Name</b></td><td><b> : {name}</b></td></tr>',
+        '</table>',
+    ]
+    for sem, rows in student_marks(usn, semesters):
+        parts.append(f'<div style="text-align:center;padding:5px;"><b>Semester : {sem}</b></div>')
+        parts.append('<div><div class="divTable"><div class="divTableBody">')
+        for row in [SUBJECT_HEADER] + rows:
+            cells = ''.join(f'<div class="divTableCell">{cell}</div>' for cell in row)
+            parts.append(f'<div class="divTableRow">{cells}</div>')
+        parts.append('</div></div></div>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+class StubResultsState:
+    """Per-server sessions and the set of USN suffixes that have results"""
+
+    def __init__(self, students: int = 60, semesters: int = 1, accept_any_captcha: bool = False):
+        self.students = students
+        self.semesters = semesters
+        self.accept_any_captcha = accept_any_captcha
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def has_result(self, usn: str) -> bool:
+        suffix = usn[-3:]
+        return len(usn) == 10 and suffix.isdigit() and 1 <= int(suffix) <= self.students
+
+    def new_captcha(self, session_id: str) -> bytes:
+        with self.lock:
+            self.counter += 1
+            seed = self.counter
+        image, text = synthetic_captcha(seed)
+        self.sessions.setdefault(session_id, {})['captcha'] = text
+        return image
+
+
+class StubResultsHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session_id(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        if 'PHPSESSID' in cookie:
+            return cookie['PHPSESSID'].value, False
+        return secrets.token_hex(8), True
+
+    def _send(self, body: bytes, content_type: str, session_id: str, new_session: bool):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if new_session:
+            self.send_header('Set-Cookie', f'PHPSESSID={session_id}; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        session_id, new_session = self._session_id()
+        path = urlparse(self.path).path
+        for asset, (content_type, body) in PAGE_ASSETS.items():
+            if path.endswith(asset):
+                return self._send(body, content_type, session_id, new_session)
+        if path.endswith('captcha.php'):
+            body = self.state.new_captcha(session_id)
+            return self._send(body, 'image/png', session_id, new_session)
+        token = secrets.token_hex(8)
+        self.state.sessions.setdefault(session_id, {})['token'] = token
+        return self._send(FORM_PAGE.format(token=token).encode(), 'text/html', session_id, new_session)
+
+    def do_POST(self):
+        session_id, new_session = self._session_id()
+        length = int(self.headers.get('Content-Length', 0))
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        session = self.state.sessions.get(session_id, {})
+        usn = form.get('lns', '').strip().upper()
+        captcha_ok = self.state.accept_any_captcha or (
+            session.get('captcha') and form.get('captchacode', '').upper() == session['captcha']
+        )
+        session.pop('captcha', None)
+        if form.get('Token') != session.get('token') or not captcha_ok:
+            body = ALERT_PAGE.format(message='Invalid captcha code !!!')
+        elif not self.state.has_result(usn):
+            body = ALERT_PAGE.format(message='University Seat Number is not available or Invalid..!')
+        else:
+            body = render_result_page(usn, f'STUDENT {usn[-3:]}', self.state.semesters)
+        return self._send(body.encode(), 'text/html', session_id, new_session)
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8765, **state_options) -> ThreadingHTTPServer:
+    """Build a threaded stub results server; call serve_forever() to run it"""
+    handler = type('BoundStubResultsHandler', (StubResultsHandler,), {'state': StubResultsState(**state_options)})
+    return ThreadingHTTPServer((host, port), handler)
@@ -1,3 +1,746 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import mock, skipUnless
+import msgpack
+import numpy as np
+import pandas as pd
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from .captcha import GlyphBank, glyph_mask, load_labelled_captchas, segment_glyphs, solve_captcha
+from .checks import check_ocr_engine
+from .delta import CHANGE_ADDED, CHANGE_MARKS, CHANGE_REMOVED, diff_results
+from .driver_pool import WebDriverPool, warm_driver_pool
+from .exports import ExportFormatError, select_export_format, stream_export
+from .http_engine import ALERT_PATTERN, HttpResultSession
+from .ingest import ingest_records
+from .jobs import claim_job, run_next_shard
+from .models import Marks, ScrapeJob, ScrapeJobResult, Student, Subject
+from .ocr import FALLBACK_WARNING, OcrPool
+from .result_cache import ResultCache
+from .result_parser import parse_result_page
+from .scraper import ResultScraperService
+from .shards import LocalShardCoordinator, RedisShardCoordinator, split_shards
+from .stub_server import make_server, render_result_page, student_marks, synthetic_captcha
+from .throttle import MIN_DELAY, AimdLimiter, SubmissionSlot
+from .usn_planner import RangePlanner, expand_usn_range, parse_range
+from .xlsx_stream import stream_workbook
 
-# Create your tests here.
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+URL = 'https://results.vtu.ac.in/JJEcbcs24/index.php'
+
+
+def usns(start, end, prefix='1AB21CS'):
+    return expand_usn_range(prefix, f'{start}-{end}')
+
+
+def stub_record(usn, semesters=1):
+    return parse_result_page(render_result_page(usn, f'STUDENT {usn[-3:]}', semesters)).to_record()
+
+
+def fake_scrape_data(found, calls=None):
+    """Stand-in for ResultScraperService._scrape_data: USNs in found have a result, the rest don't"""
+
+    def scrape_data(url, usn_list, workers=1, planner=None):
+        if calls is not None:
+            calls.append(list(usn_list))
+        for usn in usn_list:
+            yield (usn, 'result', stub_record(usn)) if usn in found else (usn, 'not_found', None)
+
+    return scrape_data
+
+
+# Results stay out of the process-wide result cache so one test's answers can't leak into another
+no_result_cache = override_settings(SCRAPER_RESULT_CACHE_TTL=0, SCRAPER_RESULT_CACHE_NOT_FOUND_TTL=0)
+
+
+class StubServerMixin:
+    """Runs a stub results server for the test; its form is at self.url"""
+    stub_options = {}
+
+    def setUp(self):
+        super().setUp()
+        self.server = make_server(port=0, **self.stub_options)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/index.php'
+
+
+def ocr_reads(*reads):
+    """Stand-in OCR pool whose submissions resolve to the given (text, confidence) reads in turn"""
+    pool = mock.Mock()
+
+    def submit(image):
+        future = Future()
+        future.set_result(next(reads_left))
+        return future
+
+    reads_left = iter(reads)
+    pool.submit.side_effect = submit
+    return pool
+
+
+class HttpResultSessionTests(StubServerMixin, SimpleTestCase):
+    stub_options = {'students': 5}
+
+    def setUp(self):
+        super().setUp()
+        self.session = HttpResultSession(self.url)
+        self.addCleanup(self.session.close)
+        self.session.load_form()
+        self.session.fetch_captcha()
+
+    def test_result_page(self):
+        alert, page = self.session.submit('1AB21CS001', self.captcha_text())
+        self.assertIsNone(alert)
+        self.assertEqual(parse_result_page(page).usn, '1AB21CS001')
+
+    def test_not_found(self):
+        alert, _ = self.session.submit('1AB21CS099', self.captcha_text())
+        self.assertEqual(alert, 'University Seat Number is not available or Invalid..!')
+
+    def test_bad_captcha(self):
+        alert, _ = self.session.submit('1AB21CS001', 'WRONG')
+        self.assertEqual(alert, 'Invalid captcha code !!!')
+        # The form is reloaded for its new token, so the next submission goes through
+        self.session.fetch_captcha()
+        self.assertIsNone(self.session.submit('1AB21CS001', self.captcha_text())[0])
+
+    def test_inline_alert_on_a_result_page_is_not_a_rejection(self):
+        page = render_result_page('1AB21CS001', 'A', 1).replace(
+            '</body>', "<script>function warn() { alert('Print failed'); }</script></body>"
+        )
+        self.assertIsNone(ALERT_PATTERN.search(page))
+
+    def captcha_text(self):
+        session_id = self.session.session.cookies['PHPSESSID']
+        return self.server.RequestHandlerClass.state.sessions[session_id]['captcha']
+
+
+class OcrPoolTests(SimpleTestCase):
+    image = Image.new('L', (160, 45), 255)
+
+    def test_each_worker_thread_keeps_one_engine(self):
+        engine = mock.Mock()
+        engine.return_value.GetUTF8Text.return_value = 'ABC123\n'
+        engine.return_value.AllWordConfidences.return_value = [91]
+        with mock.patch('app.ocr.PyTessBaseAPI', engine), \
+                mock.patch('app.ocr.PSM', create=True), mock.patch('app.ocr.OEM', create=True):
+            pool = OcrPool(1)
+            self.addCleanup(pool._executor.shutdown)
+            reads = [pool.submit(self.image).result() for _ in range(3)]
+            stats = pool.stats()
+        self.assertEqual(reads, [('ABC123', 0.91)] * 3)
+        self.assertEqual(engine.call_count, 1)
+        self.assertEqual((stats['engine'], stats['calls'], stats['warning']), ('tesserocr', 3, ''))
+
+    def test_fallback_is_reported(self):
+        data = {'text': ['', 'ABC', '123'], 'conf': ['-1', '80', '60']}
+        with mock.patch('app.ocr.PyTessBaseAPI', None), \
+                mock.patch('app.ocr.pytesseract.image_to_data', return_value=data), \
+                mock.patch('app.checks.PyTessBaseAPI', None):
+            pool = OcrPool(1)
+            self.addCleanup(pool._executor.shutdown)
+            self.assertEqual(pool.submit(self.image).result(), ('ABC123', 0.6))
+            stats = pool.stats()
+            warnings = check_ocr_engine(None)
+        self.assertEqual((stats['engine'], stats['warning']), ('pytesseract', FALLBACK_WARNING))
+        self.assertEqual([warning.id for warning in warnings], ['app.W001'])
+
+
+class CaptchaSolverTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.bank = GlyphBank.build([synthetic_captcha(seed) for seed in range(10_000, 10_200)])
+
+    def test_segments_six_glyphs(self):
+        image, _ = synthetic_captcha(1)
+        mask = glyph_mask(np.asarray(Image.open(io.BytesIO(image)).convert('RGB')))
+        glyphs = segment_glyphs(mask)
+        self.assertEqual([glyph.shape for glyph in glyphs], [(12 * 16,)] * 6)
+        self.assertIsNone(segment_glyphs(np.zeros_like(mask)))
+
+    def test_classifies_held_out_captchas(self):
+        samples = [synthetic_captcha(seed) for seed in range(20)]
+        correct = sum(solve_captcha(image, self.bank)[0] == text for image, text in samples)
+        self.assertGreaterEqual(correct, 17)
+        text, confidence = self.bank.classify(self.bank.templates[:3])
+        self.assertEqual(text, ''.join(self.bank.labels[:3]))
+        self.assertGreater(confidence.min(), 0.99)
+
+    def test_bank_survives_a_save(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'bank.npz'
+            self.bank.save(path)
+            loaded = GlyphBank.load(path)
+        image, text = synthetic_captcha(3)
+        self.assertEqual(solve_captcha(image, loaded)[0], solve_captcha(image, self.bank)[0])
+
+    def test_confident_solver_read_skips_tesseract(self):
+        image, text = synthetic_captcha(0)
+        service = ResultScraperService('http')
+        pool = ocr_reads()
+        with mock.patch('app.scraper.get_glyph_bank', return_value=self.bank), \
+                mock.patch('app.scraper.get_ocr_pool', return_value=pool), \
+                mock.patch('app.scraper.solve_captcha', return_value=(text, np.ones(6))):
+            self.assertEqual(service._get_captcha_from_image(image), (text, True))
+        pool.submit.assert_not_called()
+
+    def test_falls_back_to_tesseract(self):
+        image, _ = synthetic_captcha(0)
+        service = ResultScraperService('http')
+        pool = ocr_reads(('AB12CD', 0.9), ('AB1', 0.9))
+        with mock.patch('app.scraper.get_glyph_bank', return_value=None), \
+                mock.patch('app.scraper.get_ocr_pool', return_value=pool):
+            self.assertEqual(service._get_captcha_from_image(image), ('AB12CD', True))
+            self.assertEqual(service._get_captcha_from_image(image), ('AB1AAA', False))
+        self.assertEqual((service.stats.get('captcha_ocr'), service.stats.get('captcha_low_confidence')), (1, 1))
+
+
+class CollectCaptchasTests(StubServerMixin, SimpleTestCase):
+    def test_keeps_only_reads_the_server_accepted(self):
+        state = self.server.RequestHandlerClass.state
+        reads = []
+
+        def submit(image):
+            # Every other read is wrong; the right ones come from the stub's session
+            (captcha,) = [session['captcha'] for session in state.sessions.values() if 'captcha' in session]
+            reads.append(captcha if len(reads) % 2 else 'WRONG1')
+            future = Future()
+            future.set_result((reads[-1], 0.9))
+            return future
+
+        pool = mock.Mock()
+        pool.submit.side_effect = submit
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('app.management.commands.collect_captchas.get_ocr_pool', return_value=pool):
+            call_command('collect_captchas', url=self.url, count=3, delay=0, output=directory, stdout=io.StringIO())
+            samples = load_labelled_captchas(Path(directory))
+        self.assertEqual([label for _, label in samples], sorted(reads[1::2]))
+        self.assertEqual(len(samples), 3)
+        self.assertEqual(len(GlyphBank.build(samples).labels), 18)
+
+
+class DriverPoolTests(SimpleTestCase):
+    url = 'http://127.0.0.1:1/index.php'
+
+    def setUp(self):
+        self.drivers = []
+
+        def create_driver():
+            driver = mock.Mock()
+            driver.execute_script.return_value = 0
+            self.drivers.append(driver)
+            return driver
+
+        patcher = mock.patch('app.driver_pool.create_driver', side_effect=create_driver)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sessions_are_reused_then_recycled(self):
+        pool = WebDriverPool(size=2, warm=0, max_uses=2, max_heap_mb=256)
+        driver = pool.checkout(self.url)
+        pool.checkin(driver)
+        self.assertIs(pool.checkout(self.url), driver)
+        pool.checkin(driver)
+        driver.quit.assert_called_once()
+        self.assertEqual(pool.stats(), {'size': 2, 'open': 0, 'idle': 0, 'starting': 0})
+
+    def test_warm_up_keeps_a_session_ready(self):
+        pool = WebDriverPool(size=2, warm=1, max_uses=20, max_heap_mb=256)
+        pool.warm_up()
+        self.wait_for(lambda: pool.stats()['idle'] == 1)
+        self.assertIs(pool.checkout(self.url, timeout=5), self.drivers[0])
+        # Handing the warm session out starts the next one
+        self.wait_for(lambda: pool.stats()['idle'] == 1)
+        self.assertEqual(pool.stats()['open'], 2)
+
+    def test_startup_warm_up_only_for_selenium(self):
+        for engine, warm, expected in (('http', 1, 0), ('selenium', 0, 0), ('selenium', 1, 1)):
+            with override_settings(SCRAPER_DEFAULT_ENGINE=engine, SCRAPER_DRIVER_POOL_WARM=warm), \
+                    mock.patch('app.driver_pool.get_driver_pool') as get_driver_pool:
+                warm_driver_pool()
+            self.assertEqual(get_driver_pool.return_value.warm_up.call_count, expected, (engine, warm))
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "Timed out waiting for the pool")
+            time.sleep(0.01)
+
+
+@no_result_cache
+@override_settings(SCRAPER_RUN_JOBS_IN_PROCESS=False)
+class JobResumeTests(TestCase):
+    def setUp(self):
+        self.job = ScrapeJob.objects.create(prefix_usn='1AB21CS', usn_range='1-4', url=URL, total_usns=4)
+        for position, usn in enumerate(usns(1, 2)):
+            ScrapeJobResult.objects.create(
+                job=self.job, usn=usn, position=position, status=ScrapeJobResult.STATUS_SCRAPED, record=stub_record(usn)
+            )
+
+    def test_resume_scrapes_only_unfinished_usns(self):
+        calls = []
+        with mock.patch.object(ResultScraperService, '_scrape_data', side_effect=fake_scrape_data(usns(1, 4), calls)):
+            response = ResultScraperService('http').run_job(self.job)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, [usns(3, 4)])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ScrapeJob.STATUS_COMPLETED)
+        self.assertEqual(self.job.results.count(), 4)
+
+    def test_finished_job_is_requeued(self):
+        ScrapeJob.objects.filter(pk=self.job.pk).update(status=ScrapeJob.STATUS_PARTIAL)
+        self.assertEqual(self.resume().status_code, 202)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ScrapeJob.STATUS_PENDING)
+
+    def test_running_job_needs_force(self):
+        ScrapeJob.objects.filter(pk=self.job.pk).update(status=ScrapeJob.STATUS_RUNNING)
+        self.assertEqual(self.resume().status_code, 409)
+
+    def test_force_is_refused_while_the_job_makes_progress(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        ScrapeJob.objects.filter(pk=self.job.pk).update(status=ScrapeJob.STATUS_RUNNING, updated_at=long_ago)
+        # A USN settled just now: the worker is alive
+        self.assertEqual(self.resume(force=True).status_code, 409)
+
+        self.job.results.update(scraped_at=long_ago)
+        self.assertEqual(self.resume(force=True).status_code, 202)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ScrapeJob.STATUS_PENDING)
+
+    def resume(self, **data):
+        return APIClient().post(reverse('job-resume', args=[self.job.id]), data, format='json')
+
+
+class JobQueueTests(TestCase):
+    def test_pending_job_is_claimed_once(self):
+        job = ScrapeJob.objects.create(prefix_usn='1AB21CS', usn_range='1-4', url=URL, total_usns=4)
+        claimed = claim_job(job.id)
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, ScrapeJob.STATUS_RUNNING)
+        self.assertIsNone(claim_job(job.id))
+
+
+class ResultParserTests(SimpleTestCase):
+    def test_parses_every_semester_of_a_result_page(self):
+        usn = '1AB21CS001'
+        result = parse_result_page(render_result_page(usn.lower(), 'Test Student', 2))
+        self.assertEqual((result.usn, result.name), (usn, 'Test Student'))
+        blocks = student_marks(usn.lower(), 2)
+        self.assertEqual([semester.semester for semester in result.semesters], [sem for sem, _ in blocks])
+
+        record = result.to_record()
+        self.assertEqual(record['marks'], [[row[0], row[4]] for row in blocks[0][1]])
+        self.assertEqual(record['semesters'][1]['subjects'][0], blocks[1][1][0][:6])
+
+    def test_page_without_student_header_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_result_page('<html><body><p>Invalid captcha</p></body></html>')
+
+
+class IngestTests(TestCase):
+    def test_reingesting_updates_rows_in_place(self):
+        records = [stub_record(usn, semesters=2) for usn in usns(1, 3)]
+        first = ingest_records(records)
+        counts = [model.objects.count() for model in (Student, Subject, Marks)]
+        self.assertEqual(counts, [first['students'], first['subjects'], first['marks']])
+
+        renamed = dict(records[0], name='RENAMED STUDENT')
+        block = renamed['semesters'][0]
+        code = block['subjects'][0][0]
+        subjects = [list(row) for row in block['subjects']]
+        subjects[0][4] = '7'
+        renamed['semesters'] = [dict(block, subjects=subjects)] + renamed['semesters'][1:]
+        ingest_records([renamed] + records[1:])
+
+        self.assertEqual([model.objects.count() for model in (Student, Subject, Marks)], counts)
+        student = Student.objects.get(usn=renamed['usn'])
+        self.assertEqual(student.name, 'RENAMED STUDENT')
+        self.assertEqual(
+            Marks.objects.get(student=student, subject__name=code, semester__semester=block['semester']).marks, 7
+        )
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResultCache(LocMemCache('test-results', {}), ttl=60, not_found_ttl=30)
+        self.record = {'usn': '1AB21CS001', 'name': 'A', 'marks': [['21CS51', '80']]}
+
+    def test_results_and_not_found_are_told_apart_from_misses(self):
+        self.cache.set_result(URL, '1AB21CS001', self.record)
+        self.cache.set_not_found(URL, '1AB21CS002')
+        cached = self.cache.get_many(URL, usns(1, 3))
+        self.assertEqual(cached, {'1AB21CS001': self.record, '1AB21CS002': None})
+        self.assertEqual(self.cache.get_many(URL + '?other', usns(1, 3)), {})
+
+    def test_invalidate_some_usns_or_the_whole_url(self):
+        for usn in usns(1, 3):
+            self.cache.set_result(URL, usn, self.record)
+        self.cache.invalidate(URL, ['1AB21CS001'])
+        self.assertEqual(set(self.cache.get_many(URL, usns(1, 3))), {'1AB21CS002', '1AB21CS003'})
+        self.cache.invalidate(URL)
+        self.assertEqual(self.cache.get_many(URL, usns(1, 3)), {})
+        self.cache.set_result(URL, '1AB21CS001', self.record)
+        self.assertEqual(list(self.cache.get_many(URL, usns(1, 3))), ['1AB21CS001'])
+
+    def test_zero_ttls_disable_the_cache(self):
+        cache = ResultCache(LocMemCache('test-disabled', {}), ttl=0, not_found_ttl=0)
+        cache.set_result(URL, '1AB21CS001', self.record)
+        self.assertFalse(cache.enabled)
+        self.assertEqual(cache.get_many(URL, ['1AB21CS001']), {})
+
+
+class DiffResultsTests(SimpleTestCase):
+    def record(self, usn, *totals):
+        return {'usn': usn, 'name': usn, 'marks': [[f'21CS5{n}', total] for n, total in enumerate(totals)]}
+
+    def test_reports_added_removed_and_changed_marks(self):
+        previous = {
+            'A': None, 'B': self.record('B', '50'), 'C': self.record('C', '40', '60'), 'D': self.record('D', '1'),
+        }
+        current = {
+            'A': self.record('A', '70'), 'B': None, 'C': self.record('C', '45', '60'), 'D': self.record('D', '1'),
+        }
+        changes = diff_results(previous, current, ['A', 'B', 'C', 'D', 'E'])
+        self.assertEqual([(change['usn'], change['change']) for change in changes], [
+            ('A', CHANGE_ADDED), ('B', CHANGE_REMOVED), ('C', CHANGE_MARKS),
+        ])
+        self.assertEqual((changes[2]['subject'], changes[2]['old'], changes[2]['new']), ('21CS50', '40', '45'))
+
+
+@no_result_cache
+class IncrementalJobTests(TestCase):
+    def test_rescrapes_stale_and_missing_usns_and_reports_changes(self):
+        first = ScrapeJob.objects.create(prefix_usn='1AB21CS', usn_range='1-4', url=URL, total_usns=4)
+        with mock.patch.object(ResultScraperService, '_scrape_data', side_effect=fake_scrape_data(usns(1, 3))):
+            ResultScraperService('http').scrape_job(first)
+        stale, missing = usns(2, 2)[0], usns(4, 4)[0]
+        first.results.filter(usn=stale).update(scraped_at=timezone.now() - timedelta(days=2))
+
+        job = ScrapeJob.objects.create(prefix_usn='1AB21CS', usn_range='1-4', url=URL, total_usns=4, incremental=True)
+        calls = []
+        with mock.patch.object(ResultScraperService, '_scrape_data', side_effect=fake_scrape_data(usns(1, 4), calls)):
+            ResultScraperService('http').scrape_job(job)
+
+        self.assertEqual(calls, [[stale, missing]])
+        carried = set(job.results.filter(carried_over=True).values_list('usn', flat=True))
+        self.assertEqual(carried, set(usns(1, 1) + usns(3, 3)))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScrapeJob.STATUS_COMPLETED)
+        self.assertEqual((job.diff['carried_over'], job.diff['rescraped']), (2, 2))
+        changes = [(change['usn'], change['change']) for change in job.diff['changes']]
+        self.assertEqual(changes, [(missing, CHANGE_ADDED)])
+
+        response = ResultScraperService('http').create_job_response(job)
+        workbook = pd.read_excel(io.BytesIO(b''.join(response.streaming_content)), sheet_name=None)
+        self.assertEqual(list(workbook['Sem Results']['USN']), usns(1, 4))
+        self.assertEqual(list(workbook['Changes']['USN']), [missing])
+
+
+class RangePlannerTests(SimpleTestCase):
+    def test_parse_range_merges_and_sorts(self):
+        self.assertEqual(parse_range('5-7, 1-2,6-9,3,x-1'), [1, 2, 3, 5, 6, 7, 8, 9])
+        self.assertEqual(parse_range('3-1'), [1, 2, 3])
+        self.assertEqual(expand_usn_range('1AB21CS', '9-10'), ['1AB21CS009', '1AB21CS010'])
+
+    def test_cuts_off_after_a_run_of_misses_past_a_result(self):
+        planner = RangePlanner(usns(1, 20), stop_after=3)
+        planner.record('1AB21CS001', True)
+        for usn in usns(2, 4):
+            planner.record(usn, False)
+        self.assertTrue(planner.should_scrape('1AB21CS004'))
+        self.assertFalse(planner.should_scrape('1AB21CS005'))
+
+        planner.record('1AB21CS010', True)
+        self.assertTrue(planner.should_scrape('1AB21CS008'))
+
+    def test_misses_before_the_first_result_do_not_cut_off(self):
+        planner = RangePlanner(usns(1, 20), stop_after=3)
+        for usn in usns(1, 10):
+            planner.record(usn, False)
+        self.assertTrue(planner.should_scrape('1AB21CS011'))
+
+    def test_lateral_entry_series_is_independent(self):
+        planner = RangePlanner(usns(1, 10) + usns(400, 405), stop_after=2)
+        planner.record('1AB21CS001', True)
+        planner.record('1AB21CS002', False)
+        planner.record('1AB21CS003', False)
+        self.assertFalse(planner.should_scrape('1AB21CS004'))
+        self.assertTrue(planner.should_scrape('1AB21CS400'))
+
+    def test_disabled_planner_scrapes_everything(self):
+        planner = RangePlanner(usns(1, 10), stop_after=0)
+        planner.record('1AB21CS001', True)
+        for usn in usns(2, 9):
+            planner.record(usn, False)
+        self.assertTrue(planner.should_scrape('1AB21CS010'))
+
+
+class ExportTests(SimpleTestCase):
+    columns = ['USN', 'Student Name', '21CS51']
+    sheets = [('Sem 5', columns, [['1AB21CS001', 'A', 80], ['1AB21CS002', 'B', None]])]
+
+    def test_workbook_reads_back(self):
+        data = b''.join(stream_workbook(self.sheets + [('Sem 5', ['USN'], [['1AB21CS003']])], chunk_size=64))
+        workbook = pd.read_excel(io.BytesIO(data), sheet_name=None)
+        self.assertEqual(len(workbook), 2)
+        frame = workbook['Sem 5']
+        self.assertEqual(list(frame.columns), self.columns)
+        self.assertEqual(frame['21CS51'].tolist()[0], 80)
+        self.assertTrue(pd.isna(frame['21CS51'].tolist()[1]))
+        self.assertEqual(frame['USN'].tolist(), ['1AB21CS001', '1AB21CS002'])
+
+    def test_flat_formats(self):
+        csv = b''.join(stream_export(self.sheets, 'csv')).decode()
+        self.assertEqual(csv.splitlines(), ['USN,Student Name,21CS51', '1AB21CS001,A,80', '1AB21CS002,B,'])
+        ndjson = b''.join(stream_export(self.sheets, 'ndjson')).decode().splitlines()
+        self.assertEqual(json.loads(ndjson[1]), {'USN': '1AB21CS002', 'Student Name': 'B', '21CS51': None})
+        unpacker = msgpack.Unpacker(io.BytesIO(b''.join(stream_export(self.sheets, 'msgpack'))))
+        self.assertEqual([row['USN'] for row in unpacker], ['1AB21CS001', '1AB21CS002'])
+
+    def test_several_sheets_flatten_with_a_sheet_column(self):
+        sheets = self.sheets + [('Sem 6', ['USN', '21CS61'], [['1AB21CS001', 70]])]
+        rows = b''.join(stream_export(sheets, 'csv')).decode().splitlines()
+        self.assertEqual(rows[0], 'Sheet,USN,Student Name,21CS51,21CS61')
+        self.assertEqual(rows[3], 'Sem 6,1AB21CS001,,,70')
+
+    def test_format_selection(self):
+        self.assertEqual(select_export_format(None, None), 'xlsx')
+        self.assertEqual(select_export_format(' CSV ', 'application/x-ndjson'), 'csv')
+        self.assertEqual(select_export_format(None, 'application/json, text/csv;q=0.5, application/msgpack'), 'msgpack')
+        with self.assertRaises(ExportFormatError):
+            select_export_format('pdf', None)
+        with self.assertRaises(ExportFormatError):
+            stream_export(self.sheets, 'pdf')
+
+
+@no_result_cache
+class StreamJobTests(TestCase):
+    def setUp(self):
+        self.job = ScrapeJob.objects.create(prefix_usn='1AB21CS', usn_range='1-4', url=URL, total_usns=4)
+        patcher = mock.patch.object(ResultScraperService, '_scrape_data', side_effect=fake_scrape_data(usns(1, 3)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_streams_records_then_a_summary(self):
+        lines = [json.loads(line) for line in ResultScraperService('http').stream_job(self.job)]
+        self.assertEqual([line['type'] for line in lines], ['record'] * 3 + ['summary'])
+        self.assertEqual([line['usn'] for line in lines[:3]], usns(1, 3))
+        self.assertEqual(lines[0]['record'], stub_record(usns(1, 1)[0]))
+        summary = lines[-1]
+        self.assertEqual(summary['job_id'], str(self.job.id))
+        self.assertEqual(summary['status'], ScrapeJob.STATUS_COMPLETED)
+        self.assertEqual(
+            [summary[key] for key in ('total', 'scraped', 'not_found', 'skipped', 'failed')], [4, 3, 1, 0, 0]
+        )
+
+    def test_disconnect_leaves_a_partial_job_to_resume(self):
+        stream = ResultScraperService('http').stream_job(self.job)
+        self.assertEqual(json.loads(next(stream))['usn'], usns(1, 1)[0])
+        stream.close()
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ScrapeJob.STATUS_PARTIAL)
+        self.assertEqual(list(self.job.results.values_list('usn', flat=True)), usns(1, 1))
+
+
+class ShardCoordinatorTests(SimpleTestCase):
+    def setUp(self):
+        self.coordinator = LocalShardCoordinator(lease_seconds=30)
+        self.coordinator.create('job', split_shards(usns(1, 5), 2))
+
+    def test_split_shards_keeps_seats_contiguous(self):
+        self.assertEqual(split_shards(['a', 'b', 'c'], 2), [['a', 'b'], ['c']])
+        self.assertEqual(split_shards(['a', 'b'], 0), [['a'], ['b']])
+
+    def test_claims_hand_out_each_shard_once(self):
+        leases = [self.coordinator.claim('job', f'w{n}') for n in range(4)]
+        self.assertEqual([lease[0] for lease in leases[:3]], [0, 1, 2])
+        self.assertEqual(leases[2][1], ['1AB21CS005'])
+        self.assertIsNone(leases[3])
+        self.assertIsNone(self.coordinator.claim('unknown', 'w0'))
+        self.assertEqual(self.coordinator.status('job'), {'shards': 3, 'pending': 0, 'leased': 3, 'done': 0})
+
+    def test_expired_lease_is_requeued(self):
+        with mock.patch('app.shards.time.monotonic', return_value=100.0):
+            shard_id, _ = self.coordinator.claim('job', 'dead')
+        with mock.patch('app.shards.time.monotonic', return_value=125.0):
+            self.assertTrue(self.coordinator.heartbeat('job', shard_id, 'dead'))
+        with mock.patch('app.shards.time.monotonic', return_value=160.0):
+            self.assertEqual(self.coordinator.claim('job', 'alive')[0], 1)
+            self.assertEqual(self.coordinator.claim('job', 'alive')[0], 2)
+            self.assertEqual(self.coordinator.claim('job', 'alive')[0], shard_id)
+        self.assertFalse(self.coordinator.heartbeat('job', shard_id, 'dead'))
+        self.assertFalse(self.coordinator.complete('job', shard_id, 'dead'))
+        self.assertTrue(self.coordinator.complete('job', shard_id, 'alive'))
+
+    def test_released_shard_is_claimed_next(self):
+        first, _ = self.coordinator.claim('job', 'w1')
+        self.coordinator.claim('job', 'w2')
+        self.coordinator.release('job', first, 'someone else')
+        self.assertEqual(self.coordinator.status('job')['leased'], 2)
+        self.coordinator.release('job', first, 'w1')
+        self.assertEqual(self.coordinator.claim('job', 'w3')[0], first)
+
+    def test_finalize_once_every_shard_is_done(self):
+        for _ in range(2):
+            shard_id, _ = self.coordinator.claim('job', 'w')
+            self.coordinator.complete('job', shard_id, 'w')
+        self.assertFalse(self.coordinator.finalize('job'))
+        shard_id, _ = self.coordinator.claim('job', 'w')
+        self.coordinator.complete('job', shard_id, 'w')
+        self.assertTrue(self.coordinator.finalize('job'))
+        self.assertFalse(self.coordinator.finalize('job'))
+        self.assertEqual(self.coordinator.active_jobs(), [])
+        self.coordinator.discard('job')
+        self.assertEqual(self.coordinator.status('job')['shards'], 0)
+
+
+class ShardWorkerTests(TestCase):
+    def test_worker_finalizes_job_left_done_but_unfinalized(self):
+        job = ScrapeJob.objects.create(
+            prefix_usn='1AB21CS', usn_range='1-4', url=URL, total_usns=4, status=ScrapeJob.STATUS_RUNNING
+        )
+        coordinator = LocalShardCoordinator(lease_seconds=30)
+        coordinator.create(job.id, split_shards(usns(1, 4), 2))
+        for _ in range(2):
+            shard_id, _ = coordinator.claim(job.id, 'gone')
+            coordinator.complete(job.id, shard_id, 'gone')
+
+        self.assertTrue(run_next_shard(coordinator, 'other'))
+        self.assertEqual(coordinator.active_jobs(), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScrapeJob.STATUS_PARTIAL)
+
+
+@skipUnless(fakeredis is not None and find_spec('lupa'), 'needs fakeredis with lupa for the Lua scripts')
+class RedisShardCoordinatorTests(SimpleTestCase):
+    def setUp(self):
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        with mock.patch('app.shards.redis.Redis.from_url', return_value=client):
+            self.coordinator = RedisShardCoordinator('redis://fake', lease_seconds=30)
+        self.coordinator.create('job', split_shards(usns(1, 5), 2))
+
+    def test_claims_hand_out_each_shard_once(self):
+        leases = [self.coordinator.claim('job', f'w{n}') for n in range(4)]
+        self.assertEqual(leases[:3], [(0, usns(1, 2)), (1, usns(3, 4)), (2, usns(5, 5))])
+        self.assertIsNone(leases[3])
+        self.assertIsNone(self.coordinator.claim('unknown', 'w0'))
+        self.assertEqual(self.coordinator.status('job'), {'shards': 3, 'pending': 0, 'leased': 3, 'done': 0})
+        self.assertEqual(self.coordinator.active_jobs(), ['job'])
+
+    def test_expired_lease_is_requeued(self):
+        self.coordinator.lease_seconds = 0.2
+        shard_id, _ = self.coordinator.claim('job', 'dead')
+        time.sleep(0.1)
+        self.assertTrue(self.coordinator.heartbeat('job', shard_id, 'dead'))
+        self.assertFalse(self.coordinator.heartbeat('job', shard_id, 'someone else'))
+        time.sleep(0.15)
+        # Still leased thanks to the heartbeat
+        self.assertEqual([self.coordinator.claim('job', 'alive')[0] for _ in range(2)], [1, 2])
+        self.assertIsNone(self.coordinator.claim('job', 'alive'))
+        time.sleep(0.25)
+        self.assertEqual(self.coordinator.claim('job', 'alive')[0], shard_id)
+        self.assertFalse(self.coordinator.heartbeat('job', shard_id, 'dead'))
+        self.assertFalse(self.coordinator.complete('job', shard_id, 'dead'))
+        self.assertTrue(self.coordinator.complete('job', shard_id, 'alive'))
+
+    def test_finalize_once_every_shard_is_done(self):
+        for _ in range(2):
+            shard_id, _ = self.coordinator.claim('job', 'w')
+            self.assertTrue(self.coordinator.complete('job', shard_id, 'w'))
+        self.assertFalse(self.coordinator.finalize('job'))
+        shard_id, _ = self.coordinator.claim('job', 'w')
+        self.coordinator.complete('job', shard_id, 'w')
+        self.assertTrue(self.coordinator.finalize('job'))
+        self.assertFalse(self.coordinator.finalize('job'))
+        self.assertEqual(self.coordinator.active_jobs(), [])
+
+    def test_only_a_created_job_without_shards_finalizes(self):
+        self.coordinator.create('empty', [])
+        self.assertTrue(self.coordinator.finalize('empty'))
+        self.assertFalse(self.coordinator.finalize('unknown'))
+        self.coordinator.discard('job')
+        self.assertFalse(self.coordinator.finalize('job'))
+        self.assertEqual(self.coordinator.status('job')['shards'], 0)
+
+
+class AimdLimiterTests(SimpleTestCase):
+    def cycle(self, limiter, outcome, count=1, latency=0.1):
+        for _ in range(count):
+            limiter.acquire()
+        for _ in range(count):
+            limiter.release(outcome, latency)
+
+    def test_full_windows_grow_the_limit_up_to_the_ceiling(self):
+        limiter = AimdLimiter(ceiling=3)
+        for _ in range(20):
+            self.cycle(limiter, 'result', count=int(limiter.limit))
+        self.assertEqual(limiter.limit, 3)
+
+    def test_unfilled_window_does_not_grow(self):
+        limiter = AimdLimiter(ceiling=4, initial=2)
+        for _ in range(5):
+            self.cycle(limiter, 'result')
+        self.assertEqual(limiter.limit, 2)
+
+    def test_timeout_halves_the_limit_once_per_round_trip(self):
+        limiter = AimdLimiter(ceiling=8, initial=8)
+        self.cycle(limiter, 'timeout', count=3)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.snapshot()['decreases'], 1)
+
+    def test_paces_submissions_once_down_to_one(self):
+        limiter = AimdLimiter(ceiling=4)
+        self.cycle(limiter, 'error', latency=0.0)
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.delay, MIN_DELAY)
+        self.cycle(limiter, 'result', latency=0.0)
+        self.assertEqual(limiter.delay, 0)
+
+    def test_backs_off_when_alert_rate_climbs(self):
+        limiter = AimdLimiter(ceiling=4, initial=4, max_alert_rate=0.3)
+        self.cycle(limiter, 'captcha_rejected')
+        self.assertEqual(limiter.limit, 4)
+        self.cycle(limiter, 'captcha_rejected')
+        self.assertEqual(limiter.limit, 2)
+
+    def test_backs_off_when_answers_slow_down(self):
+        limiter = AimdLimiter(ceiling=4, initial=4, latency_tolerance=2.0)
+        self.cycle(limiter, 'result', latency=0.1)
+        for _ in range(5):
+            self.cycle(limiter, 'result', latency=1.0)
+        self.assertLess(limiter.limit, 4)
+
+    def test_slot_releases_server_failures_as_errors_and_ignores_local_ones(self):
+        limiter = AimdLimiter(ceiling=4, initial=4)
+        with self.assertRaises(ValueError):
+            with SubmissionSlot(limiter, (ConnectionError,)):
+                raise ValueError("unparseable page")
+        self.assertEqual((limiter.limit, limiter.snapshot()['in_flight']), (4, 0))
+        with SubmissionSlot(limiter, (ConnectionError,)) as slot:
+            slot.outcome = 'result'
+        self.assertEqual(limiter.snapshot()['latency_ms'].keys(), {'result'})
+        with self.assertRaises(ConnectionError):
+            with SubmissionSlot(limiter, (ConnectionError,)):
+                raise ConnectionError("reset by peer")
+        self.assertEqual(limiter.limit, 2)
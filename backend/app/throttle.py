@@ -0,0 +1,189 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple, Type
+from urllib.parse import urlsplit
+from django.conf import settings
+
+# Outcomes that mean the server is struggling, whatever the latency looked like
+OVERLOAD_OUTCOMES = ('timeout', 'error')
+# Outcomes that happen now and then anyway (a misread captcha) and only count when their rate climbs
+ALERT_OUTCOMES = ('captcha_rejected', 'unexpected_alert')
+# Outcomes where the server answered the submission properly
+ANSWERED_OUTCOMES = ('result', 'not_found')
+# A submission that failed on our side (parsing, OCR) and says nothing about the server
+LOCAL_ERROR = 'local_error'
+# Weight of the newest sample in the smoothed latency and alert rate
+SMOOTHING = 0.2
+# How far the latency baseline follows each answer slower than it, so a server that got slower for
+# everyone (not just for us) stops looking congested after a while
+BASELINE_DRIFT = 0.01
+# Pacing starts at this many seconds between submissions once the limit is down to one
+MIN_DELAY = 0.25
+
+
+class AimdLimiter:
+    """Additive-increase, multiplicative-decrease limit on concurrent submissions to one results host.
+
+    Each answered submission raises the limit by ``increase / limit``, so a
+    full window of answers adds ``increase``. A timeout or error, an alert
+    rate above ``max_alert_rate``, or a smoothed latency more than
+    ``latency_tolerance`` times the fastest recent answer multiplies it by
+    ``decrease``, at most once per round trip so one burst of failures is
+    one signal. Below one submission in flight it slows the pace instead:
+    the gap between submissions doubles up to ``max_delay`` and halves
+    again as answers come back healthy. The limit never passes ``ceiling``.
+    """
+
+    def __init__(
+        self, ceiling: int, initial: int = 1, increase: float = 1.0, decrease: float = 0.5,
+        latency_tolerance: float = 2.0, max_alert_rate: float = 0.3, max_delay: float = 5.0,
+    ):
+        self.ceiling = max(1, ceiling)
+        self.limit = float(min(max(1, initial), self.ceiling))
+        self.delay = 0.0
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.max_alert_rate = max_alert_rate
+        self.max_delay = max_delay
+        self._in_flight = 0
+        self._next_start = 0.0
+        self._backoff_until = 0.0
+        # Fastest and smoothed latency per answered outcome; an alert comes back quicker than a result page
+        self._min_latency: Dict[str, float] = {}
+        self._latency: Dict[str, float] = {}
+        self._alert_rate = 0.0
+        self._increases = 0
+        self._decreases = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Wait for a free slot under the limit and for the pacing gap, then take the slot"""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._in_flight < int(self.limit):
+                    if now >= self._next_start:
+                        self._in_flight += 1
+                        self._next_start = now + self.delay
+                        return
+                    self._condition.wait(self._next_start - now)
+                else:
+                    self._condition.wait()
+
+    def release(self, outcome: str, latency: float) -> None:
+        """Give a slot back with how its submission went and how long it took, adjusting the limit"""
+        with self._condition:
+            window_full = self._in_flight >= int(self.limit)
+            self._in_flight -= 1
+            if outcome != LOCAL_ERROR:
+                if self._congested(outcome, latency):
+                    self._back_off(latency)
+                elif outcome in ANSWERED_OUTCOMES:
+                    self._grow(window_full)
+            self._condition.notify_all()
+
+    def snapshot(self) -> Dict:
+        with self._condition:
+            return {
+                'limit': round(self.limit, 2),
+                'ceiling': self.ceiling,
+                'in_flight': self._in_flight,
+                'delay_seconds': round(self.delay, 2),
+                'latency_ms': {outcome: round(1000 * latency) for outcome, latency in self._latency.items()},
+                'min_latency_ms': {outcome: round(1000 * latency) for outcome, latency in self._min_latency.items()},
+                'alert_rate': round(self._alert_rate, 3),
+                'increases': self._increases,
+                'decreases': self._decreases,
+            }
+
+    def _congested(self, outcome: str, latency: float) -> bool:
+        if outcome in OVERLOAD_OUTCOMES:
+            return True
+        self._alert_rate += SMOOTHING * ((outcome in ALERT_OUTCOMES) - self._alert_rate)
+        if self._alert_rate > self.max_alert_rate:
+            return True
+        if outcome not in ANSWERED_OUTCOMES:
+            return False
+        # Judged against the fastest recent answer, which stands in for the server's unloaded speed
+        fastest = self._min_latency.get(outcome, latency)
+        fastest = self._min_latency[outcome] = min(latency, fastest + BASELINE_DRIFT * (latency - fastest))
+        smoothed = self._latency.get(outcome, latency)
+        smoothed = self._latency[outcome] = smoothed + SMOOTHING * (latency - smoothed)
+        return smoothed > fastest * self.latency_tolerance
+
+    def _back_off(self, latency: float) -> None:
+        now = time.monotonic()
+        if now < self._backoff_until:
+            return
+        self._decreases += 1
+        if self.limit <= 1:
+            self.delay = min(self.max_delay, max(MIN_DELAY, 2 * self.delay))
+        self.limit = max(1.0, self.limit * self.decrease)
+        # Answers to submissions already in flight (a timeout takes as long as this one did) belong
+        # to the window that was just cut
+        self._backoff_until = now + max([latency, *self._latency.values()])
+
+    def _grow(self, window_full: bool) -> None:
+        if self.delay:
+            self.delay = self.delay / 2 if self.delay / 2 >= MIN_DELAY else 0.0
+            return
+        # A limit the workers aren't filling says nothing about the server, so it isn't raised
+        if window_full and self.limit < self.ceiling:
+            self._increases += 1
+            self.limit = min(float(self.ceiling), self.limit + self.increase / self.limit)
+
+
+class SubmissionSlot:
+    """Holds a limiter slot for the server round trip of one submission, and nothing else.
+
+    Set ``outcome`` inside the block once the answer is classified; the slot
+    goes back with it and the time since it was taken. An exception from
+    ``server_errors`` raised in the block is released as an error, any other
+    as a local error the limiter ignores. Without a limiter it does nothing.
+    """
+
+    def __init__(self, limiter: Optional[AimdLimiter], server_errors: Tuple[Type[BaseException], ...] = ()):
+        self.limiter = limiter
+        self.server_errors = server_errors
+        self.outcome = LOCAL_ERROR
+        self._started = 0.0
+
+    def __enter__(self) -> 'SubmissionSlot':
+        if self.limiter is not None:
+            self.limiter.acquire()
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        if self.limiter is None:
+            return False
+        if exc_type is not None:
+            self.outcome = 'error' if issubclass(exc_type, self.server_errors) else LOCAL_ERROR
+        self.limiter.release(self.outcome, time.monotonic() - self._started)
+        return False
+
+
+_limiters: Dict[str, AimdLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_host_limiter(url: str, initial: int = 1) -> AimdLimiter:
+    """Return the process-wide limiter for a results URL's host, so every job against it shares one limit.
+
+    ``initial`` only sets the starting limit when the host is first seen.
+    """
+    host = (urlsplit(url).hostname or url).lower()
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = AimdLimiter(
+                ceiling=settings.SCRAPER_HOST_MAX_CONCURRENCY,
+                initial=initial,
+                increase=settings.SCRAPER_AIMD_INCREASE,
+                decrease=settings.SCRAPER_AIMD_DECREASE,
+                latency_tolerance=settings.SCRAPER_AIMD_LATENCY_TOLERANCE,
+                max_alert_rate=settings.SCRAPER_AIMD_MAX_ALERT_RATE,
+                max_delay=settings.SCRAPER_AIMD_MAX_DELAY,
+            )
+        return limiter
@@ -1,8 +1,24 @@
 from django.urls import path
-from .apiviews import ScraperAPIView
+from .apiviews import (
+    ScraperAPIView,
+    ScrapeJobListAPIView,
+    ScrapeJobDetailAPIView,
+    ScrapeJobResumeAPIView,
+    ScrapeJobDownloadAPIView,
+    ScrapeJobEventsAPIView,
+    OcrStatsAPIView,
+    ResultCacheInvalidateAPIView,
+)
 
 urlpatterns = [
     # path('', automate, name='automate'),
     # path('insights/', insights, name='insights'),
     path('', ScraperAPIView.as_view(), name='form-api'),
+    path('jobs/', ScrapeJobListAPIView.as_view(), name='job-list'),
+    path('jobs/<uuid:job_id>/', ScrapeJobDetailAPIView.as_view(), name='job-detail'),
+    path('jobs/<uuid:job_id>/download/', ScrapeJobDownloadAPIView.as_view(), name='job-download'),
+    path('jobs/<uuid:job_id>/resume/', ScrapeJobResumeAPIView.as_view(), name='job-resume'),
+    path('jobs/<uuid:job_id>/events/', ScrapeJobEventsAPIView.as_view(), name='job-events'),
+    path('ocr/stats/', OcrStatsAPIView.as_view(), name='ocr-stats'),
+    path('cache/invalidate/', ResultCacheInvalidateAPIView.as_view(), name='cache-invalidate'),
 ]
\ No newline at end of file
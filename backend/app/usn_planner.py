@@ -0,0 +1,102 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Lateral entry (diploma) students are numbered from 400 within a section
+LATERAL_ENTRY_START = 400
+
+
+def parse_range(suffix_range: str) -> List[int]:
+    """Seat numbers in a range string like '1-100,50-150,7', merged, deduplicated and sorted"""
+    intervals = []
+    for part in suffix_range.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                start, end = map(int, part.split('-'))
+            else:
+                start = end = int(part)
+        except ValueError:
+            print(f"Invalid range: {part}")
+            continue
+        if start > end:
+            start, end = end, start
+        intervals.append((start, end))
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return [number for start, end in merged for number in range(start, end + 1)]
+
+
+def expand_usn_range(prefix_usn: str, suffix_range: str) -> List[str]:
+    return [f"{prefix_usn}{str(number).zfill(3)}" for number in parse_range(suffix_range)]
+
+
+class RangePlanner:
+    """Learns where a section's seat numbers end so the rest of a wide range isn't submitted.
+
+    Regular and lateral entry (4xx) numbers are tracked as separate series, so
+    the end of the regular series doesn't stop the lateral entry ones from
+    being checked. Once ``stop_after`` planned numbers in a row after a result
+    come back "not found" with nothing found above them, later numbers in that
+    series are skipped. Misses before a series' first result never cut it
+    off, since a section's numbering may start late. A result found past the
+    cut-off lifts it again.
+    Outcomes may be reported out of order and from several threads.
+    """
+
+    def __init__(self, usn_list: List[str], stop_after: int):
+        self.stop_after = stop_after
+        self._series: Dict[str, List[str]] = {}
+        for usn in sorted(usn_list, key=self._number):
+            self._series.setdefault(self._series_of(usn), []).append(usn)
+        self._found: Dict[str, bool] = {}
+        self._cutoff: Dict[str, Optional[int]] = {}
+        self._lock = threading.Lock()
+
+    def should_scrape(self, usn: str) -> bool:
+        if self.stop_after <= 0:
+            return True
+        with self._lock:
+            cutoff = self._cutoff.get(self._series_of(usn))
+        return cutoff is None or self._number(usn) <= cutoff
+
+    def record(self, usn: str, found: bool) -> None:
+        """Report whether a USN had a result"""
+        if self.stop_after <= 0:
+            return
+        series = self._series_of(usn)
+        with self._lock:
+            self._found[usn] = found
+            self._cutoff[series] = self._find_cutoff(self._series.get(series, []))
+
+    def _find_cutoff(self, usns: List[str]) -> Optional[int]:
+        """Last number of the first run of stop_after misses after a result that has no result above it"""
+        run = 0
+        cutoff = None
+        seen_result = False
+        for usn in usns:
+            found = self._found.get(usn)
+            if found:
+                run, cutoff, seen_result = 0, None, True
+            elif found is None or not seen_result:
+                # Not answered yet (or in flight), or nothing found below it: no evidence of the series' end
+                run = 0
+            else:
+                run += 1
+                if run >= self.stop_after and cutoff is None:
+                    cutoff = self._number(usn)
+        return cutoff
+
+    @staticmethod
+    def _number(usn: str) -> int:
+        suffix = usn[-3:]
+        return int(suffix) if suffix.isdigit() else 0
+
+    def _series_of(self, usn: str) -> str:
+        return 'lateral' if self._number(usn) >= LATERAL_ENTRY_START else 'regular'
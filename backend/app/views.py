@@ -111,6 +111,7 @@ import seaborn as sns
 from io import BytesIO
 import base64
 import json
+from .exports import read_results_file
 
 def insights(request):
     table_html = None
@@ -127,8 +128,8 @@ def insights(request):
         file_path = default_storage.save(f"uploads/{uploaded_file.name}", ContentFile(uploaded_file.read()))
         
         try:
-            # Read the Excel file
-            df = pd.read_excel(default_storage.open(file_path))
+            # Read the uploaded export; CSV, NDJSON, MessagePack and Parquet load much faster than Excel
+            df = read_results_file(default_storage.open(file_path), uploaded_file.name)
             filters = df.columns.tolist()
             table_html = df.to_html(classes="table-auto w-full border-collapse border border-gray-300 text-sm")
             
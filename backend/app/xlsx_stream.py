@@ -0,0 +1,201 @@
+import math
+import numbers
+import re
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Excel caps sheet names at 31 characters and rejects a few punctuation marks in them
+SHEET_NAME_LENGTH = 31
+INVALID_SHEET_NAME = re.compile(r'[\[\]:*?/\\]')
+# Control characters XML 1.0 can't carry; openpyxl refuses them too
+ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# A sheet to write: its name, header row and data rows (consumed lazily, once)
+Sheet = Tuple[str, Sequence[str], Iterable[Sequence]]
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}'
+    '</Types>'
+)
+CONTENT_TYPE_SHEET = (
+    '<Override PartName="/xl/worksheets/sheet{number}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets>'
+    '</workbook>'
+)
+WORKBOOK_SHEET = '<sheet name={name} sheetId="{number}" r:id="rId{number}"/>'
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}'
+    '<Relationship Id="rId{styles}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK_RELS_SHEET = (
+    '<Relationship Id="rId{number}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{number}.xml"/>'
+)
+# Style 1 is the bold, thin-bordered header pandas' ExcelWriter uses
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    '</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" '
+    'applyAlignment="1"><alignment horizontal="center" vertical="top"/></xf></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+
+class _ChunkSink:
+    """Write-only file object that collects what the zip writer produces until it's drained"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def stream_workbook(sheets: Sequence[Sheet], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield an xlsx file holding the given sheets, piece by piece, as its rows are written.
+
+    Rows go straight into the deflated worksheet part of a zip written to an
+    unseekable sink, so memory stays flat however many rows there are and the
+    first chunk is ready as soon as ``chunk_size`` compressed bytes exist.
+    Strings are stored inline rather than in a shared string table, which would
+    need every row before the first could be written. ``None`` and NaN become
+    empty cells. Sheet names are made Excel-safe and unique.
+    """
+    if not sheets:
+        raise ValueError("A workbook needs at least one sheet")
+    names = []
+    for name, _, _ in sheets:
+        names.append(_sheet_name(name, names))
+    sheet_numbers = range(1, len(names) + 1)
+
+    sink = _ChunkSink()
+    # An unseekable sink makes zipfile write each part's sizes after it instead of seeking back
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES.format(
+            sheets=''.join(CONTENT_TYPE_SHEET.format(number=number) for number in sheet_numbers)
+        ))
+        archive.writestr('_rels/.rels', ROOT_RELS)
+        archive.writestr('xl/workbook.xml', WORKBOOK.format(sheets=''.join(
+            WORKBOOK_SHEET.format(name=quoteattr(name), number=number) for number, name in zip(sheet_numbers, names)
+        )))
+        archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS.format(
+            sheets=''.join(WORKBOOK_RELS_SHEET.format(number=number) for number in sheet_numbers),
+            styles=len(names) + 1,
+        ))
+        archive.writestr('xl/styles.xml', STYLES)
+
+        for number, (_, columns, rows) in zip(sheet_numbers, sheets):
+            with archive.open(f'xl/worksheets/sheet{number}.xml', 'w') as part:
+                letters = _column_letters(len(columns))
+                part.write(SHEET_START.encode())
+                part.write(_row_xml(1, columns, letters, header=True))
+                for index, row in enumerate(rows, start=2):
+                    if len(row) > len(letters):
+                        letters = _column_letters(len(row))
+                    part.write(_row_xml(index, row, letters))
+                    if sink.size >= chunk_size:
+                        yield sink.drain()
+                part.write(SHEET_END.encode())
+    yield sink.drain()
+
+
+def _row_xml(index: int, values: Sequence, letters: List[str], header: bool = False) -> bytes:
+    style = ' s="1"' if header else ''
+    cells = []
+    for letter, value in zip(letters, values):
+        ref = f'{letter}{index}'
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            cells.append(f'<c r="{ref}"{style} t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, numbers.Integral):
+            cells.append(f'<c r="{ref}"{style}><v>{int(value)}</v></c>')
+        elif isinstance(value, numbers.Real):
+            if not math.isnan(value):
+                cells.append(f'<c r="{ref}"{style}><v>{float(value)!r}</v></c>')
+        else:
+            text = _clean_text(str(value))
+            cells.append(f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{index}">{"".join(cells)}</row>'.encode()
+
+
+def _clean_text(text: str) -> str:
+    return escape(ILLEGAL_XML_CHARS.sub('', text))
+
+
+def _column_letters(count: int) -> List[str]:
+    letters = []
+    for number in range(1, count + 1):
+        letter = ''
+        while number:
+            number, remainder = divmod(number - 1, 26)
+            letter = chr(ord('A') + remainder) + letter
+        letters.append(letter)
+    return letters
+
+
+def _sheet_name(name: Optional[str], taken: List[str]) -> str:
+    base = INVALID_SHEET_NAME.sub('_', str(name or 'Sheet'))[:SHEET_NAME_LENGTH] or 'Sheet'
+    candidate, suffix = base, 1
+    while candidate.lower() in {existing.lower() for existing in taken}:
+        suffix += 1
+        tail = f' ({suffix})'
+        candidate = base[:SHEET_NAME_LENGTH - len(tail)] + tail
+    return candidate
@@ -43,6 +43,13 @@ CORS_ALLOW_HEADERS = [
     "authorization",
 ]
 
+# Let the frontend read the download name and the job ID of a scrape
+CORS_EXPOSE_HEADERS = [
+    "content-disposition",
+    "x-response-type",
+    "x-job-id",
+]
+
 CSRF_TRUSTED_ORIGINS = [
     "https://aitmeduinsight.vercel.app",
 ]
@@ -58,6 +65,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'corsheaders',
+    'channels',
     'app',
 ]
 
@@ -92,6 +100,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'main.wsgi.application'
+ASGI_APPLICATION = 'main.asgi.application'
 
 
 # Database
@@ -163,3 +172,128 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.MultiPartParser",
     ],
 }
+
+
+# Scraper settings
+# Upper bound on concurrent Chrome sessions a single scrape request may open
+SCRAPER_MAX_WORKERS = int(os.environ.get("SCRAPER_MAX_WORKERS", 4))
+# How many times a worker may replace a crashed webdriver before giving up
+SCRAPER_MAX_DRIVER_RESTARTS = int(os.environ.get("SCRAPER_MAX_DRIVER_RESTARTS", 2))
+# Warm Chrome sessions shared by all jobs in this process: how many may be open, how many
+# to pre-start, and when to recycle one (after N jobs or past a JS heap size). The heap is the
+# results page's performance.memory.usedJSHeapSize, not the memory Chrome's processes use, so it
+# catches a leaking page rather than a bloated browser; SCRAPER_DRIVER_MAX_USES bounds the rest.
+# Sessions are only pre-started at startup when "selenium" is the default engine and WARM > 0.
+SCRAPER_DRIVER_POOL_SIZE = int(os.environ.get("SCRAPER_DRIVER_POOL_SIZE", SCRAPER_MAX_WORKERS))
+SCRAPER_DRIVER_POOL_WARM = int(os.environ.get("SCRAPER_DRIVER_POOL_WARM", 1))
+SCRAPER_DRIVER_MAX_USES = int(os.environ.get("SCRAPER_DRIVER_MAX_USES", 20))
+SCRAPER_DRIVER_MAX_HEAP_MB = float(os.environ.get("SCRAPER_DRIVER_MAX_HEAP_MB", 256))
+SCRAPER_DRIVER_CHECKOUT_TIMEOUT = float(os.environ.get("SCRAPER_DRIVER_CHECKOUT_TIMEOUT", 120))
+# Lean sessions use an eager page load and block the page assets below through DevTools
+SCRAPER_LEAN_BROWSER = os.environ.get("SCRAPER_LEAN_BROWSER", "1") == "1"
+SCRAPER_LEAN_BLOCKED_URLS = [
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp", "*.mp4",
+    "*google-analytics.com*", "*googletagmanager.com*", "*fonts.googleapis.com*", "*fonts.gstatic.com*",
+]
+# Leave empty to look up chromedriver on PATH (the Docker image installs chromium-driver)
+SCRAPER_CHROMEDRIVER_PATH = os.environ.get("SCRAPER_CHROMEDRIVER_PATH", "")
+# "selenium" drives headless Chrome, "http" talks to the results server directly
+SCRAPER_DEFAULT_ENGINE = os.environ.get("SCRAPER_DEFAULT_ENGINE", "selenium")
+SCRAPER_HTTP_TIMEOUT = float(os.environ.get("SCRAPER_HTTP_TIMEOUT", 15))
+SCRAPER_HTTP_POOL_SIZE = int(os.environ.get("SCRAPER_HTTP_POOL_SIZE", 4))
+SCRAPER_HTTP_USER_AGENT = os.environ.get(
+    "SCRAPER_HTTP_USER_AGENT",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+)
+# Shared OCR worker threads and how long a scrape waits for one captcha read
+SCRAPER_OCR_WORKERS = int(os.environ.get("SCRAPER_OCR_WORKERS", os.cpu_count() or 2))
+SCRAPER_OCR_TIMEOUT = float(os.environ.get("SCRAPER_OCR_TIMEOUT", 10))
+# Template bank for the built-in captcha solver; reads whose weakest character scores below the
+# threshold fall back to Tesseract. No bank ships with the repo, so the solver is inert and every
+# captcha goes to Tesseract until one is built from real VTU captchas: "manage.py collect_captchas
+# --url <results page>" saves the ones whose Tesseract read the server accepted to app/fixtures/captchas,
+# then "manage.py build_glyph_bank --fixtures app/fixtures/captchas" builds the bank. Stub-server
+# renders (--synthetic) use PIL's default font and don't transfer to the real site.
+SCRAPER_GLYPH_BANK = os.environ.get("SCRAPER_GLYPH_BANK", str(BASE_DIR / "app" / "data" / "glyph_bank.npz"))
+SCRAPER_SOLVER_MIN_CONFIDENCE = float(os.environ.get("SCRAPER_SOLVER_MIN_CONFIDENCE", 0.5))
+# Tesseract reads scoring below this (0..1) are refreshed instead of submitted, at most
+# SCRAPER_CAPTCHA_MAX_REFRESHES times per submission
+SCRAPER_OCR_MIN_CONFIDENCE = float(os.environ.get("SCRAPER_OCR_MIN_CONFIDENCE", 0.6))
+SCRAPER_CAPTCHA_MAX_REFRESHES = int(os.environ.get("SCRAPER_CAPTCHA_MAX_REFRESHES", 3))
+SCRAPER_CAPTCHA_RELOAD_TIMEOUT = float(os.environ.get("SCRAPER_CAPTCHA_RELOAD_TIMEOUT", 5))
+# After a submit, how long to wait for an alert or the result page, and how often to check
+SCRAPER_RESULT_TIMEOUT = float(os.environ.get("SCRAPER_RESULT_TIMEOUT", 10))
+SCRAPER_RESULT_POLL_INTERVAL = float(os.environ.get("SCRAPER_RESULT_POLL_INTERVAL", 0.05))
+# Pause before retrying a USN after an unexpected error (captcha retries don't wait)
+SCRAPER_ERROR_RETRY_DELAY = float(os.environ.get("SCRAPER_ERROR_RETRY_DELAY", 1))
+# Adaptive concurrency: every job against a results host shares one limit on submissions in flight.
+# It grows by SCRAPER_AIMD_INCREASE per window of healthy answers and is multiplied by
+# SCRAPER_AIMD_DECREASE on a timeout or error, an alert rate above SCRAPER_AIMD_MAX_ALERT_RATE or a
+# latency over SCRAPER_AIMD_LATENCY_TOLERANCE times the recent best; at one, submissions are paced
+# up to SCRAPER_AIMD_MAX_DELAY seconds apart. A job never runs more workers than it requested (nor
+# than SCRAPER_HOST_MAX_CONCURRENCY); the limit decides how many of them submit at once.
+SCRAPER_ADAPTIVE_CONCURRENCY = os.environ.get("SCRAPER_ADAPTIVE_CONCURRENCY", "1") == "1"
+SCRAPER_HOST_MAX_CONCURRENCY = int(os.environ.get("SCRAPER_HOST_MAX_CONCURRENCY", SCRAPER_MAX_WORKERS))
+SCRAPER_AIMD_INCREASE = float(os.environ.get("SCRAPER_AIMD_INCREASE", 1))
+SCRAPER_AIMD_DECREASE = float(os.environ.get("SCRAPER_AIMD_DECREASE", 0.5))
+SCRAPER_AIMD_LATENCY_TOLERANCE = float(os.environ.get("SCRAPER_AIMD_LATENCY_TOLERANCE", 2))
+SCRAPER_AIMD_MAX_ALERT_RATE = float(os.environ.get("SCRAPER_AIMD_MAX_ALERT_RATE", 0.3))
+SCRAPER_AIMD_MAX_DELAY = float(os.environ.get("SCRAPER_AIMD_MAX_DELAY", 5))
+# Background scrape jobs: Redis list when SCRAPER_REDIS_URL is set, else pending rows in the database.
+# Workers run inside the web process unless jobs are handled by "manage.py run_scrape_workers".
+SCRAPER_REDIS_URL = os.environ.get("SCRAPER_REDIS_URL", os.environ.get("REDIS_URL", ""))
+SCRAPER_JOB_QUEUE_KEY = os.environ.get("SCRAPER_JOB_QUEUE_KEY", "eduinsight:scrape-jobs")
+SCRAPER_RUN_JOBS_IN_PROCESS = os.environ.get("SCRAPER_RUN_JOBS_IN_PROCESS", "1") == "1"
+SCRAPER_JOB_WORKERS = int(os.environ.get("SCRAPER_JOB_WORKERS", 2))
+SCRAPER_JOB_POLL_TIMEOUT = float(os.environ.get("SCRAPER_JOB_POLL_TIMEOUT", 5))
+SCRAPER_JOB_POLL_INTERVAL = float(os.environ.get("SCRAPER_JOB_POLL_INTERVAL", 1))
+# A running job can only be force-resumed once neither it nor any of its USNs has moved for this many
+# seconds, so its worker has evidently died; sooner, two workers would scrape the same job
+SCRAPER_JOB_STALE_AFTER = float(os.environ.get("SCRAPER_JOB_STALE_AFTER", 10 * 60))
+# Jobs with more USNs than SCRAPER_SHARD_SIZE are split into shards that job workers on any node
+# lease (in Redis when SCRAPER_REDIS_URL is set, else only this process's workers); 0 runs every
+# job on one worker. A lease not renewed within SCRAPER_SHARD_LEASE_SECONDS goes back in the queue.
+SCRAPER_SHARD_SIZE = int(os.environ.get("SCRAPER_SHARD_SIZE", 0))
+SCRAPER_SHARD_LEASE_SECONDS = float(os.environ.get("SCRAPER_SHARD_LEASE_SECONDS", 60))
+SCRAPER_SHARD_KEY_PREFIX = os.environ.get("SCRAPER_SHARD_KEY_PREFIX", "eduinsight:shards")
+# Live job progress (WebSocket ws/jobs/<id>/ and SSE jobs/<id>/events/) goes through the channel
+# layer: Redis when configured so separate worker processes can publish, else in-process memory that
+# this process's job and scrape threads can publish to
+if SCRAPER_REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [SCRAPER_REDIS_URL]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "app.progress.ThreadSafeInMemoryChannelLayer"}}
+# Seconds between keepalive comments on a quiet SSE progress stream
+SCRAPER_PROGRESS_KEEPALIVE = float(os.environ.get("SCRAPER_PROGRESS_KEEPALIVE", 15))
+# Upsert finished jobs into the Student/Subject/Marks tables, this many rows per INSERT
+SCRAPER_INGEST_RESULTS = os.environ.get("SCRAPER_INGEST_RESULTS", "1") == "1"
+SCRAPER_INGEST_BATCH_SIZE = int(os.environ.get("SCRAPER_INGEST_BATCH_SIZE", 500))
+# Parsed per-USN results are reused across jobs for the same results URL. Results live for
+# SCRAPER_RESULT_CACHE_TTL seconds (0 disables the cache). "Not found" answers double as a
+# per-URL negative cache for SCRAPER_RESULT_CACHE_NOT_FOUND_TTL seconds, kept shorter so late
+# publications still get picked up: until it expires, a non-incremental job treats the USN as
+# absent (and the planner counts it as a miss). Incremental jobs ignore these entries.
+# The cache is Redis when configured, otherwise memory local to this process.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "scraper_results": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": SCRAPER_REDIS_URL,
+    } if SCRAPER_REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "scraper-results",
+        "OPTIONS": {"MAX_ENTRIES": 100_000},
+    },
+}
+SCRAPER_RESULT_CACHE_ALIAS = "scraper_results"
+SCRAPER_RESULT_CACHE_TTL = float(os.environ.get("SCRAPER_RESULT_CACHE_TTL", 30 * 60))
+SCRAPER_RESULT_CACHE_NOT_FOUND_TTL = float(os.environ.get("SCRAPER_RESULT_CACHE_NOT_FOUND_TTL", 10 * 60))
+# Incremental jobs reuse results fetched for the same URL within this many hours
+SCRAPER_INCREMENTAL_MAX_AGE_HOURS = float(os.environ.get("SCRAPER_INCREMENTAL_MAX_AGE_HOURS", 24))
+# Stop submitting a seat number series (regular, or lateral entry 4xx) after this many
+# consecutive "not found" answers past its last result; 0 scrapes every number requested
+SCRAPER_PLANNER_STOP_AFTER = int(os.environ.get("SCRAPER_PLANNER_STOP_AFTER", 10))
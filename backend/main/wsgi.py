@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
 
 application = get_wsgi_application()
+
+from app.driver_pool import warm_driver_pool  # noqa: E402
+
+# Have Chrome running before the first scrape asks for it, when Selenium is the default engine
+warm_driver_pool()